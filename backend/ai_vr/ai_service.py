@@ -1,7 +1,363 @@
-def process_data(data):
-    # Implement your AI processing logic here.
-    return f"Processed data: {data}"
+"""
+Adaptive-learning inference service.
 
-if __name__ == "__main__":
-    sample = "Sample input"
-    print(process_data(sample))
+An ASGI app that serves content-based course recommendations and adaptive
+difficulty suggestions. Concurrent requests are micro-batched: each endpoint
+queues its inputs and a single worker scores everything that arrived within
+BATCH_WINDOW_MS as one NumPy computation. Queues are bounded; when full the
+service answers 503 with Retry-After instead of piling up latency.
+
+Model artifacts are the `content` versions published by the Django API
+(`manage.py rebuild_course_features`) under ARTIFACT_DIR. They are memory-mapped
+once at startup and swapped when a new version is published.
+
+    python ai_service.py               # serve on $PORT (default 5000)
+    python ai_service.py --self-test   # score a synthetic batch and exit
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', '/artifacts')
+PORT = int(os.getenv('PORT', 5000))
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', 3))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 256))
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 2048))
+RELOAD_INTERVAL = float(os.getenv('RELOAD_INTERVAL', 30))
+MAX_BODY_BYTES = 64 * 1024
+
+DIFFICULTY_LEVELS = ['beginner', 'intermediate', 'advanced']
+FEATURE_COUNT = 5
+
+
+logger = logging.getLogger('ai_service')
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ContentModel:
+    """Standardized, row-normalized course feature matrix (mirrors courses.features.FeatureMatrix)"""
+
+    def __init__(self, version, course_ids, mean, scale, unit_rows):
+        self.version = version
+        self.course_ids = np.asarray(course_ids)
+        self.mean = mean
+        self.scale = scale
+        self.unit_rows = unit_rows
+        self.positions = {course_id: index for index, course_id in enumerate(self.course_ids.tolist())}
+
+    @classmethod
+    def empty(cls):
+        return cls(None, np.zeros(0, dtype=np.int64), np.zeros(FEATURE_COUNT), np.ones(FEATURE_COUNT),
+                   np.zeros((0, FEATURE_COUNT)))
+
+    @staticmethod
+    def current_version(root=ARTIFACT_DIR):
+        try:
+            with open(os.path.join(root, 'content', 'CURRENT')) as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, root=ARTIFACT_DIR, version=None):
+        """Memory-map the given (or current) published version; an empty model when none exists"""
+        version = version or cls.current_version(root)
+        if version is None:
+            return cls.empty()
+        directory = os.path.join(root, 'content', version)
+        arrays = {
+            key: np.load(os.path.join(directory, f'{key}.npy'), mmap_mode='r')
+            for key in ('course_ids', 'mean', 'scale', 'unit_rows')
+        }
+        return cls(version, **arrays)
+
+    def top_k(self, vectors, exclude_ids, limits):
+        """Score a batch of preference vectors with one matrix product"""
+        if not len(self.course_ids):
+            return [[] for _ in vectors]
+        users = (np.asarray(vectors, dtype=np.float64) - self.mean) / self.scale
+        norms = np.linalg.norm(users, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (users / norms) @ self.unit_rows.T
+        for row, excluded in enumerate(exclude_ids):
+            columns = [self.positions[course_id] for course_id in excluded if course_id in self.positions]
+            scores[row, columns] = -np.inf
+        k = min(max(limits), scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in enumerate(top):
+            columns = columns[np.argsort(-scores[row, columns])][:limits[row]]
+            results.append([
+                [int(self.course_ids[column]), float(scores[row, column])]
+                for column in columns if np.isfinite(scores[row, column])
+            ])
+        return results
+
+
+def adaptive_difficulty(completion_rates, levels, recent_progress):
+    """
+    Suggest the next difficulty for a batch of learners. Readiness is a logistic
+    score of overall and recent completion; confident learners step up a level,
+    struggling ones step down.
+    """
+    completion = np.asarray(completion_rates, dtype=np.float64) / 100
+    recent = np.asarray(recent_progress, dtype=np.float64) / 100
+    readiness = 1 / (1 + np.exp(-(6 * (completion - 0.7) + 4 * (recent - 0.6))))
+    step = np.where(readiness > 0.65, 1, np.where(readiness < 0.3, -1, 0))
+    suggested = np.clip(np.asarray(levels) + step, 0, len(DIFFICULTY_LEVELS) - 1)
+    return [
+        {'difficulty': DIFFICULTY_LEVELS[level], 'readiness': round(float(score), 4)}
+        for level, score in zip(suggested, readiness)
+    ]
+
+
+class MicroBatcher:
+    """Collect concurrent submissions and run them through `handler` as one batch"""
+
+    def __init__(self, handler, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE, max_queue=MAX_QUEUE_SIZE):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise Overloaded() from None
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(pending) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            pending = [(item, future) for item, future in pending if not future.cancelled()]
+            if not pending:
+                continue
+            try:
+                # NumPy releases the GIL, so scoring off the loop keeps accepting requests
+                results = await loop.run_in_executor(None, self.handler, [item for item, _ in pending])
+            except Exception as error:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+            self.items += len(pending)
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class Service:
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+        self.model = ContentModel.load(root)
+        self.recommendations = MicroBatcher(self.score_recommendations)
+        self.difficulty = MicroBatcher(self.score_difficulty)
+        self.tasks = []
+
+    def score_recommendations(self, items):
+        model = self.model  # one version per batch even if a reload happens meanwhile
+        return model.top_k(
+            [item['vector'] for item in items],
+            [item['exclude'] for item in items],
+            [item['limit'] for item in items],
+        )
+
+    @staticmethod
+    def score_difficulty(items):
+        return adaptive_difficulty(
+            [item['completion_rate'] for item in items],
+            [item['level'] for item in items],
+            [item['recent_progress'] for item in items],
+        )
+
+    async def reload_periodically(self):
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            try:
+                await self.reload()
+            except Exception:
+                # Keep serving the loaded model; the next tick tries again
+                logger.exception('Could not reload the model from %s', self.root)
+
+    async def reload(self):
+        version = ContentModel.current_version(self.root)
+        if version and version != self.model.version:
+            self.model = await asyncio.get_running_loop().run_in_executor(None, ContentModel.load, self.root, version)
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(self.recommendations.run()),
+            asyncio.create_task(self.difficulty.run()),
+            asyncio.create_task(self.reload_periodically()),
+        ]
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+
+    @staticmethod
+    def parse_recommendation(payload):
+        vector = [float(value) for value in payload['vector']]
+        if len(vector) != FEATURE_COUNT:
+            raise ValueError(f'vector must have {FEATURE_COUNT} values')
+        return {
+            'vector': vector,
+            'exclude': [int(course_id) for course_id in payload.get('exclude', [])],
+            'limit': max(1, min(int(payload.get('limit', 5)), 100)),
+        }
+
+    @staticmethod
+    def parse_difficulty(payload):
+        level = payload.get('current_difficulty', 'beginner')
+        if level not in DIFFICULTY_LEVELS:
+            raise ValueError(f"current_difficulty must be one of: {', '.join(DIFFICULTY_LEVELS)}")
+        completion_rate = float(payload['completion_rate'])
+        return {
+            'completion_rate': completion_rate,
+            'level': DIFFICULTY_LEVELS.index(level),
+            'recent_progress': float(payload.get('recent_progress', completion_rate)),
+        }
+
+    async def handle(self, method, path, payload):
+        """Return (status, body) for one request"""
+        if method == 'GET' and path == '/health':
+            return 200, {
+                'status': 'ok',
+                'model_version': self.model.version,
+                'courses': len(self.model.course_ids),
+                'queued': {'recommend': self.recommendations.queue.qsize(), 'difficulty': self.difficulty.queue.qsize()},
+                'batches': {'recommend': self.recommendations.batches, 'difficulty': self.difficulty.batches},
+            }
+        routes = {
+            '/recommend': (self.parse_recommendation, self.recommendations, 'recommendations'),
+            '/adaptive-difficulty': (self.parse_difficulty, self.difficulty, 'suggestion'),
+        }
+        if path not in routes:
+            return 404, {'detail': 'Not found.'}
+        if method != 'POST':
+            return 405, {'detail': 'Method not allowed.'}
+        parse, batcher, key = routes[path]
+        if not isinstance(payload, dict):
+            return 400, {'detail': 'Invalid request: body must be a JSON object'}
+        try:
+            item = parse(payload)
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, {'detail': f'Invalid request: {error}'}
+        result = await batcher.submit(item)
+        return 200, {key: result, 'model_version': self.model.version}
+
+
+class App:
+    """Minimal ASGI application wrapping `Service`"""
+
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+        self.service = None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.service = Service(self.root)
+                self.service.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.service.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            if scope['type'] == 'websocket':
+                await receive()  # websocket.connect
+                await send({'type': 'websocket.close'})
+            return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_BYTES:
+                return await self.respond(send, 413, {'detail': 'Request body too large.'})
+            if not message.get('more_body'):
+                break
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return await self.respond(send, 400, {'detail': 'Body must be JSON.'})
+        try:
+            status, result = await self.service.handle(scope['method'], scope['path'], payload)
+        except Overloaded:
+            return await self.respond(send, 503, {'detail': 'Inference queue is full.'}, [(b'retry-after', b'1')])
+        await self.respond(send, status, result)
+
+    @staticmethod
+    async def respond(send, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = App()
+
+
+async def self_test():
+    """Score a synthetic catalog through the batchers and check concurrent requests share batches"""
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        service = Service(root)
+    X = rng.normal(size=(50, FEATURE_COUNT))
+    service.model = ContentModel('self-test', np.arange(1, 51), X.mean(axis=0), X.std(axis=0),
+                                 X / np.linalg.norm(X, axis=1, keepdims=True))
+    service.start()
+    started = time.perf_counter()
+    responses = await asyncio.gather(*[
+        service.handle('POST', '/recommend', {'vector': rng.normal(size=FEATURE_COUNT).tolist(), 'exclude': [1], 'limit': 3})
+        for _ in range(200)
+    ], service.handle('POST', '/adaptive-difficulty', {'completion_rate': 92, 'current_difficulty': 'beginner'}))
+    elapsed = time.perf_counter() - started
+    rejected = [await service.handle('POST', path, body) for path in ('/recommend', '/adaptive-difficulty') for body in ([], 'x')]
+    service.stop()
+    assert all(status == 200 for status, _ in responses)
+    assert all(len(body['recommendations']) == 3 for _, body in responses[:-1])
+    assert responses[-1][1]['suggestion']['difficulty'] == 'intermediate'
+    assert all(status == 400 for status, _ in rejected)
+    print(f'Scored {service.recommendations.items} requests in {service.recommendations.batches} batches '
+          f'({elapsed * 1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    if '--self-test' in sys.argv:
+        asyncio.run(self_test())
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host='0.0.0.0', port=PORT, log_level='info')
@@ -0,0 +1,145 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from core.caching import bump_cache_version, get_cache_version
+
+logger = logging.getLogger(__name__)
+
+VERSION_CLAIM = 'user_version'
+
+
+def user_version(user_id):
+    """Shared version token of a user's row, bumped on every save (see accounts.signals)"""
+    return get_cache_version('user', str(user_id))
+
+
+class UserCache:
+    """
+    Bounded per-process LRU of user versions and loaded users. A version is trusted
+    for `ttl` seconds and then re-read from the shared cache; a loaded user is kept
+    until its version changes. Invalidation in this process is immediate, elsewhere
+    it takes at most `ttl`.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # user_id -> [version, checked_at, user or None]
+
+    def version(self, user_id):
+        """The user's current version as known to this process"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.entries.move_to_end(user_id)
+                return entry[0]
+        version = user_version(user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            user = entry[2] if entry is not None and entry[0] == version else None
+            self._store(user_id, [version, now, user])
+        return version
+
+    def get(self, user_id, version):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            return entry[2] if entry is not None and entry[0] == version else None
+
+    def put(self, user_id, user, version):
+        with self.lock:
+            self._store(user_id, [version, time.monotonic(), user])
+
+    def _store(self, user_id, entry):
+        self.entries[user_id] = entry
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def invalidate_user(user_id):
+    """
+    Drop cached copies of a user here and, through the shared version, in other
+    processes. This runs once the change commits: bumped any earlier, another
+    worker could load the old row and cache it under the new version for good.
+    """
+    def invalidate():
+        user_cache.invalidate(str(user_id))
+        try:
+            bump_cache_version('user', str(user_id))
+        except Exception:
+            # Saving the user must not fail with the cache; other workers catch up when it is back
+            logger.exception('Could not bump the cache version of user %s', user_id)
+
+    transaction.on_commit(invalidate)
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """JWT authentication that loads the user through the per-process user cache"""
+
+    def get_user(self, validated_token):
+        user_id = str(validated_token.get(api_settings.USER_ID_CLAIM, ''))
+        version = user_cache.version(user_id)
+        user = user_cache.get(user_id, version)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.put(user_id, user, version)
+        # Views may modify request.user, so each request gets its own instance
+        return copy.copy(user)
+
+
+class ClaimsJWTAuthentication(CachedUserJWTAuthentication):
+    """
+    For read-only requests, build the user from the token's claims (username, email,
+    is_staff) when the token was issued at the user's current version, so the request
+    needs no user lookup at all. Writes, and tokens older than the last change to the
+    user, get the full user from the cache or the database.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS:
+            user = self.get_claims_user(validated_token)
+            if user is not None:
+                return user, validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_claims_user(self, validated_token):
+        """A User built from the token's claims alone, or None when the claims may be stale"""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or 'username' not in validated_token or VERSION_CLAIM not in validated_token:
+            return None
+        if validated_token[VERSION_CLAIM] != user_cache.version(str(user_id)):
+            return None
+        User = get_user_model()
+        user = User(
+            username=validated_token['username'],
+            email=validated_token.get('email', ''),
+            is_staff=validated_token.get('is_staff', False),
+            is_active=True,
+        )
+        setattr(user, api_settings.USER_ID_FIELD, User._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id))
+        user._state.adding = False
+        return user
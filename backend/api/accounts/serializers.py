@@ -1,16 +1,37 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .authentication import VERSION_CLAIM, user_version
+from .token_state import get_token_store
+from .tokens import RefreshToken
+
+def set_user_claims(token, user, version):
+    """Copy the user fields ClaimsJWTAuthentication reads from tokens, stamped with the user's version"""
+    token['username'] = user.username
+    token['email'] = user.email
+    token['is_staff'] = user.is_staff
+    # Lets ClaimsJWTAuthentication tell whether these claims are still current
+    token[VERSION_CLAIM] = version
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Batched and throttled by the token store instead of UPDATE_LAST_LOGIN's write per login
+        get_token_store().record_login(self.user.pk)
+        return data
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        # Add custom claims
-        token['username'] = user.username
-        token['email'] = user.email
-        token['is_staff'] = user.is_staff
+        set_user_claims(token, user, user_version(user.pk))
         return token
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,7 +43,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'password', 'password2', 'first_name', 'last_name')
 
     def validate(self, attrs):
-        if attrs['password'] != attrs['password2']:
+        # Profile updates may leave the password out entirely
+        if attrs.get('password') != attrs.get('password2'):
             raise serializers.ValidationError({"password": "Passwords don't match"})
         return attrs
 
@@ -30,3 +52,38 @@ class UserSerializer(serializers.ModelSerializer):
         validated_data.pop('password2')
         user = User.objects.create_user(**validated_data)
         return user
+
+class StoredTokenRefreshSerializer(TokenRefreshSerializer):
+    """Rotate refresh tokens against the token store; a token can be redeemed only once"""
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            # Read before the row: a save committing in between then leaves the claims marked stale, never current
+            version = user_version(user_id)
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+            # The claims the refresh token was issued with may predate changes to the user
+            set_user_claims(refresh, user, version)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Atomic in the store, so of two concurrent refreshes with the same token only one wins
+            if api_settings.BLACKLIST_AFTER_ROTATION and not refresh.blacklist():
+                raise AuthenticationFailed(_('Token is blacklisted'), 'token_not_valid')
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+class StoredTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if get_token_store().is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+            raise serializers.ValidationError(_('Token is blacklisted'))
+        return {}
@@ -0,0 +1,121 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from courses.models import Course
+from .authentication import VERSION_CLAIM, user_version
+from .token_state import get_token_store
+from .tokens import RefreshToken
+
+
+@override_settings(TOKEN_STATE_BACKEND='memory', CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TokenStateTests(TestCase):
+    def setUp(self):
+        # The memory store is per process; start each test with an empty one
+        patcher = mock.patch.dict('accounts.token_state._stores', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('learner', password='a-long-passphrase')
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post('/api/token/', {'username': 'learner', 'password': 'a-long-passphrase'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_refresh_rotates_without_database_writes(self):
+        tokens = self.obtain()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertFalse(OutstandingToken.objects.exists())
+
+        reused = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(reused.status_code, 401)
+        self.assertEqual(self.client.post('/api/token/verify/', {'token': tokens['refresh']}).status_code, 400)
+        rotated = response.json()['refresh']
+        self.assertEqual(self.client.post('/api/auth/token/verify/', {'token': rotated}).status_code, 200)
+
+    def test_tokens_blacklisted_in_the_database_stay_rejected(self):
+        refresh = self.obtain()['refresh']
+        token = RefreshToken(refresh, verify=False)
+        # As the database store recorded it before the switch
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.create(
+            user=self.user, jti=token['jti'], token='', expires_at=token.current_time + token.lifetime,
+        ))
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+    def test_database_blacklist_is_not_read_once_its_tokens_expired(self):
+        refresh = self.obtain()['refresh']
+        token = RefreshToken(refresh, verify=False)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.create(
+            user=self.user, jti='expired', token='', expires_at=token.current_time - token.lifetime,
+        ))
+        with self.assertNumQueries(1):
+            self.assertFalse(get_token_store().is_blacklisted(token['jti']))
+        with self.assertNumQueries(0):
+            self.assertFalse(get_token_store().is_blacklisted(token['jti']))
+
+    def test_last_login_is_written_in_batches(self):
+        self.obtain()
+        get_token_store().flush_logins()
+        self.user.refresh_from_db()
+        first_login = self.user.last_login
+        self.assertIsNotNone(first_login)
+        self.obtain()  # within LAST_LOGIN_THROTTLE, so not recorded again
+        get_token_store().flush_logins()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, first_login)
+
+    def user_queries(self, method, url, token, **data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, HTTP_AUTHORIZATION=f'Bearer {token}', format='json')
+        self.assertEqual(response.status_code, 200)
+        return len([query for query in queries if 'FROM "auth_user"' in query['sql']])
+
+    def test_reads_use_token_claims_until_the_user_changes(self):
+        course = Course.objects.create(title='Course', description='...', instructor=self.user)
+        access = self.obtain()['access']
+        self.assertEqual(self.user_queries('get', f'/api/courses/{course.pk}/analytics/', access), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_queries('patch', '/api/auth/profile/', access, first_name='Ada')
+        # The token's claims predate the change, so the user is loaded once and then cached
+        self.assertEqual(self.user_queries('get', f'/api/courses/{course.pk}/analytics/', access), 1)
+        self.assertEqual(self.user_queries('get', f'/api/courses/{course.pk}/analytics/', access), 0)
+
+    def test_refreshed_access_tokens_carry_the_current_user(self):
+        course = Course.objects.create(title='Course', description='...', instructor=self.user)
+        refresh = self.obtain()['refresh']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = 'learner@example.com'
+            self.user.save()
+        access = self.client.post('/api/token/refresh/', {'refresh': refresh}).json()['access']
+        claims = AccessToken(access)
+        self.assertEqual(claims[VERSION_CLAIM], user_version(self.user.pk))
+        self.assertEqual(claims['email'], 'learner@example.com')
+        # Current claims, so the user is not loaded
+        self.assertEqual(self.user_queries('get', f'/api/courses/{course.pk}/analytics/', access), 0)
+
+    def test_deactivated_user_is_rejected(self):
+        course = Course.objects.create(title='Course', description='...', instructor=self.user)
+        access = self.obtain()['access']
+        self.user_queries('get', f'/api/courses/{course.pk}/analytics/', access)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(f'/api/courses/{course.pk}/analytics/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_saves_survive_cache_outages(self):
+        with mock.patch('accounts.authentication.bump_cache_version', side_effect=ConnectionError):
+            with self.assertLogs('accounts.authentication', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                self.user.first_name = 'Ada'
+                self.user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Ada')
@@ -0,0 +1,190 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Case, DateTimeField, Max, Value, When
+
+
+def seconds_until(expires_at):
+    """TTL for state that is only meaningful while a token with this `exp` is valid"""
+    return max(int(expires_at - time.time()), 1)
+
+
+def write_last_logins(logins):
+    """Apply {user_id: timestamp} to auth_user in a single UPDATE"""
+    if not logins:
+        return 0
+    User = get_user_model()
+    return User.objects.filter(pk__in=logins).update(last_login=Case(
+        *[When(pk=user_id, then=Value(datetime.fromtimestamp(ts, dt_timezone.utc))) for user_id, ts in logins.items()],
+        output_field=DateTimeField(),
+    ))
+
+
+class LegacyBlacklist:
+    """
+    Tokens blacklisted in the token_blacklist tables before token state moved out
+    of Postgres. They are consulted until the last of them expires, then never again.
+    """
+
+    def __init__(self):
+        self.expires_at = None  # latest expiry among the rows, read once per process
+
+    def contains(self, jti):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+        now = datetime.now(dt_timezone.utc)
+        if self.expires_at is None:
+            latest = BlacklistedToken.objects.aggregate(latest=Max('token__expires_at'))['latest']
+            self.expires_at = latest or datetime.min.replace(tzinfo=dt_timezone.utc)
+        if self.expires_at <= now:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti, token__expires_at__gt=now).exists()
+
+
+class RedisTokenStore:
+    """
+    Outstanding and blacklisted refresh token ids as Redis keys that expire with
+    the token, so nothing has to be cleaned up and no refresh writes to Postgres.
+
+    last_login is recorded at most once per LAST_LOGIN_THROTTLE seconds per user
+    into a hash that one request per LAST_LOGIN_FLUSH_INTERVAL writes out in bulk.
+    """
+    prefix = 'jwt'
+    pending_key = f'{prefix}:last_login:pending'
+
+    def __init__(self, client=None):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.client = client
+        self.legacy = LegacyBlacklist()
+
+    def outstand(self, jti, user_id, expires_at):
+        self.client.set(f'{self.prefix}:outstanding:{jti}', user_id or '', ex=seconds_until(expires_at))
+
+    def blacklist(self, jti, user_id, expires_at):
+        """Blacklist a token id; False when it already was, i.e. the token was used twice"""
+        return bool(self.client.set(f'{self.prefix}:blacklist:{jti}', user_id or '', nx=True, ex=seconds_until(expires_at)))
+
+    def is_blacklisted(self, jti):
+        return bool(self.client.exists(f'{self.prefix}:blacklist:{jti}')) or self.legacy.contains(jti)
+
+    def record_login(self, user_id, when=None):
+        when = when or time.time()
+        if self.client.set(f'{self.prefix}:last_login:throttle:{user_id}', 1, nx=True, ex=settings.LAST_LOGIN_THROTTLE):
+            self.client.hset(self.pending_key, user_id, when)
+        if self.client.set(f'{self.prefix}:last_login:flush', 1, nx=True, ex=settings.LAST_LOGIN_FLUSH_INTERVAL):
+            self.flush_logins()
+
+    def flush_logins(self):
+        pipe = self.client.pipeline()
+        pipe.hgetall(self.pending_key)
+        pipe.delete(self.pending_key)
+        pending, _ = pipe.execute()
+        logins = {int(user_id): float(ts) for user_id, ts in pending.items()}
+        try:
+            return write_last_logins(logins)
+        except Exception:
+            # Put the batch back for the next flush; a newer login for the same user wins
+            pipe = self.client.pipeline(transaction=False)
+            for user_id, ts in logins.items():
+                pipe.hsetnx(self.pending_key, user_id, ts)
+            pipe.execute()
+            raise
+
+
+class InMemoryTokenStore:
+    """Process-local store with the same semantics, for tests and single-process development"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.outstanding = {}
+        self.blacklisted = {}
+        self.throttled = {}
+        self.pending = {}
+        self.next_flush = 0
+        self.legacy = LegacyBlacklist()
+
+    @staticmethod
+    def _live(entries, key):
+        expires = entries.get(key)
+        if expires is not None and expires <= time.time():
+            del entries[key]
+            return False
+        return expires is not None
+
+    def outstand(self, jti, user_id, expires_at):
+        with self.lock:
+            self.outstanding[jti] = expires_at
+
+    def blacklist(self, jti, user_id, expires_at):
+        with self.lock:
+            if self._live(self.blacklisted, jti):
+                return False
+            self.blacklisted[jti] = expires_at
+            return True
+
+    def is_blacklisted(self, jti):
+        with self.lock:
+            if self._live(self.blacklisted, jti):
+                return True
+        return self.legacy.contains(jti)
+
+    def record_login(self, user_id, when=None):
+        when = when or time.time()
+        with self.lock:
+            if not self._live(self.throttled, user_id):
+                self.throttled[user_id] = when + settings.LAST_LOGIN_THROTTLE
+                self.pending[user_id] = when
+            due = when >= self.next_flush
+            if due:
+                self.next_flush = when + settings.LAST_LOGIN_FLUSH_INTERVAL
+        if due:
+            self.flush_logins()
+
+    def flush_logins(self):
+        with self.lock:
+            logins, self.pending = self.pending, {}
+        return write_last_logins(logins)
+
+
+class DatabaseTokenStore:
+    """The token_blacklist app's tables, for deployments without Redis"""
+
+    def _outstanding(self, jti, user_id, expires_at):
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+        token, _ = OutstandingToken.objects.get_or_create(jti=jti, defaults={
+            'user_id': user_id,
+            'created_at': datetime.now(dt_timezone.utc),
+            'expires_at': datetime.fromtimestamp(expires_at, dt_timezone.utc),
+            'token': '',
+        })
+        return token
+
+    def outstand(self, jti, user_id, expires_at):
+        self._outstanding(jti, user_id, expires_at)
+
+    def blacklist(self, jti, user_id, expires_at):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+        _, created = BlacklistedToken.objects.get_or_create(token=self._outstanding(jti, user_id, expires_at))
+        return created
+
+    def is_blacklisted(self, jti):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def record_login(self, user_id, when=None):
+        write_last_logins({user_id: when or time.time()})
+
+
+STORES = {'redis': RedisTokenStore, 'memory': InMemoryTokenStore, 'database': DatabaseTokenStore}
+_stores = {}
+
+
+def get_token_store():
+    """The process-wide token state store selected by TOKEN_STATE_BACKEND"""
+    name = settings.TOKEN_STATE_BACKEND
+    if name not in _stores:
+        _stores[name] = STORES[name]()
+    return _stores[name]
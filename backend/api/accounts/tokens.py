@@ -0,0 +1,42 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from .token_state import get_token_store
+
+
+class StoredTokenMixin:
+    """Track a token's outstanding/blacklisted state in the configured token store"""
+
+    def state(self):
+        return self.payload[api_settings.JTI_CLAIM], self.payload.get(api_settings.USER_ID_CLAIM), self.payload['exp']
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super().verify(*args, **kwargs)
+
+    def check_blacklist(self):
+        if get_token_store().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """Blacklist this token; False if it already was"""
+        return get_token_store().blacklist(*self.state())
+
+    def outstand(self):
+        get_token_store().outstand(*self.state())
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.outstand()
+        return token
+
+
+class RefreshToken(StoredTokenMixin, tokens.Token):
+    """simplejwt's RefreshToken without the token_blacklist tables"""
+    token_type = tokens.RefreshToken.token_type
+    lifetime = tokens.RefreshToken.lifetime
+    no_copy_claims = tokens.RefreshToken.no_copy_claims
+    access_token_class = tokens.AccessToken
+    access_token = tokens.RefreshToken.access_token
@@ -1,11 +1,10 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
-from .views import RegisterView, CustomTokenObtainPairView, UserProfileView
+from .views import RegisterView, CustomTokenObtainPairView, StoredTokenRefreshView, StoredTokenVerifyView, UserProfileView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('token/refresh/', StoredTokenRefreshView.as_view(), name='token_refresh'),
+    path('token/verify/', StoredTokenVerifyView.as_view(), name='token_verify'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
 ]
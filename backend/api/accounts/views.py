@@ -2,9 +2,10 @@ from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 from django.contrib.auth.models import User
-from .serializers import UserSerializer, CustomTokenObtainPairSerializer
+from .authentication import CachedUserJWTAuthentication
+from .serializers import UserSerializer, CustomTokenObtainPairSerializer, StoredTokenRefreshSerializer, StoredTokenVerifySerializer
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -18,12 +19,20 @@ def register(request):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+class StoredTokenRefreshView(TokenRefreshView):
+    serializer_class = StoredTokenRefreshSerializer
+
+class StoredTokenVerifyView(TokenVerifyView):
+    serializer_class = StoredTokenVerifySerializer
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = UserSerializer
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
+    # Renders fields the token does not carry, so always use the full user
+    authentication_classes = (CachedUserJWTAuthentication,)
     queryset = User.objects.all()
     permission_classes = (IsAuthenticated,)
     serializer_class = UserSerializer
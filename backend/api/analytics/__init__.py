@@ -0,0 +1 @@
+# Analytics app: learning event pipeline and pre-aggregated course metrics
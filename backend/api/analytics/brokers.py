@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from django.conf import settings
+
+
+def sortable_id(entry_id):
+    """Stream ids ("<ms>-<seq>") padded so that string order matches stream order"""
+    ms, _, seq = entry_id.partition('-')
+    return f'{int(ms):020d}-{int(seq or 0):020d}'
+
+
+class RedisStreamBroker:
+    """
+    Append-only learning event log on a Redis Stream.
+
+    Consumers read through a consumer group; entries stay in the group's pending
+    list until acknowledged, so a crashed worker re-reads what it had not applied.
+    """
+
+    def __init__(self, client=None, stream=None, maxlen=None):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.client = client
+        self.stream = stream or settings.EVENT_STREAM
+        self.maxlen = maxlen or settings.EVENT_STREAM_MAXLEN
+
+    def append(self, events):
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {'event': json.dumps(event)}, maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+    def last_id(self):
+        """Id of the newest entry in the stream, or None while it is empty"""
+        newest = self.client.xrevrange(self.stream, count=1)
+        return newest[0][0].decode() if newest else None
+
+    def ensure_group(self, group):
+        try:
+            self.client.xgroup_create(self.stream, group, id='0', mkstream=True)
+        except Exception as error:
+            if 'BUSYGROUP' not in str(error):
+                raise
+
+    def read(self, group, consumer, count, block_ms=0):
+        """Return [(entry_id, event)]: this consumer's unacknowledged entries first, then new ones"""
+        for start in ('0', '>'):
+            response = self.client.xreadgroup(
+                group, consumer, {self.stream: start}, count=count, block=(block_ms or None) if start == '>' else None
+            )
+            entries, trimmed = [], []
+            for _, stream_entries in response or []:
+                for entry_id, fields in stream_entries:
+                    if fields:
+                        entries.append((entry_id.decode(), json.loads(fields[b'event'])))
+                    else:
+                        trimmed.append(entry_id)  # pending entry already cut off by MAXLEN
+            self.ack(group, trimmed)
+            if entries:
+                return entries
+        return []
+
+    def ack(self, group, entry_ids):
+        if entry_ids:
+            self.client.xack(self.stream, group, *entry_ids)
+
+
+class InMemoryBroker:
+    """Process-local stand-in for RedisStreamBroker with the same delivery semantics"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.entries = []
+        self.groups = {}
+        self._sequence = 0
+
+    def append(self, events):
+        with self.lock:
+            for event in events:
+                self._sequence += 1
+                self.entries.append((f'{int(time.time() * 1000)}-{self._sequence}', json.loads(json.dumps(event))))
+            self.lock.notify_all()
+
+    def last_id(self):
+        with self.lock:
+            return self.entries[-1][0] if self.entries else None
+
+    def ensure_group(self, group):
+        with self.lock:
+            self.groups.setdefault(group, {'delivered': 0, 'pending': {}})
+
+    def read(self, group, consumer, count, block_ms=0):
+        with self.lock:
+            state = self.groups[group]
+            own = [entry for entry in self.entries if state['pending'].get(entry[0]) == consumer]
+            if own:
+                return own[:count]
+            if state['delivered'] == len(self.entries) and block_ms:
+                self.lock.wait(block_ms / 1000)
+            new = self.entries[state['delivered']:state['delivered'] + count]
+            state['delivered'] += len(new)
+            for entry_id, _ in new:
+                state['pending'][entry_id] = consumer
+            return new
+
+    def ack(self, group, entry_ids):
+        with self.lock:
+            for entry_id in entry_ids:
+                self.groups[group]['pending'].pop(entry_id, None)
+
+
+BROKERS = {'redis': RedisStreamBroker, 'memory': InMemoryBroker}
+_brokers = {}
+
+
+def get_broker():
+    """The process-wide broker selected by EVENT_BROKER"""
+    name = settings.EVENT_BROKER
+    if name not in _brokers:
+        _brokers[name] = BROKERS[name]()
+    return _brokers[name]
@@ -0,0 +1,20 @@
+from django.conf import settings
+from .brokers import get_broker
+from .store import get_store
+
+
+def consume_once(consumer, batch_size=None, block_ms=0, broker=None, store=None):
+    """
+    Read one batch from the event stream, fold it into the analytics store and
+    acknowledge it. Returns the number of events applied.
+    """
+    broker = broker or get_broker()
+    store = store or get_store()
+    group = settings.EVENT_CONSUMER_GROUP
+    broker.ensure_group(group)
+    entries = broker.read(group, consumer, batch_size or settings.EVENT_BATCH_SIZE, block_ms)
+    if not entries:
+        return 0
+    store.apply(entries)
+    broker.ack(group, [entry_id for entry_id, _ in entries])
+    return len(entries)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .brokers import get_broker
+
+ENROLLMENT = 'enrollment'
+PROGRESS = 'progress'  # one lesson of one learner: watch time added, lesson started/completed
+COMPLETION = 'completion'  # enrollment progress changed, possibly completing the course
+UNENROLLMENT = 'unenrollment'  # enrollment deleted, with the progress it had reached
+PROGRESS_REMOVED = 'progress_removed'  # one lesson's progress row deleted, e.g. with its lesson or learner
+
+
+def make_event(kind, course_id, student_id, **fields):
+    return {'type': kind, 'course_id': course_id, 'student_id': student_id, 'at': timezone.now().isoformat(), **fields}
+
+
+def publish(events):
+    """
+    Append events to the learning event stream once the current transaction
+    commits, so rolled-back writes never reach analytics. No-op unless EVENT_PIPELINE is on.
+    """
+    if not settings.EVENT_PIPELINE or not events:
+        return
+    events = list(events)
+    transaction.on_commit(lambda: get_broker().append(events))
@@ -0,0 +1,22 @@
+import socket
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from analytics.consumer import consume_once
+
+
+class Command(BaseCommand):
+    help = 'Fold learning events from the event stream into the analytics store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default=socket.gethostname(), help='Consumer name within the group')
+        parser.add_argument('--batch-size', type=int, default=settings.EVENT_BATCH_SIZE)
+        parser.add_argument('--block', type=int, default=5000, help='Milliseconds to wait for new events')
+        parser.add_argument('--once', action='store_true', help='Apply what is queued now and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = consume_once(options['consumer'], options['batch_size'], 0 if options['once'] else options['block'])
+            if applied:
+                self.stdout.write(f'Applied {applied} events')
+            elif options['once']:
+                return
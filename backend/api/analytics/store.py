@@ -0,0 +1,172 @@
+import threading
+from django.conf import settings
+from django.utils import timezone
+from .brokers import sortable_id
+
+COUNTERS = ('enrollments', 'completions', 'progress_total', 'watched_seconds', 'progress_events')
+
+
+def fold(entries, applied=None):
+    """
+    Reduce stream entries to one increment per course, skipping entries at or
+    before the course's `applied` stream id. Returns
+    {course_id: {counter: delta, 'lessons': {lesson_id: {...}}, 'last_event_id': ...}}.
+    """
+    applied = applied or {}
+    deltas = {}
+    for entry_id, event in entries:
+        entry_id = sortable_id(entry_id)
+        if entry_id <= applied.get(event['course_id'], ''):
+            continue
+        delta = deltas.setdefault(event['course_id'], {**dict.fromkeys(COUNTERS, 0), 'lessons': {}})
+        delta['last_event_id'] = max(delta.get('last_event_id', ''), entry_id)
+        kind = event['type']
+        if kind == 'enrollment':
+            delta['enrollments'] += 1
+        elif kind == 'unenrollment':
+            delta['enrollments'] -= 1
+            delta['progress_total'] -= event['progress']
+            delta['completions'] -= event['completed']
+        elif kind == 'progress':
+            delta['progress_events'] += 1
+            delta['watched_seconds'] += event['watched_delta']
+            lesson = delta['lessons'].setdefault(str(event['lesson_id']), {'learners': 0, 'completed': 0})
+            lesson['learners'] += event['started']
+            lesson['completed'] += event['completed']
+        elif kind == 'progress_removed':
+            delta['watched_seconds'] -= event['watched_seconds']
+            lesson = delta['lessons'].setdefault(str(event['lesson_id']), {'learners': 0, 'completed': 0})
+            lesson['learners'] -= 1
+            lesson['completed'] -= event['completed']
+        elif kind == 'completion':
+            delta['progress_total'] += event['progress_delta']
+            delta['completions'] += event['completed_delta']
+    return deltas
+
+
+def summarize(document):
+    """Turn a stored course document into the shape analytics endpoints read"""
+    enrollments = document.get('enrollments', 0)
+    return {
+        'enrollments': enrollments,
+        'completions': document.get('completions', 0),
+        'average_progress': document.get('progress_total', 0) / enrollments if enrollments else 0,
+        'completion_rate': document.get('completions', 0) * 100 / enrollments if enrollments else 0,
+        'watched_seconds': document.get('watched_seconds', 0),
+        'progress_events': document.get('progress_events', 0),
+        'lessons': {int(lesson_id): counts for lesson_id, counts in document.get('lessons', {}).items()},
+        'updated_at': document.get('updated_at'),
+    }
+
+
+class MongoAnalyticsStore:
+    """
+    Per-course aggregate documents in MongoDB, the `mongodb` store that
+    DatabaseRouter reserves for the analytics app.
+
+    Each update is guarded by the course's last applied stream id, so a batch
+    that is re-delivered after a crash, or that overlaps a backfill, is not
+    counted twice. This assumes one consumer per stream, which keeps entries
+    for a course in order.
+    """
+
+    def __init__(self, collection=None):
+        if collection is None:
+            from pymongo import MongoClient
+            config = settings.MONGODB
+            client = MongoClient(config['HOST'], config['PORT'], serverSelectionTimeoutMS=config['TIMEOUT_MS'])
+            collection = client[config['NAME']]['course_aggregates']
+        self.collection = collection
+
+    def apply(self, entries):
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        now = timezone.now()
+        course_ids = list({event['course_id'] for _, event in entries})
+        applied = {
+            document['_id']: document['last_event_id']
+            for document in self.collection.find({'_id': {'$in': course_ids}}, {'last_event_id': 1})
+            if 'last_event_id' in document
+        }
+        operations = []
+        for course_id, delta in fold(entries, applied).items():
+            increments = {counter: delta[counter] for counter in COUNTERS if delta[counter]}
+            for lesson_id, counts in delta['lessons'].items():
+                for counter, value in counts.items():
+                    if value:
+                        increments[f'lessons.{lesson_id}.{counter}'] = value
+            update = {'$set': {'last_event_id': delta['last_event_id'], 'updated_at': now}}
+            if increments:
+                update['$inc'] = increments
+            operations.append(UpdateOne(
+                {'_id': course_id, 'last_event_id': {'$lt': delta['last_event_id']}}, update, upsert=True
+            ))
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as error:
+            # A duplicate key means the guard rejected an already applied batch
+            if any(write_error['code'] != 11000 for write_error in error.details['writeErrors']):
+                raise
+
+    def reset(self, course_id, snapshot, last_event_id):
+        """Replace a course's aggregates with a snapshot that covers the stream up to last_event_id"""
+        self.collection.update_one({'_id': course_id}, {'$set': {
+            **snapshot,
+            'lessons': {str(lesson_id): counts for lesson_id, counts in snapshot['lessons'].items()},
+            'last_event_id': last_event_id,
+            'updated_at': timezone.now(),
+        }}, upsert=True)
+
+    def course_summary(self, course_id):
+        document = self.collection.find_one({'_id': course_id})
+        return summarize(document) if document else None
+
+
+class InMemoryAnalyticsStore:
+    """Process-local store with the same semantics, for tests and single-process development"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.documents = {}
+
+    def apply(self, entries):
+        now = timezone.now()
+        with self.lock:
+            applied = {course_id: document['last_event_id'] for course_id, document in self.documents.items()}
+            for course_id, delta in fold(entries, applied).items():
+                document = self.documents.setdefault(course_id, {**dict.fromkeys(COUNTERS, 0), 'lessons': {}})
+                for counter in COUNTERS:
+                    document[counter] += delta[counter]
+                for lesson_id, counts in delta['lessons'].items():
+                    lesson = document['lessons'].setdefault(lesson_id, {'learners': 0, 'completed': 0})
+                    for counter, value in counts.items():
+                        lesson[counter] += value
+                document['last_event_id'] = delta['last_event_id']
+                document['updated_at'] = now
+
+    def reset(self, course_id, snapshot, last_event_id):
+        with self.lock:
+            document = self.documents.setdefault(course_id, {**dict.fromkeys(COUNTERS, 0), 'lessons': {}})
+            document.update(snapshot)
+            document['lessons'] = {str(lesson_id): dict(counts) for lesson_id, counts in snapshot['lessons'].items()}
+            document['last_event_id'] = last_event_id
+            document['updated_at'] = timezone.now()
+
+    def course_summary(self, course_id):
+        document = self.documents.get(course_id)
+        return summarize(document) if document else None
+
+
+STORES = {'mongodb': MongoAnalyticsStore, 'memory': InMemoryAnalyticsStore}
+_stores = {}
+
+
+def get_store():
+    """The process-wide analytics store selected by ANALYTICS_STORE"""
+    name = settings.ANALYTICS_STORE
+    if name not in _stores:
+        _stores[name] = STORES[name]()
+    return _stores[name]
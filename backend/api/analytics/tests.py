@@ -0,0 +1,143 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from courses.models import Course, Lesson
+from .brokers import InMemoryBroker, _brokers
+from .consumer import consume_once
+from .store import InMemoryAnalyticsStore, _stores
+
+PIPELINE_SETTINGS = dict(
+    EVENT_PIPELINE=True,
+    EVENT_BROKER='memory',
+    ANALYTICS_STORE='memory',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+
+
+@override_settings(**PIPELINE_SETTINGS)
+class EventPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _brokers['memory'] = self.broker = InMemoryBroker()
+        _stores['memory'] = self.store = InMemoryAnalyticsStore()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=self.instructor)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {order}', content='...', order=order)
+            for order in range(2)
+        ]
+        self.client = APIClient()
+
+    def act_as(self, username):
+        user = User.objects.create_user(username, password='pass')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/courses/{self.course.pk}/enroll/')
+        return user
+
+    def post_progress(self, events):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/progress/batch/', {'events': events}, format='json')
+
+    def test_consumer_folds_events_into_engagement_metrics(self):
+        first, second = self.lessons
+        self.act_as('finisher')
+        self.post_progress([{'lesson': first.pk, 'watched_duration': 60, 'completed': True}])
+        self.post_progress([
+            {'lesson': first.pk, 'watched_duration': 90, 'completed': True},
+            {'lesson': second.pk, 'watched_duration': 30, 'completed': True},
+        ])
+        self.act_as('starter')
+        self.post_progress([{'lesson': first.pk, 'watched_duration': 20}])
+
+        self.assertEqual(consume_once('test-worker'), 8)
+        self.assertEqual(consume_once('test-worker'), 0)
+
+        self.client.force_authenticate(self.instructor)
+        metrics = self.client.get(f'/api/courses/{self.course.pk}/engagement_metrics/').data
+        self.assertEqual(metrics['total_students'], 2)
+        self.assertEqual(metrics['completion_rate'], 50)
+        self.assertEqual(metrics['average_progress'], 50)
+        self.assertEqual(metrics['total_watched_seconds'], 90 + 30 + 20)
+        self.assertEqual(
+            [(row['lesson__title'], row['completion_rate']) for row in metrics['lesson_completion_rates']],
+            [('Lesson 0', 50), ('Lesson 1', 100)],
+        )
+
+    def test_redelivered_batch_is_not_counted_twice(self):
+        self.act_as('student')
+        self.broker.ensure_group('replay')
+        entries = self.broker.read('replay', 'worker', 10)
+        self.store.apply(entries)
+        self.store.apply(entries)
+        self.assertEqual(self.store.course_summary(self.course.pk)['enrollments'], 1)
+
+    def engagement_metrics(self):
+        self.client.force_authenticate(self.instructor)
+        return self.client.get(f'/api/courses/{self.course.pk}/engagement_metrics/').data
+
+    def test_deleted_enrollments_and_progress_leave_the_aggregates(self):
+        first, second = self.lessons
+        student = self.act_as('leaver')
+        self.post_progress([
+            {'lesson': first.pk, 'watched_duration': 60, 'completed': True},
+            {'lesson': second.pk, 'watched_duration': 30, 'completed': True},
+        ])
+        self.act_as('stayer')
+        self.post_progress([{'lesson': first.pk, 'watched_duration': 20}])
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        while consume_once('test-worker'):
+            pass
+
+        metrics = self.engagement_metrics()
+        self.assertEqual(metrics['total_students'], 1)
+        self.assertEqual(metrics['completion_rate'], 0)
+        self.assertEqual(metrics['average_progress'], 0)
+        self.assertEqual(metrics['total_watched_seconds'], 20)
+        self.assertEqual(
+            [(row['lesson__title'], row['completion_rate']) for row in metrics['lesson_completion_rates']],
+            [('Lesson 0', 0)],
+        )
+
+    def test_backfill_counts_learners_from_before_the_pipeline(self):
+        first, second = self.lessons
+        with self.settings(EVENT_PIPELINE=False):
+            self.act_as('early')
+            self.post_progress([
+                {'lesson': first.pk, 'watched_duration': 60, 'completed': True},
+                {'lesson': second.pk, 'watched_duration': 30, 'completed': True},
+            ])
+        call_command('backfill_analytics', stdout=StringIO())
+        self.act_as('late')
+        self.post_progress([{'lesson': first.pk, 'watched_duration': 20}])
+        while consume_once('test-worker'):
+            pass
+
+        metrics = self.engagement_metrics()
+        self.assertEqual(metrics['total_students'], 2)
+        self.assertEqual(metrics['completion_rate'], 50)
+        self.assertEqual(metrics['total_watched_seconds'], 110)
+        self.assertEqual(
+            [(row['lesson__title'], row['completion_rate']) for row in metrics['lesson_completion_rates']],
+            [('Lesson 0', 50), ('Lesson 1', 100)],
+        )
+
+    def test_backfill_does_not_recount_streamed_events(self):
+        self.act_as('student')
+        call_command('backfill_analytics', str(self.course.pk), stdout=StringIO())
+        self.assertEqual(consume_once('test-worker'), 1)
+        self.assertEqual(self.store.course_summary(self.course.pk)['enrollments'], 1)
+
+    def test_events_and_stats_report_the_same_keys(self):
+        self.act_as('student')
+        self.post_progress([{'lesson': self.lessons[0].pk, 'watched_duration': 45}])
+        with self.settings(EVENT_PIPELINE=False):
+            from_stats = self.engagement_metrics()
+        consume_once('test-worker')
+        from_events = self.engagement_metrics()
+        self.assertEqual(set(from_stats), set(from_events))
+        self.assertEqual(from_stats['total_watched_seconds'], from_events['total_watched_seconds'])
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from rest_framework import status
+from rest_framework.response import Response
+
+# Per-process hit/miss counters, keyed by (prefix, outcome)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+LOCK_TIMEOUT = 10  # seconds a rebuild lock is held before other workers give up waiting
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _record(prefix, outcome):
+    with _stats_lock:
+        _stats[(prefix, outcome)] += 1
+
+
+def cache_stats():
+    """Return a snapshot of the response cache counters for this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _version_key(prefix, scope):
+    return f'respcache:{prefix}:version:{scope}'
+
+
+def get_cache_version(prefix, scope):
+    """
+    Return the current version token for a cache scope. Versions are timestamps
+    rather than counters so an evicted version key can never resurrect old entries.
+    """
+    key = _version_key(prefix, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(prefix, *scopes):
+    """Invalidate every cached response stored under the given scopes"""
+    cache.set_many({_version_key(prefix, scope): time.time_ns() for scope in scopes}, timeout=None)
+
+
+def get_or_build(prefix, key, build, timeout):
+    """
+    Fetch a cached payload or build it under a lock so that concurrent misses for
+    the same key trigger a single rebuild. `build` returns (payload, cacheable).
+    """
+    payload = cache.get(key)
+    if payload is not None:
+        _record(prefix, 'hit')
+        return payload
+    _record(prefix, 'miss')
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        # Another worker is rebuilding this entry; wait for it instead of piling on
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            payload = cache.get(key)
+            if payload is not None:
+                _record(prefix, 'wait_hit')
+                return payload
+            if cache.get(lock_key) is None:
+                break  # the rebuild finished without storing anything
+        payload, _ = build()
+        return payload
+    try:
+        payload, cacheable = build()
+        if cacheable:
+            cache.set(key, payload, timeout=timeout)
+        return payload
+    finally:
+        cache.delete(lock_key)
+
+
+def detail_scope(view, kwargs):
+    """
+    Version scope (`detail:<pk>`) of a viewset detail request. The lookup value is
+    normalised by its model field so `/01/` shares the scope the signals bump for `/1/`;
+    returns None when the field rejects the value and the lookup cannot match anything.
+    """
+    opts = view.get_queryset().model._meta
+    field = opts.pk if view.lookup_field == 'pk' else opts.get_field(view.lookup_field)
+    try:
+        value = field.to_python(kwargs[view.lookup_url_kwarg or view.lookup_field])
+    except ValidationError:
+        return None
+    return f'detail:{value}'
+
+
+class CachedResponseMixin:
+    """
+    Cache list/retrieve payloads of a DRF viewset in the default cache.
+    Keys are versioned per object (`detail:<pk>`) and for the whole list (`list`);
+    call `bump_cache_version(cache_prefix, ...)` from model signals to invalidate.
+    """
+    cache_prefix = None
+    cache_timeout = None
+
+    def get_cache_prefix(self):
+        return self.cache_prefix or self.basename
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return settings.RESPONSE_CACHE_TIMEOUT
+
+    def get_cache_key(self, request, scope):
+        prefix = self.get_cache_prefix()
+        params = request.query_params
+        query = '&'.join(f'{name}={value}' for name in sorted(params) for value in params.getlist(name))
+        digest = hashlib.md5(query.encode()).hexdigest()
+        return f'respcache:{prefix}:{scope}:{get_cache_version(prefix, scope)}:{digest}'
+
+    def cached_response(self, request, scope, handler):
+        built = {}
+
+        def build():
+            response = built['response'] = handler()
+            return response.data, response.status_code == status.HTTP_200_OK
+
+        key = self.get_cache_key(request, scope)
+        payload = get_or_build(self.get_cache_prefix(), key, build, self.get_cache_timeout())
+        response = built.get('response')
+        if response is not None and response.status_code != status.HTTP_200_OK:
+            return response
+        return Response(payload)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, 'list', lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs)
+        scope = detail_scope(self, kwargs)
+        if scope is None:
+            return handler()
+        return self.cached_response(request, scope, handler)
@@ -0,0 +1,66 @@
+import datetime
+import hashlib
+import time
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from .caching import detail_scope, get_cache_version
+
+
+def make_etag(request, *parts):
+    """Quoted ETag over the validator parts, the query string and the negotiated format"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    source = repr((parts, request.get_full_path(), getattr(renderer, 'format', None)))
+    return '"%s"' % hashlib.md5(source.encode()).hexdigest()
+
+
+def conditional_response(request, handler, etag, last_modified=None):
+    """
+    Return 304 when the client's validators match, otherwise run `handler` and
+    attach ETag/Last-Modified to a successful response. Validators must be
+    computed without rendering the body, which is the point of asking first.
+    """
+    if last_modified is not None and timezone.is_naive(last_modified):
+        last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)  # e.g. pymongo datetimes
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    # If-None-Match wins over If-Modified-Since, whose whole seconds cannot see sub-second changes
+    evaluated = None if request.headers.get('If-None-Match') else timestamp
+    not_modified = get_conditional_response(request, etag=etag, last_modified=evaluated)
+    response = not_modified or handler()
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        # Only advertise a second that is over: a change later in it would otherwise share the date
+        if timestamp is not None and timestamp < int(time.time()):
+            response['Last-Modified'] = http_date(timestamp)
+        # Stored copies must be revalidated, which is a cheap 304 when nothing changed
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified support for list/retrieve of a DRF viewset. Validators come
+    from the response cache version tokens (see core.caching), which model signals
+    bump on every change and which record when that change happened, so answering
+    a conditional request costs no database query.
+    """
+    validator_prefix = None
+
+    def get_validator_prefix(self):
+        return self.validator_prefix or getattr(self, 'cache_prefix', None) or self.basename
+
+    def versioned_response(self, request, scope, handler):
+        version = get_cache_version(self.get_validator_prefix(), scope)
+        last_modified = datetime.datetime.fromtimestamp(version / 1e9, tz=datetime.timezone.utc)
+        return conditional_response(request, handler, make_etag(request, scope, version), last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(request, 'list', lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        scope = detail_scope(self, kwargs)
+        if scope is None:
+            return handler()
+        return self.versioned_response(request, scope, handler)
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within the pool's TIMEOUT; Django surfaces it as OperationalError"""
+
+
+class ConnectionPool:
+    """
+    Per-process pool of open psycopg2 connections for one database. Checkout hands
+    out the most recently returned connection, opens a new one below MAX_SIZE or
+    waits up to TIMEOUT for one to come back. Connections idle for CHECK_AFTER are
+    pinged before reuse, ones older than MAX_LIFETIME are recycled, and surplus
+    ones idle for MAX_IDLE are closed down to MIN_SIZE.
+    """
+
+    def __init__(self, alias, database, min_size=2, max_size=10, timeout=5.0, max_idle=300, max_lifetime=1800, check_after=30):
+        self.alias = alias
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.condition = threading.Condition()
+        self.pid = os.getpid()
+        self.idle = deque()  # (connection, returned_at), oldest first
+        self.opened_at = {}  # connection -> when it was opened, for every connection the pool owns
+        self.inherited = []
+        self.opening = 0  # slots reserved by checkouts that are still connecting
+        self.waiting = 0
+        self.counters = defaultdict(float)
+
+    def _after_fork(self):
+        # Closing the parent's connections here would end its sessions, so only forget them
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.inherited.extend(self.opened_at)
+            self.idle.clear()
+            self.opened_at.clear()
+
+    def checkout(self, connect):
+        """Borrow a connection; `connect` opens a new one when the pool may grow"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self.condition:
+                self._after_fork()
+                self._prune()
+                connection, returned_at = self._take(deadline)
+            if connection is None:
+                connection = self._open(connect)
+                break
+            if self._reusable(connection, returned_at):
+                break
+        waited = time.monotonic() - started
+        with self.condition:
+            self.counters['checkouts'] += 1
+            self.counters['wait_seconds'] += waited
+        return connection
+
+    def size(self):
+        return len(self.opened_at) + self.opening
+
+    def _take(self, deadline):
+        """An idle connection and when it was returned, or (None, None) after reserving a slot for a new one"""
+        self.waiting += 1
+        try:
+            if not self.idle and self.size() >= self.max_size:
+                self.counters['waits'] += 1
+            while not self.idle and self.size() >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise PoolTimeout(f'No connection to {self.alias!r} became free within {self.timeout}s')
+                self.condition.wait(remaining)
+        finally:
+            self.waiting -= 1
+        if self.idle:
+            return self.idle.pop()
+        self.opening += 1
+        return None, None
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.opening -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opening -= 1
+            self.opened_at[connection] = time.monotonic()
+            self.counters['connects'] += 1
+        return connection
+
+    def _reusable(self, connection, returned_at):
+        """Recycle connections past MAX_LIFETIME and ping ones idle longer than CHECK_AFTER"""
+        now = time.monotonic()
+        if connection.closed or now - self.opened_at.get(connection, now) > self.max_lifetime:
+            self._discard(connection, 'lifetime' if not connection.closed else 'broken')
+            return False
+        if now - returned_at > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except psycopg2.Error:
+                self._discard(connection, 'health_check')
+                return False
+        return True
+
+    def checkin(self, connection):
+        """Return a connection, rolled back to a clean state, or close it when it cannot be reused"""
+        with self.condition:
+            self._after_fork()
+            if connection not in self.opened_at:
+                connection.close()
+                return
+        if connection.closed:
+            self._discard(connection, 'broken')
+            return
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            self._discard(connection, 'broken')
+            return
+        if time.monotonic() - self.opened_at[connection] > self.max_lifetime:
+            self._discard(connection, 'lifetime')
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def _discard(self, connection, reason):
+        with self.condition:
+            self.opened_at.pop(connection, None)
+            self.counters[f'discarded:{reason}'] += 1
+            self.condition.notify()
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _prune(self):
+        """Close surplus connections idle for MAX_IDLE; called with the lock held"""
+        cutoff = time.monotonic() - self.max_idle
+        while self.idle and self.idle[0][1] < cutoff and self.size() > self.min_size:
+            connection, _ = self.idle.popleft()
+            self.opened_at.pop(connection, None)
+            self.counters['discarded:idle'] += 1
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+    def close(self):
+        """Close the idle connections; ones still checked out are closed when returned"""
+        with self.condition:
+            idle, self.idle = self.idle, deque()
+            for connection, _ in idle:
+                self.opened_at.pop(connection, None)
+        for connection, _ in idle:
+            connection.close()
+
+    def stats(self):
+        with self.condition:
+            size = self.size()
+            return {
+                'size': size,
+                'idle': len(self.idle),
+                'in_use': size - len(self.idle),
+                'max_size': self.max_size,
+                'waiting': self.waiting,
+                **self.counters,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """The process-wide pool for a database alias and the database it currently points at"""
+    database = conn_params.get('dbname') or conn_params.get('database')
+    key = (alias, database, conn_params.get('host'), conn_params.get('port'), conn_params.get('user'))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(alias, database, **{name.lower(): value for name, value in options.items()})
+        return _pools[key]
+
+
+def pool_stats():
+    """{(alias, database): stats} for every pool opened in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {(pool.alias, pool.database): pool.stats() for pool in pools}
+
+
+def close_pools(alias):
+    """Close and forget an alias's pools, e.g. before its database is dropped"""
+    with _pools_lock:
+        pools = [_pools.pop(key) for key in list(_pools) if key[0] == alias]
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,9 @@
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from ..pool import close_pools
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled sessions on the test database would block DROP DATABASE
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,227 @@
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'default'
+
+# Seconds a replica has been behind the primary; 0 when it has replayed everything it received
+LAG_SQL = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+_current = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    """Per-request routing flags: whether reads may use a replica and whether the request wrote"""
+
+    def __init__(self):
+        self.use_replicas = False
+        self.wrote = False
+
+
+class ReplicaPool:
+    """
+    Picks a read replica among those currently healthy, weighted or round-robin.
+    Each replica is checked at most once per REPLICA_HEALTH_CHECK_INTERVAL per process;
+    one that fails the check or lags more than REPLICA_MAX_LAG_SECONDS is ejected for
+    REPLICA_EJECT_SECONDS.
+    """
+
+    def __init__(self, weights, selection='weighted'):
+        self.weights = dict(weights)
+        self.selection = selection
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.ejected_until = {}
+        self.checked_at = {}
+
+    def choose(self):
+        candidates = [alias for alias in self.weights if self.is_healthy(alias)]
+        if not candidates:
+            return None
+        if self.selection == 'round_robin':
+            return candidates[next(self.counter) % len(candidates)]
+        return random.choices(candidates, weights=[self.weights[alias] for alias in candidates])[0]
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            if self.ejected_until.get(alias, 0) > now:
+                return False
+            if now - self.checked_at.get(alias, float('-inf')) < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+                return True
+            # Claim the check so concurrent requests keep using the replica meanwhile
+            self.checked_at[alias] = now
+        if self.check(alias):
+            return True
+        self.eject(alias)
+        return False
+
+    def check(self, alias):
+        """True when the replica answers and is within REPLICA_MAX_LAG_SECONDS of the primary"""
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor != 'postgresql':
+                    cursor.execute('SELECT 1')
+                    return True
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            connection.close()
+            return False
+        return float(lag or 0) <= settings.REPLICA_MAX_LAG_SECONDS
+
+    def eject(self, alias):
+        with self.lock:
+            self.ejected_until[alias] = time.monotonic() + settings.REPLICA_EJECT_SECONDS
+
+
+_pools = {}
+
+
+def get_replica_pool():
+    """The process-wide pool over DATABASE_REPLICAS"""
+    key = (tuple(sorted(settings.DATABASE_REPLICAS.items())), settings.REPLICA_SELECTION)
+    if key not in _pools:
+        _pools[key] = ReplicaPool(settings.DATABASE_REPLICAS, settings.REPLICA_SELECTION)
+    return _pools[key]
+
+
+def read_alias(instance=None):
+    """The replica the current read may use, or None for the primary"""
+    state = _current.get()
+    if state is None or not state.use_replicas or state.wrote or not settings.DATABASE_REPLICAS:
+        return None
+    if connections[PRIMARY].in_atomic_block:
+        return None
+    # Keep related lookups on the replica the instance came from
+    if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+        return instance._state.db
+    return get_replica_pool().choose()
+
+
+def record_write():
+    state = _current.get()
+    if state is not None:
+        state.wrote = True
+
+
+@contextmanager
+def replica_reads():
+    """Allow reads inside this block to use a replica, e.g. in reporting commands"""
+    state = _current.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _current.set(state)
+    previous, state.use_replicas = state.use_replicas, True
+    try:
+        yield state
+    finally:
+        state.use_replicas = previous
+        if token is not None:
+            _current.reset(token)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside this block, e.g. before writing back what was read"""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    previous, state.use_replicas = state.use_replicas, False
+    try:
+        yield
+    finally:
+        state.use_replicas = previous
+
+
+def _sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+def is_sticky(user):
+    """True while a user's recent write may not have reached the replicas yet"""
+    return bool(user and user.is_authenticated and cache.get(_sticky_key(user.pk)))
+
+
+def _route_chunks(content, state):
+    """Produce each chunk of a streaming body under the request's routing state"""
+    iterator = iter(content)
+    while True:
+        token = _current.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield chunk
+
+
+async def _aroute_chunks(content, state):
+    iterator = aiter(content)
+    while True:
+        token = _current.set(state)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track whether a request wrote to the primary. After a write the rest of the
+    request reads from the primary, and so do the user's next requests for
+    REPLICA_STICKY_SECONDS, so they read their own writes. Streaming bodies are
+    produced after this returns, so their chunks are routed with the same state.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if response.streaming:
+            route = _aroute_chunks if response.is_async else _route_chunks
+            response.streaming_content = route(response.streaming_content, state)
+        user = getattr(request, 'user', None)
+        if state.wrote and settings.DATABASE_REPLICAS and user is not None and user.is_authenticated:
+            cache.set(_sticky_key(user.pk), 1, timeout=settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+class ReplicaReadsMixin:
+    """
+    Opt a view's read-only requests into the replica pool. Viewsets can limit it to
+    `replica_actions`; plain APIViews leave it as None for every safe request.
+    """
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _current.get()
+        if state is None or request.method not in SAFE_METHODS:
+            return
+        if self.replica_actions is not None and getattr(self, 'action', None) not in self.replica_actions:
+            return
+        state.use_replicas = not is_sticky(request.user)
@@ -1,16 +1,21 @@
+from .replicas import PRIMARY, read_alias, record_write
+
+
 class DatabaseRouter:
     """
-    Router to handle multiple databases
+    Router to handle multiple databases. Writes go to the primary; reads go to a
+    read replica only for views that opted in (see core.databases.replicas).
     """
     def db_for_read(self, model, **hints):
         if model._meta.app_label == 'analytics':
             return 'mongodb'
-        return 'default'
+        return read_alias(hints.get('instance')) or PRIMARY
 
     def db_for_write(self, model, **hints):
         if model._meta.app_label == 'analytics':
             return 'mongodb'
-        return 'default'
+        record_write()
+        return PRIMARY
 
     def allow_relation(self, obj1, obj2, **hints):
         return True
@@ -18,4 +23,4 @@ class DatabaseRouter:
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         if app_label == 'analytics':
             return db == 'mongodb'
-        return db == 'default' 
\ No newline at end of file
+        return db == PRIMARY
@@ -0,0 +1,75 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_fields(request):
+    """
+    Field names selected with `?fields=a,b` on a read, or None when the client did not
+    restrict them. Writes always validate and render the full representation.
+    """
+    if request is None or request.method not in SAFE_METHODS or not request.query_params.get('fields'):
+        return None
+    return {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+
+
+def _lookup_root(lookup):
+    return getattr(lookup, 'prefetch_to', lookup).split('__')[0]
+
+
+class EagerLoadingMixin:
+    """
+    Let a serializer declare the relations it renders so querysets can load them up front.
+
+    Declare any of these on the serializer's Meta:
+      select_related   -- forward FK/one-to-one paths joined into the main query
+      prefetch_related -- reverse/many relations (names or Prefetch objects) loaded with one extra query each
+      only_fields      -- column whitelist for the rendered model and its joined relations
+
+    When `fields` is given, relations behind fields that will not be rendered are skipped.
+    """
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        meta = getattr(cls, 'Meta', None)
+        select_related = getattr(meta, 'select_related', ())
+        prefetch_related = getattr(meta, 'prefetch_related', ())
+        only_fields = getattr(meta, 'only_fields', ())
+        if fields is not None:
+            select_related = [lookup for lookup in select_related if _lookup_root(lookup) in fields]
+            prefetch_related = [lookup for lookup in prefetch_related if _lookup_root(lookup) in fields]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if only_fields:
+            queryset = queryset.only(*only_fields)
+        return queryset
+
+
+class EagerLoadingViewSetMixin:
+    """
+    Apply the serializer's declared eager loading to the viewset's queryset.
+    Only read actions that render the serializer are optimized; writes and custom
+    actions keep the plain queryset so deferred fields never reach a save().
+    """
+    eager_loading_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if self.action in self.eager_loading_actions and hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset, fields=requested_fields(self.request))
+        return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    Render only the fields a client asks for with `?fields=a,b`; unknown names are ignored.
+    Applies to the top-level serializer, which receives the request in its context.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
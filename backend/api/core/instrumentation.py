@@ -0,0 +1,276 @@
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from .caching import cache_stats
+from .databases.pool import pool_stats
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_timings', default=None)
+
+# (pid, index, lock file) of the worker slot this process holds; see _worker_index
+_worker_slot = (None, None, None)
+_worker_slot_lock = threading.Lock()
+
+
+class RequestTimings:
+    """Per-request counters collected while the request is being handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.spans = defaultdict(float)
+        self.active = set()
+
+
+@contextmanager
+def span(name):
+    """
+    Time a named section of the current request. Re-entering a span that is
+    already open (e.g. nested serializers) is not counted twice.
+    """
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] += time.perf_counter() - started
+        timings.active.discard(name)
+
+
+def timed(name):
+    """Decorator form of `span`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class InstrumentedSerializerMixin:
+    """Attribute time spent rendering this serializer to the `serialize` span"""
+
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    In-process aggregates per view. Each worker process exports its own series,
+    told apart by a `worker` label, so a scrape that lands on another worker
+    never looks like a counter reset; sum over `worker` to get totals. The label
+    is a per-host slot index, so a restarted worker resumes its predecessor's series.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+
+    def record(self, view, status, total_seconds, timings):
+        with self.lock:
+            self.latency[view].observe(total_seconds)
+            self.counters[('requests', view, status)] += 1
+            self.counters[('queries', view, None)] += timings.queries
+            self.counters[('db_seconds', view, None)] += timings.db_seconds
+            for name, seconds in timings.spans.items():
+                self.counters[('span_seconds', view, name)] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            latency = {
+                view: (list(histogram.bucket_counts), histogram.count, histogram.total)
+                for view, histogram in self.latency.items()
+            }
+            return latency, dict(self.counters)
+
+
+registry = MetricsRegistry()
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Count SQL queries and DB time per request through connection.execute_wrapper,
+    emit a Server-Timing header and feed the per-view metrics registry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _execute(self, execute, sql, params, many, context):
+        timings = _current.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if timings is not None:
+                timings.queries += 1
+                timings.db_seconds += time.perf_counter() - started
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        registry.record(view, response.status_code, total, timings)
+
+        entries = [f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries"']
+        entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(timings.spans.items())]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+        return response
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _worker_index():
+    """
+    Lowest per-host slot not held by another live process, claimed with a flock the
+    kernel drops when the process exits. Worker restarts then reuse indexes instead of
+    adding a series per pid; checked per pid so forked workers claim their own slot.
+    """
+    global _worker_slot
+    with _worker_slot_lock:
+        pid, index, handle = _worker_slot
+        if pid != os.getpid():
+            if handle is not None:
+                handle.close()  # the parent's slot, inherited across fork
+            index = 0
+            while True:
+                handle = open(os.path.join(tempfile.gettempdir(), f'nextcurl-metrics-worker-{index}.lock'), 'w')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    handle.close()
+                    index += 1
+            _worker_slot = (os.getpid(), index, handle)
+        return index
+
+
+def _worker():
+    """Label identifying this worker"""
+    return f'worker="{_worker_index()}"'
+
+
+# Pooled connection metrics (DB_POOL=1): name, type, help, key in ConnectionPool.stats()
+POOL_METRICS = (
+    ('nextcurl_db_pool_max_connections', 'gauge', 'Pool size limit.', 'max_size'),
+    ('nextcurl_db_pool_waiting', 'gauge', 'Checkouts currently waiting for a free connection.', 'waiting'),
+    ('nextcurl_db_pool_checkouts_total', 'counter', 'Connections handed out.', 'checkouts'),
+    ('nextcurl_db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection.', 'waits'),
+    ('nextcurl_db_pool_wait_seconds_total', 'counter', 'Time spent checking out connections.', 'wait_seconds'),
+    ('nextcurl_db_pool_timeouts_total', 'counter', 'Checkouts that gave up after the pool TIMEOUT.', 'timeouts'),
+    ('nextcurl_db_pool_connects_total', 'counter', 'Connections opened.', 'connects'),
+)
+
+
+def render_pool_metrics():
+    pools = [(f'{_worker()},alias="{_label(alias)}",database="{_label(database)}"', stats) for (alias, database), stats in sorted(pool_stats().items())]
+    if not pools:
+        return []
+    lines = ['# HELP nextcurl_db_pool_connections Open pooled connections by state.',
+             '# TYPE nextcurl_db_pool_connections gauge']
+    for labels, stats in pools:
+        for state in ('idle', 'in_use'):
+            lines.append(f'nextcurl_db_pool_connections{{{labels},state="{state}"}} {stats[state]}')
+    for metric, kind, help_text, key in POOL_METRICS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        lines += [f'{metric}{{{labels}}} {stats.get(key, 0)}' for labels, stats in pools]
+    lines += ['# HELP nextcurl_db_pool_discarded_total Connections closed by the pool, by reason.',
+              '# TYPE nextcurl_db_pool_discarded_total counter']
+    for labels, stats in pools:
+        for name, value in sorted(stats.items()):
+            if name.startswith('discarded:'):
+                lines.append(f'nextcurl_db_pool_discarded_total{{{labels},reason="{name.partition(":")[2]}"}} {value}')
+    return lines
+
+
+def render_prometheus():
+    """Render the registry in the Prometheus text exposition format"""
+    latency, counters = registry.snapshot()
+    worker = _worker()
+    lines = [
+        '# HELP nextcurl_request_duration_seconds Request latency per view.',
+        '# TYPE nextcurl_request_duration_seconds histogram',
+    ]
+    for view, (bucket_counts, count, total) in sorted(latency.items()):
+        labels = f'{worker},view="{_label(view)}"'
+        for bound, bucket_count in zip(BUCKETS, bucket_counts):
+            lines.append(f'nextcurl_request_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket_count}')
+        lines.append(f'nextcurl_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'nextcurl_request_duration_seconds_sum{{{labels}}} {total}')
+        lines.append(f'nextcurl_request_duration_seconds_count{{{labels}}} {count}')
+
+    families = {
+        'requests': ('nextcurl_requests_total', 'Requests per view and status.', 'status'),
+        'queries': ('nextcurl_db_queries_total', 'SQL queries issued per view.', None),
+        'db_seconds': ('nextcurl_db_seconds_total', 'Time spent in SQL per view.', None),
+        'span_seconds': ('nextcurl_span_seconds_total', 'Time spent in named spans per view.', 'span'),
+    }
+    for kind, (metric, help_text, extra_label) in families.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (counter_kind, view, extra), value in sorted(counters.items(), key=lambda item: str(item[0])):
+            if counter_kind != kind:
+                continue
+            labels = f'{worker},view="{_label(view)}"'
+            if extra_label:
+                labels += f',{extra_label}="{_label(extra)}"'
+            lines.append(f'{metric}{{{labels}}} {value}')
+
+    lines += ['# HELP nextcurl_response_cache_total Response cache lookups by outcome.',
+              '# TYPE nextcurl_response_cache_total counter']
+    for (prefix, outcome), value in sorted(cache_stats().items()):
+        lines.append(f'nextcurl_response_cache_total{{{worker},prefix="{_label(prefix)}",outcome="{_label(outcome)}"}} {value}')
+    return '\n'.join(lines + render_pool_metrics()) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; guarded by METRICS_TOKEN when one is configured"""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4')
@@ -25,10 +25,13 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "courses",
     "accounts",
+    "analytics",
     'rest_framework_simplejwt.token_blacklist',
 ]
 
 MIDDLEWARE = [
+    "core.instrumentation.QueryInstrumentationMiddleware",
+    "core.databases.replicas.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,19 +60,51 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
 
-# Database
+# Database. DB_POOL=1 borrows connections from a per-process pool (core.databases.pool)
+# and returns them after each request; otherwise CONN_MAX_AGE keeps one per thread.
+DB_POOL = os.getenv('DB_POOL', '0') == '1'
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.databases.pooled' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'nextcurl'),
         'USER': os.getenv('POSTGRES_USER', os.getenv('USER')),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 2)),  # idle connections kept open
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),  # per process; at least the worker's thread count
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),  # seconds to wait for a free connection
+            'CHECK_AFTER': int(os.getenv('DB_POOL_CHECK_AFTER', 30)),  # ping connections idle this long before reuse
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        },
     }
 }
 
+# Read replicas as "host[:port][=weight],..."; each becomes DATABASES['replica_<n>'].
+# Only views that opt in (core.databases.replicas.ReplicaReadsMixin) read from them.
+DATABASE_REPLICAS = {}  # alias -> selection weight
+for _index, _spec in enumerate(filter(None, os.getenv('POSTGRES_REPLICAS', '').split(',')), start=1):
+    _address, _, _weight = _spec.strip().partition('=')
+    _host, _, _port = _address.partition(':')
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[f'replica_{_index}'] = int(_weight or 1)
+REPLICA_SELECTION = os.getenv('REPLICA_SELECTION', 'weighted')  # or 'round_robin'
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))  # reads stay on the primary after a user's write
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', 10))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_EJECT_SECONDS = int(os.getenv('REPLICA_EJECT_SECONDS', 30))
+
 # Redis configuration
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -116,7 +151,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -128,10 +163,72 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login is written in batches by the token store, see LAST_LOGIN_THROTTLE
+    'UPDATE_LAST_LOGIN': False,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# Where refresh token state lives: 'redis' (keys expire with the token), 'memory' or 'database'
+TOKEN_STATE_BACKEND = os.getenv('TOKEN_STATE_BACKEND', 'redis')
+LAST_LOGIN_THROTTLE = int(os.getenv('LAST_LOGIN_THROTTLE', 300))  # seconds between recorded logins of one user
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', 60))  # seconds between batched last_login writes
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))  # users kept per process by accounts.authentication
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))  # seconds before a cached user's version is re-checked
+
 # Add to existing settings
 DATABASE_ROUTERS = ['core.databases.routers.DatabaseRouter']
+
+# Recommender settings
+RECOMMENDER_POPULARITY_TTL = int(os.getenv('RECOMMENDER_POPULARITY_TTL', 300))  # seconds between popularity re-clustering
+RECOMMENDATION_TOP_K = int(os.getenv('RECOMMENDATION_TOP_K', 20))  # courses kept per user by precompute_recommendations
+RECOMMENDER_ARTIFACT_DIR = os.getenv('RECOMMENDER_ARTIFACT_DIR', str(BASE_DIR / 'artifacts'))
+CF_NEIGHBORS = int(os.getenv('CF_NEIGHBORS', 50))  # neighbours kept per course by the collaborative index
+ARTIFACT_RELOAD_INTERVAL = float(os.getenv('ARTIFACT_RELOAD_INTERVAL', 30))  # seconds between checks for new artifact versions
+
+# Delegate content-based scoring to the ai_vr inference service; empty to always score in-process
+AI_SERVICE_URL = os.getenv('AI_SERVICE_URL', '')
+AI_SERVICE_TIMEOUT = float(os.getenv('AI_SERVICE_TIMEOUT', 0.5))  # seconds, then fall back to local scoring
+AI_SERVICE_POOL_SIZE = int(os.getenv('AI_SERVICE_POOL_SIZE', 8))  # keep-alive connections per worker process
+
+# Course analytics rollups are recomputed on read once dirty and older than this many seconds
+COURSE_STATS_MAX_AGE = int(os.getenv('COURSE_STATS_MAX_AGE', 60))
+
+# Default lifetime (seconds) of cached DRF list/retrieve payloads, see core.caching
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+# /api/search/: lessons quoted per course result and the length of each snippet in words
+SEARCH_SNIPPETS_PER_COURSE = int(os.getenv('SEARCH_SNIPPETS_PER_COURSE', 3))
+SEARCH_SNIPPET_WORDS = int(os.getenv('SEARCH_SNIPPET_WORDS', 30))
+
+# Upper bound on events accepted by POST /api/progress/batch/
+PROGRESS_BATCH_MAX_EVENTS = int(os.getenv('PROGRESS_BATCH_MAX_EVENTS', 500))
+
+# Buffer progress heartbeats in Redis and let `manage.py flush_progress_buffer` write them out
+PROGRESS_WRITE_BEHIND = os.getenv('PROGRESS_WRITE_BEHIND', '0') == '1'
+PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5))  # seconds
+PROGRESS_FLUSH_BATCH_SIZE = int(os.getenv('PROGRESS_FLUSH_BATCH_SIZE', 1000))
+
+# Learning event pipeline: write paths append enrollment/progress/completion events to a
+# Redis Stream and `manage.py consume_events` folds them into the analytics store
+EVENT_PIPELINE = os.getenv('EVENT_PIPELINE', '0') == '1'
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'redis')  # or 'memory' for a single process
+EVENT_STREAM = os.getenv('EVENT_STREAM', 'events:learning')
+EVENT_STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', 1000000))  # approximate cap on retained entries
+EVENT_CONSUMER_GROUP = os.getenv('EVENT_CONSUMER_GROUP', 'analytics')
+EVENT_BATCH_SIZE = int(os.getenv('EVENT_BATCH_SIZE', 500))
+ANALYTICS_STORE = os.getenv('ANALYTICS_STORE', 'mongodb')  # or 'memory'
+
+# Analytics aggregates (the `mongodb` alias DatabaseRouter assigns to the analytics app)
+MONGODB = {
+    'HOST': os.getenv('MONGO_HOST', 'localhost'),
+    'PORT': int(os.getenv('MONGO_PORT', 27017)),
+    'NAME': os.getenv('MONGO_DB', 'nextcurl_analytics'),
+    'TIMEOUT_MS': int(os.getenv('MONGO_TIMEOUT_MS', 2000)),
+}
+
+# Students listed inline by the course analytics action; student_progress pages through the rest
+ANALYTICS_ROSTER_PREVIEW = int(os.getenv('ANALYTICS_ROSTER_PREVIEW', 50))
+
+# Bearer token required to scrape /api/_metrics; leave empty to allow unauthenticated scrapes
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
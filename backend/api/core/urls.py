@@ -1,16 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-    TokenVerifyView,
-)
+from core.instrumentation import metrics_view
+from accounts.views import CustomTokenObtainPairView, StoredTokenRefreshView, StoredTokenVerifyView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics_view, name='metrics'),
     path('api/', include('courses.urls')),         
     path('api/auth/', include('accounts.urls')),     
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', StoredTokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/verify/', StoredTokenVerifyView.as_view(), name='token_verify'),
 ]
@@ -0,0 +1 @@
+# Courses app initialization
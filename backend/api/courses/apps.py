@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CoursesConfig(AppConfig):
+    name = 'courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+POINTER = 'CURRENT'
+MANIFEST = 'manifest.json'
+
+
+class Artifact:
+    """One published version: memory-mapped arrays plus the metadata written with them"""
+
+    def __init__(self, version, arrays, metadata):
+        self.version = version
+        self.arrays = arrays
+        self.metadata = metadata
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+
+class ArtifactStore:
+    """
+    Versioned on-disk recommender artifacts.
+
+    Every version is a directory of `.npy` files and a manifest; a `CURRENT` file
+    names the live one and is swapped with an atomic rename, so readers see either
+    the old or the new version. Arrays are opened with `mmap_mode='r'`, letting all
+    worker processes on a host share one copy through the page cache.
+    """
+    keep_versions = 3
+
+    def __init__(self, name, root=None):
+        self.name = name
+        self.root = root
+        self._loaded = None
+        self._checked_at = 0.0
+
+    @property
+    def path(self):
+        return os.path.join(self.root or settings.RECOMMENDER_ARTIFACT_DIR, self.name)
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.path, POINTER)) as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, arrays, metadata=None):
+        """Write a new version and make it current. Returns the version name."""
+        os.makedirs(self.path, exist_ok=True)
+        version = f'{time.time_ns():d}'
+        staging = tempfile.mkdtemp(dir=self.path, prefix='.staging-')
+        try:
+            for key, value in arrays.items():
+                np.save(os.path.join(staging, f'{key}.npy'), np.ascontiguousarray(value))
+            with open(os.path.join(staging, MANIFEST), 'w') as manifest:
+                json.dump({'version': version, 'arrays': sorted(arrays), 'metadata': metadata or {}}, manifest)
+            os.rename(staging, os.path.join(self.path, version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        handle, pointer = tempfile.mkstemp(dir=self.path, prefix='.pointer-')
+        with os.fdopen(handle, 'w') as tmp:
+            tmp.write(version)
+        os.replace(pointer, os.path.join(self.path, POINTER))
+        self.prune(version)
+        return version
+
+    def prune(self, current):
+        """Delete all but the newest `keep_versions` versions (open mmaps stay valid on POSIX)"""
+        versions = sorted(entry for entry in os.listdir(self.path) if entry.isdigit() and entry != current)
+        for version in versions[:max(len(versions) - self.keep_versions + 1, 0)]:
+            shutil.rmtree(os.path.join(self.path, version), ignore_errors=True)
+
+    def open(self, version=None):
+        """Memory-map a version (the current one by default); None when nothing was published"""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        directory = os.path.join(self.path, version)
+        with open(os.path.join(directory, MANIFEST)) as manifest:
+            manifest = json.load(manifest)
+        arrays = {
+            key: np.load(os.path.join(directory, f'{key}.npy'), mmap_mode='r')
+            for key in manifest['arrays']
+        }
+        return Artifact(version, arrays, manifest['metadata'])
+
+    def load(self, max_age=None):
+        """
+        Return the process-wide view of the current version, re-reading the pointer
+        at most every `max_age` seconds (ARTIFACT_RELOAD_INTERVAL by default). A version
+        that cannot be opened (pruned or half-copied) leaves the loaded one in place.
+        """
+        max_age = settings.ARTIFACT_RELOAD_INTERVAL if max_age is None else max_age
+        now = time.monotonic()
+        if self._loaded is not None and now - self._checked_at < max_age:
+            return self._loaded
+        self._checked_at = now
+        version = self.current_version()
+        if version is not None and (self._loaded is None or self._loaded.version != version):
+            try:
+                self._loaded = self.open(version)
+            except (OSError, ValueError):
+                logger.exception('Could not open %s artifact version %s; keeping %s', self.name, version,
+                                 self._loaded.version if self._loaded else None)
+        return self._loaded
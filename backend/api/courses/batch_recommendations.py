@@ -0,0 +1,68 @@
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+from .features import FeatureMatrix, preference_vector
+from .models import Enrollment, LessonProgress, UserRecommendation
+
+
+def build_profiles(user_ids):
+    """
+    Learner profiles for many users with three grouped queries, matching
+    RecommendationView.get_user_profile. Users without enrollments are omitted.
+    Returns (profiles, enrolled_course_ids) keyed by user id.
+    """
+    profiles, enrolled = {}, {}
+    for row in (
+        Enrollment.objects.filter(student__in=user_ids).values('student')
+        .annotate(avg=Avg('progress'), completed=Count('id', filter=Q(completed=True)))
+    ):
+        profiles[row['student']] = {
+            'preferred_difficulty': 'beginner',
+            'avg_completion_rate': row['avg'] or 0,
+            'total_learning_time': 0,
+            'completed_courses': row['completed'],
+        }
+
+    # Rows arrive most frequent first per student, so the first one seen wins
+    seen = set()
+    for student, difficulty, count in (
+        Enrollment.objects.filter(student__in=user_ids)
+        .values_list('student', 'course__difficulty_level').annotate(count=Count('id'))
+        .order_by('student', '-count', 'course__difficulty_level')
+    ):
+        if student not in seen:
+            seen.add(student)
+            profiles[student]['preferred_difficulty'] = difficulty
+
+    for student, total in (
+        LessonProgress.objects.filter(student__in=user_ids)
+        .values('student').annotate(total=Sum('watched_duration')).values_list('student', 'total')
+    ):
+        if student in profiles:
+            profiles[student]['total_learning_time'] = total or 0
+
+    for student, course_id in Enrollment.objects.filter(student__in=user_ids).values_list('student', 'course_id'):
+        enrolled.setdefault(student, []).append(course_id)
+    return profiles, enrolled
+
+
+def precompute_chunk(user_ids, top_k):
+    """Score one chunk of users with a single users x courses matrix product and store the results"""
+    matrix = FeatureMatrix.load()
+    profiles, enrolled = build_profiles(user_ids)
+    users = list(profiles)
+    ranked = matrix.top_k(
+        [preference_vector(profiles[user]) for user in users],
+        [enrolled.get(user, ()) for user in users],
+        top_k,
+    )
+    now = timezone.now()
+    UserRecommendation.objects.bulk_create(
+        [
+            UserRecommendation(user_id=user, profile=profiles[user], recommendations=top, generated_at=now)
+            for user, top in zip(users, ranked)
+        ],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['profile', 'recommendations', 'generated_at'],
+    )
+    return len(users)
@@ -0,0 +1,241 @@
+import time
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .artifacts import ArtifactStore
+from .models import Course, Enrollment, LessonProgress
+
+
+def interaction_weight(progress, watched_seconds):
+    """Implicit-feedback strength of an enrollment: enrolling, progressing and watching all count"""
+    return 1.0 + np.asarray(progress, dtype=np.float32) / 100 + np.log1p(np.asarray(watched_seconds, dtype=np.float32) / 3600)
+
+
+def _watched_subquery():
+    watched = (
+        LessonProgress.objects.filter(student=OuterRef('student'), lesson__course=OuterRef('course'))
+        .order_by().values('student').annotate(total=Sum('watched_duration')).values('total')
+    )
+    return Coalesce(Subquery(watched, output_field=IntegerField()), 0)
+
+
+def iter_interactions(enrollments, chunk_size=10000):
+    """Yield (student_id, course_id, progress, watched_seconds) rows from the database in chunks"""
+    return (
+        enrollments.annotate(watched=_watched_subquery())
+        .values_list('student_id', 'course_id', 'progress', 'watched')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _prune_rows(block, columns, neighbors):
+    """Keep the `neighbors` strongest entries of each row of a CSR block, dropping each row's own course"""
+    rows, cols, vals = [], [], []
+    for local_row, column in enumerate(columns):
+        start, end = block.indptr[local_row], block.indptr[local_row + 1]
+        indices, data = block.indices[start:end], block.data[start:end]
+        keep = (indices != column) & (data > 0)
+        indices, data = indices[keep], data[keep]
+        if len(data) > neighbors:
+            top = np.argpartition(-data, neighbors - 1)[:neighbors]
+            indices, data = indices[top], data[top]
+        rows.append(np.full(len(indices), local_row, dtype=np.int32))
+        cols.append(indices)
+        vals.append(data)
+    return sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=block.shape, dtype=np.float32
+    )
+
+
+def _normalize_columns(X):
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    return (X @ sparse.diags(1.0 / norms)).tocsc()
+
+
+def item_neighbors(X, course_columns, neighbors, block_size):
+    """
+    Cosine similarity of the given course columns against every course, computed
+    in blocks so at most `block_size` x n_courses similarities are in memory at once.
+    """
+    Xn = _normalize_columns(X)
+    XnT = Xn.T.tocsr()
+    blocks = []
+    for start in range(0, len(course_columns), block_size):
+        columns = course_columns[start:start + block_size]
+        block = (XnT[columns] @ Xn).tocsr()
+        blocks.append(_prune_rows(block, columns, neighbors))
+    if not blocks:
+        return sparse.csr_matrix((0, X.shape[1]), dtype=np.float32)
+    return sparse.vstack(blocks, format='csr')
+
+
+class CollaborativeModel:
+    """
+    Item-item collaborative filtering over a sparse user x course interaction matrix.
+
+    `interactions` (users x courses, CSR) holds implicit-feedback weights and
+    `neighbors` (courses x courses, CSR) keeps the top-N cosine neighbours of each
+    course. Scoring a learner is one sparse vector-matrix product.
+    """
+    store = ArtifactStore('collaborative')
+    _current = None
+    version = None
+
+    def __init__(self, user_ids, course_ids, interactions, neighbors, built_at=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.interactions = interactions.tocsr()
+        self.neighbors = neighbors.tocsr()
+        self.built_at = built_at or time.time()
+        self.course_positions = {course_id: index for index, course_id in enumerate(self.course_ids.tolist())}
+
+    @classmethod
+    def fit(cls, neighbors=None, block_size=256, chunk_size=10000):
+        """Build the interaction matrix from the database and compute the neighbour index"""
+        neighbors = neighbors or settings.CF_NEIGHBORS
+        built_at = time.time()
+        course_ids = list(Course.objects.order_by('id').values_list('id', flat=True))
+        course_positions = {course_id: index for index, course_id in enumerate(course_ids)}
+        user_positions = {}
+        rows, cols, progress, watched = array('i'), array('i'), array('f'), array('f')
+        for student_id, course_id, course_progress, seconds in iter_interactions(Enrollment.objects.all(), chunk_size):
+            if course_id not in course_positions:
+                continue
+            rows.append(user_positions.setdefault(student_id, len(user_positions)))
+            cols.append(course_positions[course_id])
+            progress.append(course_progress)
+            watched.append(seconds)
+        X = sparse.csr_matrix(
+            (interaction_weight(progress, watched), (np.frombuffer(rows, dtype=np.int32), np.frombuffer(cols, dtype=np.int32))),
+            shape=(len(user_positions), len(course_ids)),
+            dtype=np.float32,
+        )
+        S = item_neighbors(X, np.arange(len(course_ids)), neighbors, block_size)
+        return cls(list(user_positions), course_ids, X, S, built_at=built_at)
+
+    def refresh_courses(self, course_ids, neighbors=None, block_size=256):
+        """
+        Incrementally reload the interactions of the given courses and recompute their
+        neighbour lists. Courses the model has not seen yet are appended as new columns.
+        Other courses keep their lists (including stale similarities towards refreshed
+        or added courses) until the next full fit.
+        """
+        neighbors = neighbors or settings.CF_NEIGHBORS
+        built_at = time.time()
+        all_course_ids = self.course_ids.tolist()
+        course_positions = dict(self.course_positions)
+        unknown = {course_id for course_id in course_ids if course_id not in course_positions}
+        for course_id in Course.objects.filter(id__in=unknown).order_by('id').values_list('id', flat=True):
+            course_positions[course_id] = len(all_course_ids)
+            all_course_ids.append(course_id)
+        columns = sorted({course_positions[course_id] for course_id in course_ids if course_id in course_positions})
+        if not columns:
+            return self
+        user_positions = {user_id: index for index, user_id in enumerate(self.user_ids.tolist())}
+        user_ids = list(self.user_ids.tolist())
+        rows, cols, progress, watched = [], [], [], []
+        enrollments = Enrollment.objects.filter(course__in=[all_course_ids[column] for column in columns])
+        for student_id, course_id, course_progress, seconds in iter_interactions(enrollments):
+            if student_id not in user_positions:
+                user_positions[student_id] = len(user_ids)
+                user_ids.append(student_id)
+            rows.append(user_positions[student_id])
+            cols.append(course_positions[course_id])
+            progress.append(course_progress)
+            watched.append(seconds)
+
+        shape = (len(user_ids), len(all_course_ids))
+        X = self.interactions.tocoo()
+        X = sparse.csr_matrix((X.data, (X.row, X.col)), shape=shape)
+        mask = np.ones(shape[1], dtype=np.float32)
+        mask[columns] = 0
+        fresh = sparse.csr_matrix((interaction_weight(progress, watched), (rows, cols)), shape=shape, dtype=np.float32)
+        X = (X @ sparse.diags(mask) + fresh).tocsr()
+        X.eliminate_zeros()
+
+        S = self.neighbors.tocoo()
+        S = sparse.csr_matrix((S.data, (S.row, S.col)), shape=(shape[1], shape[1]), dtype=np.float32)
+        updated = item_neighbors(X, np.asarray(columns), neighbors, block_size).tocoo()
+        replacement = sparse.csr_matrix(
+            (updated.data, (np.asarray(columns)[updated.row], updated.col)), shape=S.shape, dtype=np.float32
+        )
+        S = (sparse.diags(mask) @ S + replacement).tocsr()
+        return type(self)(user_ids, all_course_ids, X, S, built_at=built_at)
+
+    def recommend(self, interactions, exclude_ids=(), limit=5):
+        """
+        Rank courses for a learner given their {course_id: weight} interactions.
+        Scores are interaction-weighted mean similarities in [0, 1]; returns (course_id, score) pairs, best first.
+        """
+        columns = [self.course_positions[course_id] for course_id in interactions if course_id in self.course_positions]
+        if not columns or not len(self.course_ids):
+            return []
+        weights = [interactions[self.course_ids[column]] for column in columns]
+        user = sparse.csr_matrix((weights, ([0] * len(columns), columns)), shape=(1, len(self.course_ids)))
+        scores = np.asarray((user @ self.neighbors).todense()).ravel() / sum(weights)
+        excluded = [self.course_positions[course_id] for course_id in exclude_ids if course_id in self.course_positions]
+        scores[excluded] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(self.course_ids[column]), float(scores[column])) for column in candidates]
+
+    def publish(self):
+        """Write the model as the current `collaborative` artifact version"""
+        X, S = self.interactions, self.neighbors
+        return self.store.publish(
+            {
+                'user_ids': self.user_ids, 'course_ids': self.course_ids,
+                'x_data': X.data, 'x_indices': X.indices, 'x_indptr': X.indptr,
+                's_data': S.data, 's_indices': S.indices, 's_indptr': S.indptr,
+            },
+            metadata={'built_at': self.built_at, 'x_shape': list(X.shape), 's_shape': list(S.shape)},
+        )
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """Wrap a memory-mapped artifact without copying its arrays"""
+        X = sparse.csr_matrix(
+            (artifact['x_data'], artifact['x_indices'], artifact['x_indptr']),
+            shape=tuple(artifact.metadata['x_shape']), copy=False,
+        )
+        S = sparse.csr_matrix(
+            (artifact['s_data'], artifact['s_indices'], artifact['s_indptr']),
+            shape=tuple(artifact.metadata['s_shape']), copy=False,
+        )
+        model = cls(artifact['user_ids'], artifact['course_ids'], X, S, built_at=artifact.metadata['built_at'])
+        model.version = artifact.version
+        return model
+
+    @classmethod
+    def current(cls):
+        """Return the published model, switching to newer versions as they appear; None if none was built"""
+        artifact = cls.store.load()
+        if artifact is None:
+            return None
+        if cls._current is None or cls._current.version != artifact.version:
+            cls._current = cls.from_artifact(artifact)
+        return cls._current
+
+
+def learner_interactions(user):
+    """{course_id: weight} for one learner, in one query"""
+    rows = list(iter_interactions(Enrollment.objects.filter(student=user)))
+    if not rows:
+        return {}
+    weights = interaction_weight([row[2] for row in rows], [row[3] for row in rows])
+    return {row[1]: float(weight) for row, weight in zip(rows, weights)}
+
+
+def changed_course_ids(since):
+    """Courses whose enrollments or progress changed after the given timestamp"""
+    changed_at = datetime.fromtimestamp(since, tz=timezone.utc)
+    return list(
+        Enrollment.objects.filter(last_accessed__gte=changed_at).order_by('course').values_list('course', flat=True).distinct()
+    )
@@ -0,0 +1,61 @@
+import csv
+import json
+from itertools import islice
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Enrollment
+from .serializers import EnrollmentAnalyticsSerializer, lesson_progress_by_student
+
+CSV_HEADER = [
+    'student', 'progress', 'enrolled_at', 'last_accessed',
+    'lesson', 'watched_duration', 'lesson_completed', 'last_watched',
+]
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming"""
+
+    def write(self, value):
+        return value
+
+
+def iter_student_progress(course, chunk_size=1000):
+    """
+    Yield serialized enrollments of a course with their lesson progress. The
+    enrollments are read through a database cursor, and lesson progress is
+    joined with one grouped query per chunk, so memory does not grow with the roster.
+    """
+    enrollments = Enrollment.objects.filter(course=course).order_by('id').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(enrollments, chunk_size))
+        if not chunk:
+            return
+        progress = lesson_progress_by_student(course.pk, [enrollment.student_id for enrollment in chunk])
+        serializer = EnrollmentAnalyticsSerializer(chunk, many=True, context={'lesson_progress': progress})
+        yield from serializer.data
+
+
+def stream_ndjson(course, chunk_size=1000):
+    encoder = JSONEncoder()
+    for row in iter_student_progress(course, chunk_size):
+        yield encoder.encode(row) + '\n'
+
+
+def stream_csv(course, chunk_size=1000):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in iter_student_progress(course, chunk_size):
+        enrollment = [row['student'], row['progress'], row['enrolled_at'], row['last_accessed']]
+        lessons = row['lesson_progress'] or [{}]
+        for lesson in lessons:
+            yield writer.writerow(enrollment + [
+                lesson.get('lesson__title', ''),
+                lesson.get('watched_duration', ''),
+                lesson.get('completed', ''),
+                lesson['last_watched'].isoformat() if lesson.get('last_watched') else '',
+            ])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'csv': (stream_csv, 'text/csv'),
+}
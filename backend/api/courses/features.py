@@ -0,0 +1,200 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .artifacts import ArtifactStore
+from .models import Course, CourseFeatures, Enrollment, Lesson
+
+DIFFICULTY_LEVELS = {'beginner': 1, 'intermediate': 2, 'advanced': 3}
+
+
+def difficulty_to_numeric(difficulty):
+    """Convert difficulty level to numeric value"""
+    return DIFFICULTY_LEVELS.get(difficulty, 1)
+
+
+def preference_vector(profile):
+    """Map a learner profile onto the course feature space"""
+    return [
+        difficulty_to_numeric(profile['preferred_difficulty']),
+        profile['avg_completion_rate'] * 10,  # Scale to similar range as course duration
+        profile['total_learning_time'] / 3600,  # Convert to hours
+        profile['completed_courses'],
+        profile['completed_courses'] * 2  # Proxy for expected lessons
+    ]
+
+
+def _count_subquery(model, **filters):
+    """Correlated COUNT(*) of `model` rows for the outer course"""
+    counts = (
+        model.objects.filter(course=OuterRef('pk'), **filters)
+        .order_by()
+        .values('course')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def build_course_features(courses):
+    """
+    Compute unsaved CourseFeatures rows for a Course queryset in a single query.
+    Counts are taken through correlated subqueries so enrollments and lessons
+    are never joined against each other.
+    """
+    rows = courses.annotate(
+        enrollment_total=_count_subquery(Enrollment),
+        enrollment_completed=_count_subquery(Enrollment, progress=100),
+        lesson_total=_count_subquery(Lesson),
+    ).values_list('id', 'difficulty_level', 'total_duration', 'enrollment_total', 'enrollment_completed', 'lesson_total')
+
+    features = []
+    for course_id, difficulty, duration, total, completed, lessons in rows:
+        completion_rate = (completed / total) * 100 if total else 0
+        features.append(CourseFeatures(
+            course_id=course_id,
+            difficulty_level=difficulty_to_numeric(difficulty),
+            total_duration=duration,
+            avg_rating=completion_rate * 0.01 * 5,  # Simple conversion to 5-star scale
+            completion_rate=completion_rate,
+            total_lessons=lessons,
+        ))
+    return features
+
+
+def refresh_course_features(course_ids=None, batch_size=1000):
+    """
+    Recompute and upsert the feature rows for the given courses,
+    or for every course when no ids are given. Returns the number of rows written.
+    """
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+    features = build_course_features(courses)
+    CourseFeatures.objects.bulk_create(
+        features,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=CourseFeatures.FEATURE_FIELDS + ['updated_at'],
+    )
+    return len(features)
+
+
+class FeatureMatrix:
+    """
+    Standardized, row-normalized course feature matrix with its fitted scaler.
+    `manage.py rebuild_course_features` fits and publishes it to the `content`
+    artifact store; workers only load the memory-mapped copy.
+    """
+    store = ArtifactStore('content')
+    _current = None
+    _validated_at = 0.0
+
+    def __init__(self, course_ids, X, source=None):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(CourseFeatures.FEATURE_FIELDS))
+        mean = X.mean(axis=0) if len(X) else np.zeros(X.shape[1])
+        scale = X.std(axis=0) if len(X) else np.ones(X.shape[1])
+        scale[scale == 0] = 1.0
+        self._set(course_ids, mean, scale, None, source)
+        self.unit_rows = self._normalize(self.transform(X))
+
+    def _set(self, course_ids, mean, scale, unit_rows, source, version=None):
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.mean = mean
+        self.scale = scale
+        self.unit_rows = unit_rows
+        self.source = source
+        self.version = version
+        self.positions = {course_id: index for index, course_id in enumerate(self.course_ids.tolist())}
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        matrix = cls.__new__(cls)
+        matrix._set(
+            artifact['course_ids'], artifact['mean'], artifact['scale'], artifact['unit_rows'],
+            artifact.metadata.get('source'), artifact.version,
+        )
+        return matrix
+
+    def publish(self):
+        """Write this matrix as the current `content` artifact"""
+        self.version = self.store.publish(
+            {'course_ids': self.course_ids, 'mean': self.mean, 'scale': self.scale, 'unit_rows': self.unit_rows},
+            metadata={'source': self.source},
+        )
+        return self.version
+
+    @staticmethod
+    def _normalize(X):
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return X / norms
+
+    def transform(self, X):
+        """Apply the fitted standard scaling to raw feature rows"""
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def similar(self, vector, exclude_ids=(), limit=5):
+        """Return (course_id, cosine similarity) pairs for the closest courses"""
+        return self.top_k([vector], [exclude_ids], limit)[0]
+
+    def top_k(self, vectors, exclude_ids, limit):
+        """
+        Score many preference vectors at once with one matrix product and return,
+        per vector, the best (course_id, cosine similarity) pairs outside its excluded ids.
+        """
+        if not len(self.course_ids) or not len(vectors):
+            return [[] for _ in vectors]
+        users = self._normalize(self.transform(np.asarray(vectors, dtype=np.float64)))
+        scores = users @ self.unit_rows.T
+        for row, excluded in enumerate(exclude_ids):
+            columns = [self.positions[course_id] for course_id in excluded if course_id in self.positions]
+            scores[row, columns] = -np.inf
+        k = min(limit, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in enumerate(top):
+            columns = columns[np.argsort(-scores[row, columns])]
+            results.append([
+                (int(self.course_ids[column]), float(scores[row, column]))
+                for column in columns if np.isfinite(scores[row, column])
+            ])
+        return results
+
+    @staticmethod
+    def source_version():
+        """Identify the state of the CourseFeatures table the matrix is fitted on"""
+        state = CourseFeatures.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+        return [state['count'], state['updated'].isoformat() if state['updated'] else None]
+
+    @classmethod
+    def fit(cls, source=None):
+        """Fit a new matrix from the CourseFeatures table"""
+        rows = list(CourseFeatures.objects.order_by('course_id').values_list(
+            'course_id', *CourseFeatures.FEATURE_FIELDS
+        ))
+        return cls([row[0] for row in rows], [row[1:] for row in rows], source=source or cls.source_version())
+
+    @classmethod
+    def load(cls):
+        """
+        Return the shared matrix, switching to newer published versions as they appear.
+        Until a version is published, serve an in-memory fit that is refitted at most
+        every ARTIFACT_RELOAD_INTERVAL seconds when the feature table changed.
+        """
+        current = cls._current
+        artifact = cls.store.load()
+        if artifact is not None:
+            if current is None or current.version != artifact.version:
+                current = cls.from_artifact(artifact)
+        else:
+            now = time.monotonic()
+            if current is None or now - cls._validated_at >= settings.ARTIFACT_RELOAD_INTERVAL:
+                cls._validated_at = now
+                source = cls.source_version()
+                if current is None or current.source != source:
+                    current = cls.fit(source)
+        cls._current = current
+        return current
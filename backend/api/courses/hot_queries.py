@@ -0,0 +1,54 @@
+from django.db.models import Count
+from django.utils import timezone
+from .models import Course, Enrollment, Lesson, LessonProgress
+
+# name -> callable(course_id, student_id) returning the queryset a hot path runs
+HOT_QUERIES = {}
+
+
+def register_hot_query(name):
+    """Register a queryset factory for the explain_hot_queries index advisor"""
+    def decorator(func):
+        HOT_QUERIES[name] = func
+        return func
+    return decorator
+
+
+@register_hot_query('course_active_students')
+def course_active_students(course_id, student_id):
+    return Enrollment.objects.filter(course=course_id, last_accessed__gte=timezone.now() - timezone.timedelta(days=30))
+
+
+@register_hot_query('course_completed_students')
+def course_completed_students(course_id, student_id):
+    return Enrollment.objects.filter(course=course_id, progress=100)
+
+
+@register_hot_query('course_lesson_completion')
+def course_lesson_completion(course_id, student_id):
+    return LessonProgress.objects.filter(lesson__course=course_id, completed=True)
+
+
+@register_hot_query('course_roster_page')
+def course_roster_page(course_id, student_id):
+    return Enrollment.objects.filter(course=course_id).order_by('id')[:100]
+
+
+@register_hot_query('student_enrollments_by_difficulty')
+def student_enrollments_by_difficulty(course_id, student_id):
+    return Enrollment.objects.filter(student=student_id).values('course__difficulty_level').annotate(count=Count('id'))
+
+
+@register_hot_query('student_course_lesson_progress')
+def student_course_lesson_progress(course_id, student_id):
+    return LessonProgress.objects.filter(student=student_id, lesson__course=course_id)
+
+
+@register_hot_query('beginner_catalog')
+def beginner_catalog(course_id, student_id):
+    return Course.objects.filter(difficulty_level='beginner')
+
+
+@register_hot_query('course_lessons')
+def course_lessons(course_id, student_id):
+    return Lesson.objects.filter(course=course_id)
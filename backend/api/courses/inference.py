@@ -0,0 +1,70 @@
+import http.client
+import json
+import queue
+from urllib.parse import urlsplit
+from django.conf import settings
+
+
+class InferenceUnavailable(Exception):
+    """The AI service could not answer in time; callers fall back to local scoring"""
+
+
+class InferenceClient:
+    """
+    Keep-alive HTTP client for the ai_vr inference service.
+
+    Connections are pooled per process (at most AI_SERVICE_POOL_SIZE) and every
+    call is bounded by AI_SERVICE_TIMEOUT, so a slow or down service costs one
+    timeout instead of tying up API workers.
+    """
+    _instance = None
+
+    def __init__(self, url, timeout, pool_size):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    @classmethod
+    def get(cls):
+        """The shared client, or None when no AI_SERVICE_URL is configured"""
+        if not settings.AI_SERVICE_URL:
+            return None
+        if cls._instance is None:
+            cls._instance = cls(settings.AI_SERVICE_URL, settings.AI_SERVICE_TIMEOUT, settings.AI_SERVICE_POOL_SIZE)
+        return cls._instance
+
+    def _acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def post(self, path, payload):
+        body = json.dumps(payload)
+        connection = self._acquire()
+        try:
+            connection.request('POST', self.base_path + path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            connection.close()
+            raise InferenceUnavailable(str(error)) from error
+        self._release(connection)
+        if response.status != 200:
+            raise InferenceUnavailable(f'{path} returned {response.status}')
+        return json.loads(data)
+
+    def recommend(self, vector, exclude_ids, limit):
+        """Return (course_id, similarity) pairs scored by the service"""
+        data = self.post('/recommend', {'vector': vector, 'exclude': list(exclude_ids), 'limit': limit})
+        if data.get('model_version') is None:
+            raise InferenceUnavailable('no model published yet')
+        return [(course_id, score) for course_id, score in data['recommendations']]
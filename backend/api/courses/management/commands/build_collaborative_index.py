@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from courses.collaborative import CollaborativeModel, changed_course_ids
+
+
+class Command(BaseCommand):
+    help = 'Build (or incrementally refresh) the item-item collaborative filtering index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=settings.CF_NEIGHBORS, help='Neighbours kept per course')
+        parser.add_argument('--block-size', type=int, default=256, help='Courses scored per similarity block')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Enrollment rows fetched per round trip')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only refresh courses with activity since the last build')
+
+    def handle(self, *args, **options):
+        model = None
+        if options['incremental']:
+            artifact = CollaborativeModel.store.open()
+            if artifact is None:
+                self.stdout.write('No existing index, running a full build')
+            else:
+                model = CollaborativeModel.from_artifact(artifact)
+
+        if model is None:
+            model = CollaborativeModel.fit(options['neighbors'], options['block_size'], options['chunk_size'])
+            summary = f'{model.interactions.nnz} interactions, {len(model.course_ids)} courses'
+        else:
+            course_ids = changed_course_ids(model.built_at)
+            model = model.refresh_courses(course_ids, options['neighbors'], options['block_size'])
+            summary = f'refreshed {len(course_ids)} courses'
+
+        version = model.publish()
+        self.stdout.write(self.style.SUCCESS(f'Published version {version} ({summary}, {model.neighbors.nnz} neighbour links)'))
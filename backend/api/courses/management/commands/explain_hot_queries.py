@@ -0,0 +1,60 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from courses.hot_queries import HOT_QUERIES
+from courses.models import Course, Enrollment
+
+# Plan lines that read a whole table: Postgres "Seq Scan on t", SQLite "SCAN t" without an index
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?!.*\bINDEX\b)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the registered hot-path queries and flag sequential scans. '
+        'Run it against a realistically sized dataset (see seed_benchmark); on tiny '
+        'tables the planner rightly prefers sequential scans.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', help='Only explain the named query (repeatable)')
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--fail-on-seq-scan', action='store_true', help='Exit with an error if any query scans a table')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only flagged ones')
+
+    def sample_ids(self):
+        """Pick the busiest course and one of its students so plans reflect the heavy case"""
+        course = Course.objects.annotate(students=Count('enrollments')).order_by('-students').first()
+        if course is None:
+            raise CommandError('No courses found; seed the database first.')
+        student_id = Enrollment.objects.filter(course=course).values_list('student_id', flat=True).first()
+        return course.pk, student_id or course.instructor_id
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database backend: {connection.vendor}')
+        names = options['query'] or sorted(HOT_QUERIES)
+        unknown = set(names) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+
+        course_id, student_id = self.sample_ids()
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        flagged = []
+        for name in names:
+            plan = HOT_QUERIES[name](course_id, student_id).explain(**explain_options)
+            scanned = sorted(set(pattern.findall(plan)))
+            if scanned:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"{name}: sequential scan on {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+            if scanned or options['verbose_plans']:
+                self.stdout.write(plan + '\n')
+
+        if flagged and options['fail_on_seq_scan']:
+            raise CommandError(f"{len(flagged)} queries use sequential scans: {', '.join(flagged)}")
@@ -0,0 +1,56 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from courses.progress import write_progress
+from courses.progress_buffer import ProgressBuffer
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 300  # seconds between retries while the database or Redis is failing
+
+
+class Command(BaseCommand):
+    help = 'Drain buffered lesson progress from Redis into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.PROGRESS_FLUSH_INTERVAL,
+                            help='Seconds between flushes')
+        parser.add_argument('--batch-size', type=int, default=settings.PROGRESS_FLUSH_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Flush what is buffered now and exit')
+
+    def flush(self, buffer, batch_size):
+        total = 0
+        while True:
+            records = buffer.drain(batch_size)
+            if not records:
+                return total
+            try:
+                write_progress(records)
+            except Exception:
+                buffer.requeue(records)
+                raise
+            buffer.acknowledge(records)
+            total += len(records)
+
+    def handle(self, *args, **options):
+        buffer = ProgressBuffer()
+        failures = 0
+        while True:
+            try:
+                flushed = self.flush(buffer, options['batch_size'])
+            except Exception:
+                if options['once']:
+                    raise
+                # The failed batch was requeued; keep the loop alive and back off
+                failures += 1
+                delay = min(options['interval'] * 2 ** failures, MAX_BACKOFF)
+                logger.exception('Flushing buffered progress failed; retrying in %.0fs', delay)
+                time.sleep(delay)
+                continue
+            failures = 0
+            if flushed:
+                self.stdout.write(f'Flushed {flushed} progress records')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from courses.batch_recommendations import precompute_chunk
+from courses.models import Enrollment
+
+
+def _run_chunk(user_ids, top_k):
+    # Each worker process opens its own database connections
+    try:
+        return precompute_chunk(user_ids, top_k)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Precompute top-K content-based recommendations for active users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATION_TOP_K)
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users scored per matrix product')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+        parser.add_argument('--active-days', type=int, default=30,
+                            help='Only users who accessed a course in this many days (0 for everyone enrolled)')
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.all()
+        if options['active_days']:
+            enrollments = enrollments.filter(
+                last_accessed__gte=timezone.now() - timezone.timedelta(days=options['active_days'])
+            )
+        user_ids = list(enrollments.order_by('student').values_list('student', flat=True).distinct())
+        size = options['chunk_size']
+        chunks = [user_ids[start:start + size] for start in range(0, len(user_ids), size)]
+
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's open connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                stored = sum(pool.map(_run_chunk, chunks, [options['top_k']] * len(chunks)))
+        else:
+            stored = sum(precompute_chunk(chunk, options['top_k']) for chunk in chunks)
+        self.stdout.write(self.style.SUCCESS(f'Stored recommendations for {stored} users'))
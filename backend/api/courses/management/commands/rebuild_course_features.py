@@ -0,0 +1,31 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from courses.features import FeatureMatrix, refresh_course_features
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed course feature matrix used by the recommender'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--watch', type=float, default=0,
+                            help='Keep running and republish when the feature table changes, checking every N seconds')
+
+    def handle(self, *args, **options):
+        count = refresh_course_features(batch_size=options['batch_size'])
+        matrix = FeatureMatrix.fit()
+        version = matrix.publish()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt features for {count} courses, published version {version}'))
+        # Workers only load what is published here, so this is the one process that fits
+        while options['watch']:
+            time.sleep(options['watch'])
+            try:
+                source = FeatureMatrix.source_version()
+                if source != matrix.source:
+                    matrix = FeatureMatrix.fit(source)
+                    self.stdout.write(f'Published version {matrix.publish()}')
+            except Exception:
+                logger.exception('Republishing the course feature matrix failed; retrying in %ss', options['watch'])
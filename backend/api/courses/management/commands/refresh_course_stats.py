@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from courses.models import Course, CourseStats
+
+
+class Command(BaseCommand):
+    help = 'Refresh materialized course analytics rollups (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh every course, not only dirty or missing rollups')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if not options['all']:
+            courses = courses.filter(Q(stats__isnull=True) | Q(stats__dirty=True))
+        count = 0
+        for course_id in courses.values_list('id', flat=True).iterator():
+            CourseStats.refresh(course_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Refreshed analytics for {count} courses'))
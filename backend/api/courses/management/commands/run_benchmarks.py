@@ -0,0 +1,143 @@
+import json
+import subprocess
+import time
+import tracemalloc
+from contextlib import ExitStack
+import numpy as np
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from courses.models import Course, Enrollment
+from courses.seeding import clear_benchmark_data, seed_benchmark_data
+
+DEFAULT_SCALES = ['50x500x5', '200x2000x10']
+
+# The cache the benchmark clears between requests; never the shared one, which also
+# holds the token blacklist and the write-behind progress buffer
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# name -> URL template filled with the busiest course id
+ENDPOINTS = {
+    'course_list': '/api/courses/',
+    'course_analytics': '/api/courses/{course}/analytics/',
+    'student_progress': '/api/courses/{course}/student_progress/',
+    'engagement_metrics': '/api/courses/{course}/engagement_metrics/',
+    'recommendations': '/api/recommendations/',
+}
+
+
+def parse_scale(value):
+    try:
+        courses, students, lessons = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise CommandError(f'Invalid scale {value!r}, expected COURSESxSTUDENTSxLESSONS')
+    return {'courses': courses, 'students': students, 'lessons_per_course': lessons}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main API endpoints on seeded datasets of several sizes and write JSON results '
+        '(queries per request, p50/p95 latency, peak Python memory). Runs against a throwaway test database. '
+        'The cache is cleared before every measured request unless --warm-cache is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', dest='scales',
+                            help='COURSESxSTUDENTSxLESSONS, repeatable (default: %s)' % ', '.join(DEFAULT_SCALES))
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(ENDPOINTS))
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the cache between requests, measuring cache hits rather than the views')
+        parser.add_argument('--output', default='benchmark-results.json')
+
+    def measure(self, client, url, iterations, warm_cache):
+        timings, peaks, queries = [], [], []
+        client.get(url)  # warm up connections and per-process state
+        for _ in range(iterations):
+            if not warm_cache:
+                cache.clear()
+            tracemalloc.start()
+            with ExitStack() as stack:
+                # Opted-in views read from the replica aliases, so count queries on every alias
+                captured = [stack.enter_context(CaptureQueriesContext(alias)) for alias in connections.all()]
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            queries.append(sum(len(context) for context in captured))
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+        return {
+            'queries': queries,  # per iteration, so a count that varies between runs is visible
+            'p50_ms': round(float(np.percentile(timings, 50)), 3),
+            'p95_ms': round(float(np.percentile(timings, 95)), 3),
+            'peak_kib': round(max(peaks) / 1024, 1),
+        }
+
+    def run_scale(self, scale, endpoints, options):
+        clear_benchmark_data()
+        counts = seed_benchmark_data(**scale)
+        course = Course.objects.annotate(students=Count('enrollments')).order_by('-students').first()
+        course.instructor.is_staff = True
+        course.instructor.save(update_fields=['is_staff'])
+        student = Enrollment.objects.filter(course=course).select_related('student').first().student
+
+        results = []
+        for name in endpoints:
+            client = APIClient()
+            client.force_authenticate(student if name == 'recommendations' else course.instructor)
+            url = ENDPOINTS[name].format(course=course.pk)
+            result = self.measure(client, url, options['iterations'], options['warm_cache'])
+            result.update(endpoint=name, rows=counts)
+            low, high = min(result['queries']), max(result['queries'])
+            queries = str(low) if low == high else f'{low}-{high}'
+            self.stdout.write(
+                f"  {name:<20} queries={queries:<5} p50={result['p50_ms']:.1f}ms "
+                f"p95={result['p95_ms']:.1f}ms peak={result['peak_kib']:.0f}KiB"
+            )
+            results.append(result)
+        return results
+
+    def handle(self, *args, **options):
+        scales = options['scales'] or DEFAULT_SCALES
+        endpoints = options['endpoints'] or list(ENDPOINTS)
+        report = {
+            'revision': git_revision(),
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'warm_cache': options['warm_cache'],
+            'results': {},
+        }
+
+        setup_test_environment()
+        # As the test runner does: replica aliases become mirrors of the seeded test database
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                for scale in scales:
+                    self.stdout.write(f'Scale {scale}')
+                    report['results'][scale] = self.run_scale(parse_scale(scale), endpoints, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            connections.close_all()
+
+        with open(options['output'], 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from courses.seeding import clear_benchmark_data, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a synthetic Course/Lesson/Enrollment/LessonProgress dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible datasets')
+        parser.add_argument('--keep', action='store_true', help='Keep data from previous seed runs')
+
+    def handle(self, *args, **options):
+        if not options['keep']:
+            clear_benchmark_data()
+        counts = seed_benchmark_data(
+            courses=options['courses'],
+            students=options['students'],
+            lessons_per_course=options['lessons_per_course'],
+            seed=options['seed'],
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary}'))
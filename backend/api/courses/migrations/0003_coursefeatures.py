@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_difficulty_level_course_total_duration_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseFeatures',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='courses.course')),
+                ('difficulty_level', models.FloatField(default=1)),
+                ('total_duration', models.FloatField(default=0)),
+                ('avg_rating', models.FloatField(default=0)),
+                ('completion_rate', models.FloatField(default=0)),
+                ('total_lessons', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
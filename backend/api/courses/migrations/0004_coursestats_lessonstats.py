@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_coursefeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('total_students', models.IntegerField(default=0)),
+                ('completed_students', models.IntegerField(default=0)),
+                ('average_progress', models.FloatField(default=0)),
+                ('total_lessons', models.IntegerField(default=0)),
+                ('active_students', models.IntegerField(default=0)),
+                ('dirty', models.BooleanField(default=True)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LessonStats',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.lesson')),
+                ('learners', models.IntegerField(default=0)),
+                ('completed_learners', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_stats', to='courses.course')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('courses', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('profile', models.JSONField(default=dict)),
+                ('recommendations', models.JSONField(default=list)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
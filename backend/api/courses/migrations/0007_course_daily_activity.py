@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('active_students', models.IntegerField(default=0)),
+                ('new_enrollments', models.IntegerField(default=0)),
+                ('completions', models.IntegerField(default=0)),
+                ('watched_seconds', models.BigIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='courses.course')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='coursedailyactivity',
+            constraint=models.UniqueConstraint(fields=('course', 'day'), name='course_daily_activity_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_course_daily_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailyactivity',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:15
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Triggers keep the vectors in sync with every write path, bulk_create and raw SQL included.
+# Each entry is (table, trigger function body, index name).
+SEARCH_VECTORS = [
+    (
+        'courses_course',
+        "setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B')",
+        'course_search_vector_idx',
+    ),
+    (
+        'courses_lesson',
+        "setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(NEW.content, '')), 'C')",
+        'lesson_search_vector_idx',
+    ),
+]
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return  # other databases use the in-process index in courses.search
+    for table, vector, index in SEARCH_VECTORS:
+        schema_editor.execute(f"""
+            CREATE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_search_vector_update BEFORE INSERT OR UPDATE ON {table} '
+            f'FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()'
+        )
+        schema_editor.execute(f'UPDATE {table} SET search_vector = NULL')  # backfill through the trigger
+        schema_editor.execute(f'CREATE INDEX {index} ON {table} USING gin (search_vector)')
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, _, index in SEARCH_VECTORS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_daily_activity_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
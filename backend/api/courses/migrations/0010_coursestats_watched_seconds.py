@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def mark_stats_dirty(apps, schema_editor):
+    # Existing rollups have no watch time yet; make the next read refresh them
+    apps.get_model('courses', 'CourseStats').objects.update(dirty=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='watched_seconds',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_stats_dirty, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,18 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Avg, Count
+from django.contrib.postgres.search import SearchVectorField
+from django.conf import settings
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from core.databases.replicas import primary
+from core.instrumentation import span
+
+class SearchableManager(models.Manager):
+    """Leave the search vector out of loaded rows; only the database reads it"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
 
 class Course(models.Model):
     title = models.CharField(max_length=200)
@@ -17,15 +28,19 @@ class Course(models.Model):
         choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced')],
         default='beginner'
     )
+    # Maintained by a Postgres trigger from title and description, see courses.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchableManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['difficulty_level'], name='course_difficulty_idx'),
+        ]
 
     def get_analytics(self):
-        return {
-            'total_students': self.enrollments.count(),
-            'average_progress': self.enrollments.aggregate(Avg('progress'))['progress__avg'] or 0,
-            'completion_rate': self.get_completion_rate(),
-            'total_lessons': self.lessons.count(),
-            'active_students': self.enrollments.filter(last_accessed__gte=timezone.now() - timezone.timedelta(days=30)).count()
-        }
+        with span('course.analytics'):
+            return CourseStats.for_course(self).as_analytics()
 
     def get_completion_rate(self):
         total_enrollments = self.enrollments.count()
@@ -42,6 +57,10 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
     order = models.PositiveIntegerField(default=0)
+    # Maintained by a Postgres trigger from title and content, see courses.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchableManager()
 
     class Meta:
         ordering = ['order']
@@ -59,6 +78,11 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ('course', 'student')
+        indexes = [
+            models.Index(fields=['course', 'last_accessed'], name='enrollment_course_accessed_idx'),
+            models.Index(fields=['course'], condition=Q(progress=100), name='enrollment_course_done_idx'),
+            models.Index(fields=['student', 'course'], name='enrollment_student_course_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
@@ -71,4 +95,185 @@ class LessonProgress(models.Model):
     last_watched = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('lesson', 'student') 
\ No newline at end of file
+        unique_together = ('lesson', 'student')
+        indexes = [
+            models.Index(fields=['lesson', 'completed'], name='lessonprogress_lesson_done_idx'),
+            models.Index(fields=['student', 'lesson'], name='lessonprogress_student_idx'),
+        ]
+
+class CourseFeatures(models.Model):
+    """Precomputed recommender features for a course, one row per course"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='features')
+    difficulty_level = models.FloatField(default=1)
+    total_duration = models.FloatField(default=0)
+    avg_rating = models.FloatField(default=0)
+    completion_rate = models.FloatField(default=0)
+    total_lessons = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Column order of the feature matrix built from these rows
+    FEATURE_FIELDS = ['difficulty_level', 'total_duration', 'avg_rating', 'completion_rate', 'total_lessons']
+
+    def __str__(self):
+        return f"Features for {self.course_id}"
+
+
+class CourseStats(models.Model):
+    """Materialized analytics rollup for a course, refreshed when dirty and older than COURSE_STATS_MAX_AGE"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_students = models.IntegerField(default=0)
+    completed_students = models.IntegerField(default=0)
+    average_progress = models.FloatField(default=0)
+    total_lessons = models.IntegerField(default=0)
+    active_students = models.IntegerField(default=0)  # accessed in the last 30 days
+    watched_seconds = models.BigIntegerField(default=0)
+    dirty = models.BooleanField(default=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    ACTIVE_WINDOW = timezone.timedelta(days=30)
+
+    @property
+    def completion_rate(self):
+        if self.total_students == 0:
+            return 0
+        return (self.completed_students / self.total_students) * 100
+
+    def is_stale(self, now=None):
+        now = now or timezone.now()
+        age = now - self.refreshed_at
+        # The 30-day active window drifts even without writes, so refresh at least daily
+        return age > timezone.timedelta(seconds=settings.COURSE_STATS_MAX_AGE) and (
+            self.dirty or age > timezone.timedelta(days=1)
+        )
+
+    def as_analytics(self):
+        return {
+            'total_students': self.total_students,
+            'average_progress': self.average_progress,
+            'completion_rate': self.completion_rate,
+            'total_lessons': self.total_lessons,
+            'active_students': self.active_students,
+        }
+
+    @classmethod
+    def refresh(cls, course_id):
+        """
+        Recompute the course and per-lesson rollups from the live tables. The dirty
+        flag is cleared before reading, so a write that lands meanwhile leaves it set.
+        """
+        now = timezone.now()
+        stats, _ = cls.objects.get_or_create(course_id=course_id)
+        cls.objects.filter(pk=course_id, dirty=True).update(dirty=False)
+        # A replica may not have the writes that dirtied the rollup yet
+        with primary():
+            enrollments = Enrollment.objects.filter(course_id=course_id).aggregate(
+                total=Count('id'),
+                completed=Count('id', filter=Q(progress=100)),
+                average=Avg('progress'),
+                active=Count('id', filter=Q(last_accessed__gte=now - cls.ACTIVE_WINDOW)),
+            )
+            lessons = list(
+                Lesson.objects.filter(course_id=course_id).order_by().annotate(
+                    learners=Count('progress_records'),
+                    completed_learners=Count('progress_records', filter=Q(progress_records__completed=True)),
+                    watched=Coalesce(Sum('progress_records__watched_duration'), 0),
+                ).values_list('id', 'learners', 'completed_learners', 'watched')
+            )
+        LessonStats.objects.bulk_create(
+            [
+                LessonStats(lesson_id=lesson_id, course_id=course_id, learners=learners,
+                            completed_learners=completed_learners, refreshed_at=now)
+                for lesson_id, learners, completed_learners, _ in lessons
+            ],
+            update_conflicts=True,
+            unique_fields=['lesson'],
+            update_fields=['learners', 'completed_learners', 'refreshed_at'],
+        )
+        stats.total_students = enrollments['total']
+        stats.completed_students = enrollments['completed']
+        stats.average_progress = enrollments['average'] or 0
+        stats.total_lessons = len(lessons)
+        stats.active_students = enrollments['active']
+        stats.watched_seconds = sum(watched for *_, watched in lessons)
+        stats.refreshed_at = now
+        # Leave dirty alone: only the conditional UPDATE above clears it
+        stats.save(update_fields=[
+            'total_students', 'completed_students', 'average_progress', 'total_lessons',
+            'active_students', 'watched_seconds', 'refreshed_at',
+        ])
+        return stats
+
+    @classmethod
+    def for_course(cls, course):
+        """Return the course's rollup row, refreshing it first if missing or stale"""
+        stats = cls.objects.filter(course=course).first()
+        if stats is None or stats.is_stale():
+            stats = cls.refresh(course.pk)
+        return stats
+
+    @classmethod
+    def mark_dirty(cls, **filters):
+        """Flag rollups for refresh; rows that are already dirty are not rewritten"""
+        cls.objects.filter(dirty=False, **filters).update(dirty=True)
+
+    def __str__(self):
+        return f"Stats for {self.course_id}"
+
+class LessonStats(models.Model):
+    """Per-lesson completion rollup, refreshed together with its course's CourseStats"""
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lesson_stats')
+    learners = models.IntegerField(default=0)
+    completed_learners = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Stats for lesson {self.lesson_id}"
+
+class UserRecommendation(models.Model):
+    """Batch-computed top-K course recommendations for a learner"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    profile = models.JSONField(default=dict)
+    recommendations = models.JSONField(default=list)  # [[course_id, similarity], ...], best first
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Recommendations for {self.user_id}"
+
+class CourseDailyActivity(models.Model):
+    """One engagement bucket per course and day, incremented by the enrollment and progress write paths"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_activity')
+    day = models.DateField()
+    active_students = models.IntegerField(default=0)  # distinct learners active that day
+    new_enrollments = models.IntegerField(default=0)
+    completions = models.IntegerField(default=0)
+    watched_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTERS = ['active_students', 'new_enrollments', 'completions', 'watched_seconds']
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'day'], name='course_daily_activity_unique'),
+        ]
+
+    @classmethod
+    def increment(cls, course_id, day, **deltas):
+        """Add to a bucket's counters, creating the bucket on first use"""
+        deltas = {counter: value for counter, value in deltas.items() if value}
+        if not deltas:
+            return
+        bucket = cls.objects.filter(course_id=course_id, day=day)
+        updates = {counter: models.F(counter) + value for counter, value in deltas.items()}
+        updates['updated_at'] = timezone.now()  # update() skips auto_now
+        if bucket.update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(course_id=course_id, day=day, **deltas)
+        except IntegrityError:
+            # Another writer created the bucket first
+            bucket.update(**updates)
+
+    def __str__(self):
+        return f"Activity for {self.course_id} on {self.day}"
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CoursePagination(CursorPagination):
+    """Keyset pagination over the course catalog, newest first on the primary key"""
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class StudentProgressPagination(CursorPagination):
+    """Keyset pagination over a course's enrollments, stable under concurrent inserts"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,49 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from .models import Course
+
+POPULARITY_CACHE_KEY = 'courses:popularity'
+
+
+def split_threshold(values):
+    """
+    Exact two-cluster split of 1-D values (the optimum KMeans(n_clusters=2) looks for).
+    Returns the smallest value of the upper cluster, or None when all values are equal.
+    """
+    data = np.sort(np.asarray(values, dtype=np.float64))
+    n = len(data)
+    if n < 2 or data[0] == data[-1]:
+        return None
+    prefix = np.cumsum(data)
+    prefix_sq = np.cumsum(data ** 2)
+    sizes = np.arange(1, n)  # size of the lower cluster for each split point
+    left_sum, left_sq = prefix[:-1], prefix_sq[:-1]
+    right_sum, right_sq = prefix[-1] - left_sum, prefix_sq[-1] - left_sq
+    sse = (left_sq - left_sum ** 2 / sizes) + (right_sq - right_sum ** 2 / (n - sizes))
+    # Only split between distinct values so equal counts never land in different clusters
+    sse[data[1:] == data[:-1]] = np.inf
+    return float(data[int(np.argmin(sse)) + 1])
+
+
+def build_popularity_snapshot():
+    """Enrollment counts for every course in one annotated query, plus the cluster boundary"""
+    rows = list(
+        Course.objects.annotate(enrollment_count=Count('enrollments'))
+        .order_by('-enrollment_count', 'id')
+        .values_list('id', 'enrollment_count')
+    )
+    return {
+        'courses': rows,
+        'threshold': split_threshold([count for _, count in rows]),
+    }
+
+
+def get_popularity_snapshot():
+    """Return the shared snapshot, recomputing it once per refresh interval"""
+    return cache.get_or_set(
+        POPULARITY_CACHE_KEY,
+        build_popularity_snapshot,
+        timeout=settings.RECOMMENDER_POPULARITY_TTL,
+    )
@@ -0,0 +1,224 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
+from django.utils import timezone
+from analytics.events import COMPLETION, PROGRESS, make_event, publish
+from .models import CourseDailyActivity, CourseStats, Enrollment, Lesson, LessonProgress
+from .progress_buffer import ProgressBuffer
+from .signals import schedule_feature_refresh
+
+
+def coalesce_events(events):
+    """
+    Merge progress events per lesson. Watch time only moves forward and a
+    completed lesson stays completed, so the furthest report wins.
+    """
+    merged = {}
+    for event in events:
+        lesson_id = event['lesson']
+        current = merged.get(lesson_id)
+        if current is None:
+            merged[lesson_id] = {
+                'watched_duration': event['watched_duration'],
+                'completed': event['completed'],
+            }
+        else:
+            current['watched_duration'] = max(current['watched_duration'], event['watched_duration'])
+            current['completed'] = current['completed'] or event['completed']
+    return merged
+
+
+def _count_subquery(queryset, group_by, default):
+    counts = queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), default)
+
+
+def recompute_enrollment_progress(student_ids, course_ids):
+    """Recompute Enrollment.progress/completed for the given students and courses in one UPDATE"""
+    completed_lessons = _count_subquery(
+        LessonProgress.objects.filter(student=OuterRef('student'), lesson__course=OuterRef('course'), completed=True),
+        'student',
+        0,
+    )
+    # Only courses that received progress are updated, so they always have lessons
+    total_lessons = _count_subquery(Lesson.objects.filter(course=OuterRef('course')), 'course', 1)
+    progress = completed_lessons * 100 / total_lessons
+    return Enrollment.objects.filter(student__in=student_ids, course__in=course_ids).update(
+        progress=progress,
+        completed=Case(When(Exact(progress, 100), then=Value(True)), default=Value(False)),
+        last_accessed=timezone.now(),
+    )
+
+
+def lesson_progress_state(records):
+    """
+    Current (watched_duration, completed) per (student_id, lesson_id) of the given
+    records. Only those rows are locked, in key order so concurrent batches cannot
+    deadlock, and they stay locked until the caller's transaction ends.
+    """
+    lessons_by_student = {}
+    for record in records:
+        lessons_by_student.setdefault(record['student_id'], set()).add(record['lesson_id'])
+    if not lessons_by_student:
+        return {}
+    exact_pairs = Q()
+    for student_id, lesson_ids in lessons_by_student.items():
+        exact_pairs |= Q(student=student_id, lesson__in=lesson_ids)
+    rows = (
+        LessonProgress.objects.select_for_update().filter(exact_pairs).order_by('student_id', 'lesson_id')
+        .values_list('student_id', 'lesson_id', 'watched_duration', 'completed')
+    )
+    return {(student_id, lesson_id): tuple(state) for student_id, lesson_id, *state in rows}
+
+
+def merge_stored_progress(records, lessons_before):
+    """
+    Apply coalesce_events' rule across batches: a late or out-of-order report
+    never moves a stored row's watch time back or un-completes it.
+    """
+    merged = []
+    for record in records:
+        watched, completed = lessons_before.get((record['student_id'], record['lesson_id']), (0, False))
+        merged.append(dict(
+            record,
+            watched_duration=max(record['watched_duration'], watched),
+            completed=record['completed'] or completed,
+        ))
+    return merged
+
+
+def enrollment_progress_state(students_by_course):
+    """Current (progress, completed, last_accessed) per (student_id, course_id)"""
+    state = {}
+    for course_id, student_ids in students_by_course.items():
+        rows = Enrollment.objects.filter(course=course_id, student__in=student_ids).values_list(
+            'student_id', 'progress', 'completed', 'last_accessed'
+        )
+        state.update({(student_id, course_id): tuple(values) for student_id, *values in rows})
+    return state
+
+
+def progress_events(records, lessons_before, enrollments_before, enrollments_after):
+    """Describe what a write_progress call changed as analytics events"""
+    published = []
+    for record in records:
+        watched, completed = lessons_before.get((record['student_id'], record['lesson_id']), (0, False))
+        published.append(make_event(
+            PROGRESS, record['course_id'], record['student_id'],
+            lesson_id=record['lesson_id'],
+            watched_delta=max(record['watched_duration'] - watched, 0),
+            started=int((record['student_id'], record['lesson_id']) not in lessons_before),
+            completed=int(record['completed'] and not completed),
+        ))
+    for (student_id, course_id), (progress, completed, _) in enrollments_after.items():
+        previous_progress, previous_completed, _ = enrollments_before.get((student_id, course_id), (0, False, None))
+        if (progress, completed) != (previous_progress, previous_completed):
+            published.append(make_event(
+                COMPLETION, course_id, student_id,
+                progress_delta=progress - previous_progress,
+                completed_delta=int(completed) - int(previous_completed),
+            ))
+    return published
+
+
+def daily_activity(records, lessons_before, enrollments_before, enrollments_after):
+    """
+    Bucket increments for a write_progress call, keyed by (course_id, day). A learner
+    counts as active once per day: only if the enrollment was last accessed on an earlier day.
+    Records are already merged with the stored rows, so re-watching adds no time, and
+    only a newly completed enrollment counts as a completion.
+    """
+    buckets = {}
+    for record in records:
+        day = timezone.localdate(record['last_watched'])
+        bucket = buckets.setdefault((record['course_id'], day), dict.fromkeys(CourseDailyActivity.COUNTERS, 0))
+        watched, _ = lessons_before.get((record['student_id'], record['lesson_id']), (0, False))
+        bucket['watched_seconds'] += max(record['watched_duration'] - watched, 0)
+
+    active_days = {}
+    for record in records:
+        key = (record['student_id'], record['course_id'])
+        active_days[key] = max(active_days.get(key, record['last_watched']), record['last_watched'])
+    for (student_id, course_id), last_watched in active_days.items():
+        day = timezone.localdate(last_watched)
+        bucket = buckets[(course_id, day)]
+        _, previous_completed, last_accessed = enrollments_before.get((student_id, course_id), (0, False, None))
+        if last_accessed is None or timezone.localdate(last_accessed) < day:
+            bucket['active_students'] += 1
+        _, completed, _ = enrollments_after.get((student_id, course_id), (0, previous_completed, None))
+        bucket['completions'] += int(completed and not previous_completed)
+    return buckets
+
+
+def enrolled_lesson_courses(student, lesson_ids):
+    """Map each lesson id to its course id, keeping only lessons of the student's enrolled courses"""
+    return dict(
+        Lesson.objects.filter(id__in=lesson_ids, course__enrollments__student=student).values_list('id', 'course_id')
+    )
+
+
+def write_progress(records):
+    """
+    Upsert progress rows and roll them up into enrollments. Each record is a dict
+    with student_id, lesson_id, course_id, watched_duration, completed and last_watched.
+    """
+    if not records:
+        return 0
+    students_by_course = {}
+    for record in records:
+        students_by_course.setdefault(record['course_id'], set()).add(record['student_id'])
+    with transaction.atomic():
+        lessons_before = lesson_progress_state(records)
+        records = merge_stored_progress(records, lessons_before)
+        enrollments_before = enrollment_progress_state(students_by_course)
+        LessonProgress.objects.bulk_create(
+            [
+                LessonProgress(
+                    lesson_id=record['lesson_id'],
+                    student_id=record['student_id'],
+                    watched_duration=record['watched_duration'],
+                    completed=record['completed'],
+                    last_watched=record['last_watched'],
+                )
+                for record in records
+            ],
+            update_conflicts=True,
+            unique_fields=['lesson', 'student'],
+            update_fields=['watched_duration', 'completed', 'last_watched'],
+        )
+        for course_id, student_ids in students_by_course.items():
+            recompute_enrollment_progress(student_ids, [course_id])
+        enrollments_after = enrollment_progress_state(students_by_course)
+        for (course_id, day), deltas in daily_activity(
+            records, lessons_before, enrollments_before, enrollments_after
+        ).items():
+            CourseDailyActivity.increment(course_id, day, **deltas)
+        # Bulk writes bypass model signals, so invalidate the derived data explicitly
+        CourseStats.mark_dirty(course_id__in=students_by_course)
+        for course_id in students_by_course:
+            schedule_feature_refresh(course_id)
+        publish(progress_events(records, lessons_before, enrollments_before, enrollments_after))
+    return len(records)
+
+
+def ingest_progress(student, events):
+    """
+    Record a batch of lesson progress events for one student. Events for
+    lessons outside the student's enrolled courses are rejected. With
+    PROGRESS_WRITE_BEHIND the events go to the Redis buffer, otherwise they
+    are written through. Returns (accepted, rejected_ids).
+    """
+    merged = coalesce_events(events)
+    lesson_courses = enrolled_lesson_courses(student, merged)
+    rejected = sorted(set(merged) - set(lesson_courses))
+    now = timezone.now()
+    records = [
+        dict(student_id=student.pk, lesson_id=lesson_id, course_id=course_id, last_watched=now, **merged[lesson_id])
+        for lesson_id, course_id in lesson_courses.items()
+    ]
+    if settings.PROGRESS_WRITE_BEHIND:
+        ProgressBuffer().record_many(records)
+        return len(records), rejected
+    return write_progress(records), rejected
@@ -0,0 +1,151 @@
+from datetime import datetime, timezone as dt_timezone
+from django_redis import get_redis_connection
+
+KEY_PREFIX = 'progress'
+
+# Merge one heartbeat into the (student, lesson) hash: watch time only grows,
+# completion is sticky, and the pair is queued for the next flush.
+RECORD_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'watched_duration') or '-1')
+if tonumber(ARGV[1]) > current then
+    redis.call('HSET', KEYS[1], 'watched_duration', ARGV[1])
+end
+if ARGV[2] == '1' then
+    redis.call('HSET', KEYS[1], 'completed', '1')
+else
+    redis.call('HSETNX', KEYS[1], 'completed', '0')
+end
+redis.call('HSET', KEYS[1], 'course_id', ARGV[3], 'last_watched', ARGV[4])
+redis.call('SADD', KEYS[2], ARGV[5])
+redis.call('SADD', KEYS[3], ARGV[6])
+return 1
+"""
+
+# Drop a flushed hash unless a newer heartbeat arrived while it was being written
+ACKNOWLEDGE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'last_watched') == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class ProgressBuffer:
+    """
+    Write-behind buffer for lesson progress heartbeats.
+
+    Each (student, lesson) pair is one Redis hash; a `dirty` set lists the pairs
+    waiting to be flushed and a per-student set lets reads find unflushed lessons.
+    """
+    dirty_key = f'{KEY_PREFIX}:dirty'
+
+    def __init__(self, client=None):
+        self.client = client or get_redis_connection('default')
+        self._record = self.client.register_script(RECORD_SCRIPT)
+        self._acknowledge = self.client.register_script(ACKNOWLEDGE_SCRIPT)
+
+    @staticmethod
+    def entry_key(student_id, lesson_id):
+        return f'{KEY_PREFIX}:entry:{student_id}:{lesson_id}'
+
+    @staticmethod
+    def student_key(student_id):
+        return f'{KEY_PREFIX}:student:{student_id}'
+
+    def record_many(self, records):
+        """Buffer progress records (dicts as accepted by progress.write_progress)"""
+        pipe = self.client.pipeline(transaction=False)
+        for record in records:
+            student_id, lesson_id = record['student_id'], record['lesson_id']
+            self._record(
+                keys=[self.entry_key(student_id, lesson_id), self.dirty_key, self.student_key(student_id)],
+                args=[
+                    record['watched_duration'],
+                    '1' if record['completed'] else '0',
+                    record['course_id'],
+                    record['last_watched'].isoformat(),
+                    f'{student_id}:{lesson_id}',
+                    lesson_id,
+                ],
+                client=pipe,
+            )
+        pipe.execute()
+
+    @staticmethod
+    def _decode(student_id, lesson_id, entry):
+        return {
+            'student_id': int(student_id),
+            'lesson_id': int(lesson_id),
+            'course_id': int(entry[b'course_id']),
+            'watched_duration': int(entry[b'watched_duration']),
+            'completed': entry[b'completed'] == b'1',
+            'last_watched': datetime.fromisoformat(entry[b'last_watched'].decode()).astimezone(dt_timezone.utc),
+            'token': entry[b'last_watched'],
+        }
+
+    def drain(self, limit=None):
+        """
+        Claim up to `limit` dirty pairs and return their buffered records.
+        Claimed records stay in Redis until `acknowledge` confirms they were written.
+        """
+        members = self.client.spop(self.dirty_key, limit or self.client.scard(self.dirty_key))
+        if not members:
+            return []
+        pairs = [member.decode().split(':') for member in members]
+        pipe = self.client.pipeline(transaction=False)
+        for student_id, lesson_id in pairs:
+            pipe.hgetall(self.entry_key(student_id, lesson_id))
+        return [
+            self._decode(student_id, lesson_id, entry)
+            for (student_id, lesson_id), entry in zip(pairs, pipe.execute())
+            if entry
+        ]
+
+    def acknowledge(self, records):
+        """Remove flushed entries that were not updated since they were drained"""
+        pipe = self.client.pipeline(transaction=False)
+        for record in records:
+            self._acknowledge(
+                keys=[self.entry_key(record['student_id'], record['lesson_id']), self.student_key(record['student_id'])],
+                args=[record['token'], record['lesson_id']],
+                client=pipe,
+            )
+        pipe.execute()
+
+    def requeue(self, records):
+        """Put drained records back on the dirty set after a failed flush"""
+        if records:
+            self.client.sadd(self.dirty_key, *[f"{r['student_id']}:{r['lesson_id']}" for r in records])
+
+    def pending_for_students(self, student_ids, course_id=None):
+        """
+        Return unflushed records of several students as {student_id: {lesson_id: record}},
+        in two round trips however many students are asked for.
+        """
+        student_ids = list(student_ids)
+        pipe = self.client.pipeline(transaction=False)
+        for student_id in student_ids:
+            pipe.smembers(self.student_key(student_id))
+        pairs = [
+            (student_id, lesson_id.decode())
+            for student_id, lesson_ids in zip(student_ids, pipe.execute())
+            for lesson_id in lesson_ids
+        ]
+        pending = {student_id: {} for student_id in student_ids}
+        if not pairs:
+            return pending
+        for student_id, lesson_id in pairs:
+            pipe.hgetall(self.entry_key(student_id, lesson_id))
+        for (student_id, lesson_id), entry in zip(pairs, pipe.execute()):
+            if not entry:
+                continue
+            record = self._decode(student_id, lesson_id, entry)
+            if course_id is None or record['course_id'] == course_id:
+                pending[student_id][record['lesson_id']] = record
+        return pending
+
+    def pending_for_student(self, student_id, course_id=None):
+        """Return unflushed records of a student, keyed by lesson id"""
+        return self.pending_for_students([student_id], course_id)[student_id]
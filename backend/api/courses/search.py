@@ -0,0 +1,243 @@
+import bisect
+import math
+import re
+import threading
+from django.conf import settings
+from django.db import connections, router
+from core.caching import get_cache_version
+from .models import Course, Lesson
+
+# Text search configuration; the triggers in migration 0009 are created with the same one
+SEARCH_CONFIG = 'english'
+TERM_PATTERN = re.compile(r'\w+')
+MAX_TERMS = 8
+# Shorter terms match whole words only; a one- or two-letter prefix expands to most of the vocabulary
+MIN_PREFIX_LENGTH = 3
+HIGHLIGHT = ('<mark>', '</mark>')
+
+# Field weights, following Postgres' default ts_rank weights for A/B/C
+WEIGHT_A, WEIGHT_B, WEIGHT_C = 1.0, 0.4, 0.2
+
+
+def tokenize(text):
+    return [term.lower() for term in TERM_PATTERN.findall(text)]
+
+
+def query_terms(text):
+    """Lowercased words of a search string; each one is matched as a word prefix"""
+    return tokenize(text)[:MAX_TERMS]
+
+
+def merge_hits(course_hits, lesson_hits, limit):
+    """Rank courses by the better of their own match and their best lesson match"""
+    scores = dict(course_hits)
+    for course_id, score in lesson_hits:
+        scores[course_id] = max(scores.get(course_id, 0), score)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def best_lessons(lesson_ranks, per_course):
+    """Pick the top lessons per course from (lesson_id, course_id, score) rows"""
+    picked = {}
+    for lesson_id, course_id, _ in sorted(lesson_ranks, key=lambda row: (-row[2], row[0])):
+        lessons = picked.setdefault(course_id, [])
+        if len(lessons) < per_course:
+            lessons.append(lesson_id)
+    return picked
+
+
+def build_results(ranked, picked, snippets):
+    """Shape ranked (course_id, score) pairs with their lesson snippets for the API"""
+    courses = Course.objects.in_bulk([course_id for course_id, _ in ranked])
+    return [
+        {
+            'id': course_id,
+            'title': courses[course_id].title,
+            'difficulty_level': courses[course_id].difficulty_level,
+            'score': round(score, 6),
+            'lessons': [snippets[lesson_id] for lesson_id in picked.get(course_id, []) if lesson_id in snippets],
+        }
+        for course_id, score in ranked
+        if course_id in courses
+    ]
+
+
+class PostgresSearch:
+    """
+    Ranked search over the `search_vector` columns, which database triggers keep
+    in sync with course title/description and lesson title/content and which are
+    GIN indexed, so a query only touches matching rows.
+    """
+
+    def search(self, text, difficulty=None, limit=20):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        from django.db.models import F, Max
+
+        terms = query_terms(text)
+        if not terms:
+            return []
+        raw = ' & '.join(f'{term}:*' if len(term) >= MIN_PREFIX_LENGTH else term for term in terms)
+        query = SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+        rank = SearchRank(F('search_vector'), query)
+        courses = Course.objects.filter(search_vector=query)
+        lessons = Lesson.objects.filter(search_vector=query)
+        if difficulty:
+            courses = courses.filter(difficulty_level=difficulty)
+            lessons = lessons.filter(course__difficulty_level=difficulty)
+
+        ranked = merge_hits(
+            courses.annotate(rank=rank).order_by('-rank').values_list('id', 'rank')[:limit],
+            lessons.values('course_id').annotate(rank=Max(rank)).order_by('-rank').values_list('course_id', 'rank')[:limit],
+            limit,
+        )
+        picked = best_lessons(
+            lessons.filter(course__in=[course_id for course_id, _ in ranked])
+            .annotate(rank=rank).values_list('id', 'course_id', 'rank'),
+            settings.SEARCH_SNIPPETS_PER_COURSE,
+        )
+        # ts_headline re-parses the document, so it only runs for the lessons shown
+        headlines = Lesson.objects.filter(id__in=[lesson_id for ids in picked.values() for lesson_id in ids]).annotate(
+            snippet=SearchHeadline(
+                'content', query, config=SEARCH_CONFIG, start_sel=HIGHLIGHT[0], stop_sel=HIGHLIGHT[1],
+                max_words=settings.SEARCH_SNIPPET_WORDS, min_words=settings.SEARCH_SNIPPET_WORDS // 2,
+            )
+        ).values_list('id', 'title', 'snippet')
+        snippets = {lesson_id: {'id': lesson_id, 'title': title, 'snippet': snippet} for lesson_id, title, snippet in headlines}
+        return build_results(ranked, picked, snippets)
+
+
+class InvertedIndex:
+    """
+    In-process inverted index for databases without full-text search (SQLite in
+    development and tests). Terms are kept sorted so a prefix is a bisect range.
+    """
+
+    def __init__(self):
+        self.postings = {}  # term -> {(kind, id): weight}
+        self.terms = []
+        self.course_difficulty = {}
+        self.lesson_course = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        for course_id, title, description, difficulty in Course.objects.values_list(
+            'id', 'title', 'description', 'difficulty_level'
+        ).iterator():
+            index.course_difficulty[course_id] = difficulty
+            index.add(('course', course_id), ((title, WEIGHT_A), (description, WEIGHT_B)))
+        for lesson_id, course_id, title, content in Lesson.objects.values_list(
+            'id', 'course_id', 'title', 'content'
+        ).iterator():
+            index.lesson_course[lesson_id] = course_id
+            index.add(('lesson', lesson_id), ((title, WEIGHT_A), (content, WEIGHT_C)))
+        index.terms = sorted(index.postings)
+        return index
+
+    def add(self, document, fields):
+        for text, weight in fields:
+            for term in tokenize(text):
+                postings = self.postings.setdefault(term, {})
+                postings[document] = postings.get(document, 0) + weight
+
+    def expand(self, prefix):
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            yield from ([prefix] if prefix in self.postings else [])
+            return
+        position = bisect.bisect_left(self.terms, prefix)
+        while position < len(self.terms) and self.terms[position].startswith(prefix):
+            yield self.terms[position]
+            position += 1
+
+    def match(self, terms):
+        """Score documents containing a word starting with every term"""
+        documents = len(self.course_difficulty) + len(self.lesson_course)
+        scores = None
+        for prefix in terms:
+            hits = {}
+            for term in self.expand(prefix):
+                postings = self.postings[term]
+                idf = math.log(1 + documents / len(postings))
+                for document, weight in postings.items():
+                    hits[document] = hits.get(document, 0) + weight * idf
+            if scores is None:
+                scores = hits
+            else:
+                scores = {document: score + hits[document] for document, score in scores.items() if document in hits}
+            if not scores:
+                return {}
+        return scores or {}
+
+    def search(self, text, difficulty=None, limit=20):
+        terms = query_terms(text)
+        if not terms:
+            return []
+        course_hits, lesson_ranks = [], []
+        for (kind, object_id), score in self.match(terms).items():
+            course_id = object_id if kind == 'course' else self.lesson_course[object_id]
+            if difficulty and self.course_difficulty.get(course_id) != difficulty:
+                continue
+            if kind == 'course':
+                course_hits.append((course_id, score))
+            else:
+                lesson_ranks.append((object_id, course_id, score))
+        lesson_best = {}
+        for _, course_id, score in lesson_ranks:
+            lesson_best[course_id] = max(lesson_best.get(course_id, 0), score)
+        ranked = merge_hits(course_hits, lesson_best.items(), limit)
+        top = {course_id for course_id, _ in ranked}
+        picked = best_lessons([row for row in lesson_ranks if row[1] in top], settings.SEARCH_SNIPPETS_PER_COURSE)
+        lessons = Lesson.objects.filter(id__in=[lesson_id for ids in picked.values() for lesson_id in ids])
+        snippets = {
+            lesson_id: {'id': lesson_id, 'title': title, 'snippet': highlight(content, terms, settings.SEARCH_SNIPPET_WORDS)}
+            for lesson_id, title, content in lessons.values_list('id', 'title', 'content')
+        }
+        return build_results(ranked, picked, snippets)
+
+
+def highlight(content, terms, max_words):
+    """A window of `max_words` words around the first match, with matching words marked"""
+    words = list(TERM_PATTERN.finditer(content))
+    if not words:
+        return ''
+    prefixes = tuple(term for term in terms if len(term) >= MIN_PREFIX_LENGTH)
+
+    def matches_term(word):
+        word = word.group().lower()
+        return word in terms or word.startswith(prefixes)
+
+    first_match = next((i for i, word in enumerate(words) if matches_term(word)), 0)
+    first = max(first_match - max_words // 3, 0)
+    window = words[first:first + max_words]
+    parts, position = [], window[0].start()
+    for word in window:
+        parts.append(content[position:word.start()])
+        if matches_term(word):
+            parts.append(f'{HIGHLIGHT[0]}{word.group()}{HIGHLIGHT[1]}')
+        else:
+            parts.append(word.group())
+        position = word.end()
+    return ''.join(parts)
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_inverted_index():
+    """The process-wide fallback index, rebuilt when the course catalog version changes"""
+    global _index, _index_version
+    # Course and lesson saves bump the catalog's response cache version (see courses.signals)
+    version = get_cache_version('course', 'list')
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index, _index_version = InvertedIndex.build(), version
+        return _index
+
+
+def get_search_backend():
+    """Full-text search on Postgres, the in-process inverted index elsewhere"""
+    if connections[router.db_for_read(Lesson)].vendor == 'postgresql':
+        return PostgresSearch()
+    return get_inverted_index()
@@ -0,0 +1,124 @@
+import random
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .features import refresh_course_features
+from .models import Course, CourseStats, Enrollment, Lesson, LessonProgress
+
+BENCHMARK_PREFIX = 'bench-'
+
+WORDS = (
+    'data model learning python network function variable loop class object design system '
+    'algorithm graph query index cache memory thread process request response vector matrix '
+    'gradient training testing deployment security database schema migration transaction '
+    'scaling latency throughput pattern component interface module package library framework'
+).split()
+
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def clear_benchmark_data():
+    """Delete everything created by a previous seed run (cascades from the users)"""
+    User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()
+
+
+def seed_benchmark_data(courses, students, lessons_per_course, seed=0, batch_size=5000, zipf_exponent=1.1):
+    """
+    Bulk-generate a synthetic catalog: course popularity follows a Zipf law and
+    enrollment progress is skewed towards early drop-off with a bump at 100%.
+    Returns a dict with the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    now = timezone.now()
+    password = make_password(None)  # unusable, and avoids hashing once per user
+
+    with transaction.atomic():
+        instructors = User.objects.bulk_create([
+            User(username=f'{BENCHMARK_PREFIX}instructor-{i}', password=password)
+            for i in range(max(1, courses // 20))
+        ], batch_size=batch_size)
+        learners = User.objects.bulk_create([
+            User(username=f'{BENCHMARK_PREFIX}student-{i}', password=password)
+            for i in range(students)
+        ], batch_size=batch_size)
+
+        course_rows = Course.objects.bulk_create([
+            Course(
+                title=f'{_text(rng, 3)[:-1]} {i}',
+                description=_text(rng, 40),
+                instructor=rng.choice(instructors),
+                total_duration=rng.randint(30, 1200),
+                difficulty_level=rng.choice(DIFFICULTIES),
+            )
+            for i in range(courses)
+        ], batch_size=batch_size)
+
+        lessons = Lesson.objects.bulk_create([
+            Lesson(course=course, title=_text(rng, 4)[:-1], content=_text(rng, rng.randint(100, 400)), order=order)
+            for course in course_rows
+            for order in range(lessons_per_course)
+        ], batch_size=batch_size)
+        lessons_by_course = {}
+        for lesson in lessons:
+            lessons_by_course.setdefault(lesson.course_id, []).append(lesson)
+
+        # Zipfian popularity: course at rank r is chosen with probability ~ 1 / r^s
+        weights = 1.0 / np.arange(1, courses + 1) ** zipf_exponent
+        weights /= weights.sum()
+        per_student = np.minimum(np_rng.geometric(0.35, size=students), courses)
+
+        enrollments = []
+        for student, count in zip(learners, per_student):
+            for index in np_rng.choice(courses, size=count, replace=False, p=weights):
+                # Most learners stall early; a minority finish
+                progress = 100 if np_rng.random() < 0.15 else int(np_rng.beta(0.8, 2.5) * 100)
+                enrollments.append(Enrollment(
+                    course=course_rows[index], student=student, progress=progress, completed=progress == 100,
+                ))
+        Enrollment.objects.bulk_create(enrollments, batch_size=batch_size)
+
+        # auto_now overwrites last_accessed on insert, so spread it over 60 days afterwards
+        days = np_rng.integers(0, 60, size=len(enrollments))
+        for day in np.unique(days):
+            ids = [enrollments[i].pk for i in np.flatnonzero(days == day)]
+            for start in range(0, len(ids), batch_size):
+                Enrollment.objects.filter(pk__in=ids[start:start + batch_size]).update(
+                    last_accessed=now - timezone.timedelta(days=int(day))
+                )
+
+        progress_rows = []
+        for enrollment in enrollments:
+            course_lessons = lessons_by_course.get(enrollment.course_id, [])
+            watched = round(len(course_lessons) * enrollment.progress / 100)
+            for position, lesson in enumerate(course_lessons[:max(watched, 1)]):
+                progress_rows.append(LessonProgress(
+                    lesson=lesson,
+                    student_id=enrollment.student_id,
+                    watched_duration=rng.randint(60, 1800),
+                    completed=position < watched,
+                ))
+            if len(progress_rows) >= batch_size:
+                LessonProgress.objects.bulk_create(progress_rows, batch_size=batch_size)
+                progress_rows = []
+        LessonProgress.objects.bulk_create(progress_rows, batch_size=batch_size)
+
+    # Bulk inserts skip the signals that maintain derived tables
+    refresh_course_features()
+    for course in course_rows:
+        CourseStats.refresh(course.pk)
+
+    return {
+        'instructors': len(instructors),
+        'students': len(learners),
+        'courses': len(course_rows),
+        'lessons': len(lessons),
+        'enrollments': len(enrollments),
+        'lesson_progress': LessonProgress.objects.filter(student__username__startswith=BENCHMARK_PREFIX).count(),
+    }
@@ -1,28 +1,66 @@
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import serializers
+from core.eager_loading import EagerLoadingMixin, SparseFieldsetMixin
+from core.instrumentation import InstrumentedSerializerMixin
 from .models import Course, Lesson, Enrollment, LessonProgress
+from .progress_buffer import ProgressBuffer
+from .search import query_terms
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'content', 'order']
 
-class CourseSerializer(serializers.ModelSerializer):
+class LessonOutlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'order']
+
+class CourseSerializer(InstrumentedSerializerMixin, SparseFieldsetMixin, EagerLoadingMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
     instructor = serializers.StringRelatedField()
 
     class Meta:
         model = Course
         fields = ['id', 'title', 'description', 'instructor', 'created_at', 'updated_at', 'lessons']
+        select_related = ['instructor']
+        prefetch_related = ['lessons']
+
+class CourseListSerializer(InstrumentedSerializerMixin, SparseFieldsetMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    """Catalog entry: the lesson outline without lesson bodies, which only the detail view renders"""
+    lessons = LessonOutlineSerializer(many=True, read_only=True)
+    lesson_count = serializers.SerializerMethodField()
+    instructor = serializers.StringRelatedField()
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'instructor', 'difficulty_level', 'created_at', 'updated_at',
+                  'lesson_count', 'lessons']
+        select_related = ['instructor']
+        prefetch_related = [Prefetch('lessons', queryset=Lesson.objects.only('id', 'course_id', 'title', 'order'))]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        if fields is not None and 'lesson_count' in fields:
+            fields = fields | {'lessons'}
+        return super().setup_eager_loading(queryset, fields=fields)
+
+    def get_lesson_count(self, obj):
+        return len(obj.lessons.all())
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(InstrumentedSerializerMixin, EagerLoadingMixin, serializers.ModelSerializer):
     course = serializers.StringRelatedField()
     student = serializers.StringRelatedField()
 
     class Meta:
         model = Enrollment
         fields = ['id', 'course', 'student', 'enrolled_at']
+        select_related = ['course', 'student']
+        only_fields = ['id', 'enrolled_at', 'course__title', 'student__username']
 
-class CourseAnalyticsSerializer(serializers.ModelSerializer):
+class CourseAnalyticsSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     analytics = serializers.SerializerMethodField()
     student_progress = serializers.SerializerMethodField()
 
@@ -34,13 +72,61 @@ class CourseAnalyticsSerializer(serializers.ModelSerializer):
         return obj.get_analytics()
 
     def get_student_progress(self, obj):
-        return Enrollment.objects.filter(course=obj).values(
+        # Only the most recently active students; the full roster is paginated under student_progress
+        return Enrollment.objects.filter(course=obj).order_by('-last_accessed').values(
             'student__username',
             'progress',
             'last_accessed'
+        )[:settings.ANALYTICS_ROSTER_PREVIEW]
+
+def merge_pending_progress(rows, pending, titles):
+    """
+    Overlay unflushed write-behind progress on lesson progress rows, never moving a row backwards.
+    `titles` maps the lesson ids of pending entries without a stored row to their titles.
+    """
+    merged = []
+    for row in rows:
+        record = pending.pop(row['lesson_id'], None)
+        if record is not None:
+            row = dict(row, watched_duration=max(row['watched_duration'], record['watched_duration']),
+                       completed=row['completed'] or record['completed'], last_watched=record['last_watched'])
+        merged.append(row)
+    if pending:
+        merged.extend(
+            {'lesson_id': lesson_id, 'lesson__title': titles.get(lesson_id), 'watched_duration': record['watched_duration'],
+             'completed': record['completed'], 'last_watched': record['last_watched']}
+            for lesson_id, record in pending.items()
         )
+    return [{k: v for k, v in row.items() if k != 'lesson_id'} for row in merged]
+
+def lesson_progress_by_student(course_id, student_ids):
+    """Lesson progress of several students in a course, fetched in one query and grouped by student"""
+    rows = LessonProgress.objects.filter(
+        student__in=student_ids,
+        lesson__course=course_id
+    ).order_by('student', 'lesson__order').values(
+        'student_id', 'lesson_id', 'lesson__title', 'watched_duration', 'completed', 'last_watched'
+    )
+    grouped, titles = {}, {}
+    for row in rows:
+        grouped.setdefault(row.pop('student_id'), []).append(row)
+        titles[row['lesson_id']] = row['lesson__title']
+    if settings.PROGRESS_WRITE_BEHIND:
+        pending = ProgressBuffer().pending_for_students(student_ids, course_id)
+        # One title query for every pending lesson not already read with the stored rows
+        untitled = {lesson_id for records in pending.values() for lesson_id in records} - titles.keys()
+        if untitled:
+            titles.update(Lesson.objects.filter(id__in=untitled).values_list('id', 'title'))
+        return {
+            student_id: merge_pending_progress(grouped.get(student_id, []), pending[student_id], titles)
+            for student_id in student_ids
+        }
+    return {
+        student_id: [{k: v for k, v in row.items() if k != 'lesson_id'} for row in student_rows]
+        for student_id, student_rows in grouped.items()
+    }
 
-class EnrollmentAnalyticsSerializer(serializers.ModelSerializer):
+class EnrollmentAnalyticsSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     lesson_progress = serializers.SerializerMethodField()
 
     class Meta:
@@ -48,7 +134,46 @@ class EnrollmentAnalyticsSerializer(serializers.ModelSerializer):
         fields = ['student', 'progress', 'enrolled_at', 'last_accessed', 'lesson_progress']
 
     def get_lesson_progress(self, obj):
-        return LessonProgress.objects.filter(
-            student=obj.student,
-            lesson__course=obj.course
-        ).values('lesson__title', 'watched_duration', 'completed', 'last_watched')
\ No newline at end of file
+        # Views rendering many enrollments preload progress with one grouped query
+        preloaded = self.context.get('lesson_progress')
+        if preloaded is not None:
+            return preloaded.get(obj.student_id, [])
+        return lesson_progress_by_student(obj.course_id, [obj.student_id]).get(obj.student_id, [])
+
+class ProgressEventSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField(min_value=1)
+    watched_duration = serializers.IntegerField(min_value=0)
+    completed = serializers.BooleanField(default=False)
+
+class ProgressBatchSerializer(serializers.Serializer):
+    events = ProgressEventSerializer(many=True, allow_empty=False)
+
+    def validate_events(self, events):
+        limit = settings.PROGRESS_BATCH_MAX_EVENTS
+        if len(events) > limit:
+            raise serializers.ValidationError(f"A batch may contain at most {limit} events.")
+        return events
+
+class EngagementHistoryQuerySerializer(serializers.Serializer):
+    """Query parameters of the engagement_history action; defaults to the last 30 days by day"""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timezone.timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Query parameters of /api/search/"""
+    q = serializers.CharField(max_length=200)
+    difficulty = serializers.ChoiceField(choices=Course._meta.get_field('difficulty_level').choices, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+    def validate_q(self, value):
+        if not query_terms(value):
+            raise serializers.ValidationError('Enter at least one word to search for.')
+        return value
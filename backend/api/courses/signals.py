@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from analytics import events
+from core.caching import bump_cache_version
+from .models import Course, CourseDailyActivity, CourseStats, Enrollment, Lesson, LessonProgress
+
+
+def schedule_feature_refresh(course_id):
+    """Refresh a course's recommender features once the current transaction commits"""
+    # Imported here so loading the app registry does not pull in numpy
+    from .features import refresh_course_features
+
+    transaction.on_commit(lambda: refresh_course_features([course_id]))
+
+
+def schedule_cache_bump(prefix, *scopes):
+    """Invalidate cached responses once the current transaction commits, so no reader re-caches the old rows"""
+    transaction.on_commit(lambda: bump_cache_version(prefix, *scopes))
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    schedule_feature_refresh(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Lesson)
+def course_content_changed(sender, instance, **kwargs):
+    schedule_feature_refresh(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+@receiver([post_save, post_delete], sender=Lesson)
+def course_stats_changed(sender, instance, **kwargs):
+    CourseStats.mark_dirty(course_id=instance.course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_created(sender, instance, created, **kwargs):
+    if created:
+        CourseDailyActivity.increment(
+            instance.course_id, timezone.localdate(instance.enrolled_at), new_enrollments=1, active_students=1
+        )
+        events.publish([events.make_event(events.ENROLLMENT, instance.course_id, instance.student_id)])
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    events.publish([events.make_event(
+        events.UNENROLLMENT, instance.course_id, instance.student_id,
+        progress=instance.progress, completed=int(instance.completed),
+    )])
+
+
+@receiver([post_save, post_delete], sender=LessonProgress)
+def lesson_progress_changed(sender, instance, **kwargs):
+    CourseStats.mark_dirty(course__lessons=instance.lesson_id)
+
+
+@receiver(post_delete, sender=LessonProgress)
+def lesson_progress_deleted(sender, instance, **kwargs):
+    if not settings.EVENT_PIPELINE:
+        return
+    course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        events.publish([events.make_event(
+            events.PROGRESS_REMOVED, course_id, instance.student_id, lesson_id=instance.lesson_id,
+            watched_seconds=instance.watched_duration, completed=int(instance.completed),
+        )])
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_catalog_changed(sender, instance, **kwargs):
+    schedule_cache_bump('course', 'list', f'detail:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def course_lessons_changed(sender, instance, **kwargs):
+    # Lessons are nested in both the course list and the course detail payloads
+    schedule_cache_bump('course', 'list', f'detail:{instance.course_id}')
+    schedule_cache_bump('lesson', 'list', f'detail:{instance.pk}')
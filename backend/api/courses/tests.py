@@ -0,0 +1,1035 @@
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from rest_framework.test import APIClient
+from core.conditional import conditional_response
+from core.databases.pool import ConnectionPool, PoolTimeout
+from core.databases.replicas import ReplicaPool, ReplicaRoutingMiddleware, is_sticky, replica_reads
+from core.databases.routers import DatabaseRouter
+from core.instrumentation import MetricsRegistry, QueryInstrumentationMiddleware, RequestTimings, render_prometheus, span
+from .artifacts import POINTER, ArtifactStore
+from .exports import CSV_HEADER, stream_csv, stream_ndjson
+from .hot_queries import HOT_QUERIES
+from .management.commands.explain_hot_queries import SEQ_SCAN_PATTERNS
+from .management.commands.flush_progress_buffer import Command as FlushProgressBufferCommand
+from .models import (
+    Course, CourseDailyActivity, CourseFeatures, CourseStats, Enrollment, Lesson, LessonProgress, LessonStats,
+    UserRecommendation,
+)
+from .progress_buffer import ProgressBuffer
+from .serializers import lesson_progress_by_student
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Maximum SQL queries each list endpoint may issue, independent of page size
+QUERY_BUDGETS = {
+    '/api/courses/': 2,
+    '/api/lessons/': 1,
+    '/api/enrollments/': 1,
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def add_courses(self, count):
+        for i in range(count):
+            course = Course.objects.create(title=f'Course {i}', description='...', instructor=self.instructor)
+            student = User.objects.create_user(f'student-{course.pk}', password='pass')
+            Enrollment.objects.create(course=course, student=student)
+            for order in range(3):
+                Lesson.objects.create(course=course, title=f'Lesson {order}', content='...', order=order)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_endpoints_stay_within_budget(self):
+        self.add_courses(2)
+        small = {url: self.count_queries(url) for url in QUERY_BUDGETS}
+        self.add_courses(10)
+        for url, budget in QUERY_BUDGETS.items():
+            with self.subTest(url=url):
+                queries = self.count_queries(url)
+                self.assertLessEqual(queries, budget)
+                self.assertEqual(queries, small[url], 'query count grows with the number of rows')
+
+    def test_course_retrieve_within_budget(self):
+        self.add_courses(1)
+        course = Course.objects.get()
+        self.assertLessEqual(self.count_queries(f'/api/courses/{course.pk}/'), 2)
+
+    def test_catalog_is_paginated_and_omits_lesson_content(self):
+        self.add_courses(3)
+        page = self.client.get('/api/courses/?page_size=2').json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(page['results'][0]['lesson_count'], 3)
+        self.assertNotIn('content', page['results'][0]['lessons'][0])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next'])
+        self.assertEqual(self.count_queries('/api/courses/?fields=id,title'), 1)
+        sparse = self.client.get('/api/courses/?fields=id,title').json()
+        self.assertEqual(set(sparse['results'][0]), {'id', 'title'})
+
+    def test_fields_do_not_trim_writes(self):
+        self.add_courses(1)
+        course = Course.objects.get()
+        response = self.client.patch(f'/api/courses/{course.pk}/?fields=id', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Renamed')
+        self.assertIn('lessons', response.data)
+        course.refresh_from_db()
+        self.assertEqual(course.title, 'Renamed')
+
+    def test_unchanged_catalog_answers_not_modified(self):
+        self.add_courses(2)
+        course = Course.objects.first()
+        for url in ('/api/courses/', f'/api/courses/{course.pk}/', '/api/lessons/', f'/api/courses/{course.pk}/analytics/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                if not url.endswith('analytics/'):
+                    self.assertEqual(len(queries), 0)
+        etag = self.client.get(f'/api/courses/{course.pk}/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(course=course, title='New lesson', content='...', order=9)
+        self.assertEqual(self.client.get(f'/api/courses/{course.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_non_canonical_pk_etag_follows_changes(self):
+        self.add_courses(1)
+        course = Course.objects.get()
+        etag = self.client.get(f'/api/courses/0{course.pk}/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(course=course, title='New lesson', content='...', order=9)
+        self.assertEqual(self.client.get(f'/api/courses/0{course.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ConditionalResponseTests(SimpleTestCase):
+    def respond(self, last_modified, now, **headers):
+        request = RequestFactory().get('/', **headers)
+        with mock.patch('core.conditional.time.time', return_value=now.timestamp()):
+            return conditional_response(request, HttpResponse, '"v2"', last_modified)
+
+    def test_last_modified_is_sent_once_its_second_is_over(self):
+        changed = timezone.now().replace(microsecond=300000)
+        self.assertNotIn('Last-Modified', self.respond(changed, changed + timedelta(milliseconds=500)))
+        self.assertIn('Last-Modified', self.respond(changed, changed + timedelta(seconds=1)))
+
+    def test_if_none_match_takes_precedence(self):
+        changed = timezone.now() - timedelta(days=1)
+        later = 'Thu, 01 Jan 2099 00:00:00 GMT'
+        response = self.respond(changed, timezone.now(), HTTP_IF_NONE_MATCH='"v1"', HTTP_IF_MODIFIED_SINCE=later)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.respond(changed, timezone.now(), HTTP_IF_MODIFIED_SINCE=later).status_code, 304)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=self.instructor)
+        self.lesson = Lesson.objects.create(course=self.course, title='Intro', content='...', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def lesson_titles(self):
+        listed = self.client.get('/api/courses/').json()['results'][0]['lessons']
+        detail = self.client.get(f'/api/courses/{self.course.pk}/').json()['lessons']
+        return [lesson['title'] for lesson in listed], [lesson['title'] for lesson in detail]
+
+    def test_lesson_changes_reach_cached_course_payloads(self):
+        self.assertEqual(self.lesson_titles(), (['Intro'], ['Intro']))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = 'Welcome'
+            self.lesson.save()
+        self.assertEqual(self.lesson_titles(), (['Welcome'], ['Welcome']))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.delete()
+        self.assertEqual(self.lesson_titles(), ([], []))
+
+    def test_non_canonical_pk_shares_the_invalidated_entry(self):
+        self.assertEqual(self.client.get(f'/api/courses/0{self.course.pk}/').json()['lessons'][0]['title'], 'Intro')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = 'Welcome'
+            self.lesson.save()
+        self.assertEqual(self.client.get(f'/api/courses/0{self.course.pk}/').json()['lessons'][0]['title'], 'Welcome')
+        self.assertEqual(self.client.get('/api/courses/first/').status_code, 404)
+
+    def test_cache_is_invalidated_only_after_commit(self):
+        self.lesson_titles()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.lesson.title = 'Welcome'
+            self.lesson.save()
+            # Nothing is bumped until the commit, so the cached payloads are still served
+            self.assertEqual(self.lesson_titles(), (['Intro'], ['Intro']))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.lesson_titles(), (['Welcome'], ['Welcome']))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user('instructor', password='pass')
+        self.python = Course.objects.create(
+            title='Python programming', description='Write real programs', instructor=instructor, difficulty_level='advanced'
+        )
+        self.data = Course.objects.create(title='Data analysis', description='Tables and charts', instructor=instructor)
+        Lesson.objects.create(course=self.python, title='Generators', content='Python generators use yield to produce values lazily.')
+        Lesson.objects.create(course=self.data, title='Notebooks', content='Pythonic notebooks mix code and prose.')
+        self.client = APIClient()
+
+    def search(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_ranks_prefix_matches_with_snippets(self):
+        results = self.search('q=pyth')
+        self.assertEqual([result['id'] for result in results], [self.python.pk, self.data.pk])
+        self.assertIn('<mark>Python</mark> generators', results[0]['lessons'][0]['snippet'])
+        self.assertEqual([result['id'] for result in self.search('q=pyth+gen')], [self.python.pk])
+        self.assertEqual([result['id'] for result in self.search('q=pyth&difficulty=beginner')], [self.data.pk])
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.search('q=recursion'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(course=self.data, title='Recursion', content='Functions that call themselves.')
+        self.assertEqual([result['id'] for result in self.search('q=recursion')], [self.data.pk])
+
+
+class CourseStatsTests(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        Lesson.objects.create(course=self.course, title='Intro', content='...', order=0)
+
+    def test_write_during_refresh_keeps_the_rollup_dirty(self):
+        CourseStats.refresh(self.course.pk)
+        student = User.objects.create_user('student', password='pass')
+        bulk_create = LessonStats.objects.bulk_create
+
+        def enroll_meanwhile(*args, **kwargs):
+            # Lands after the rollup read the live tables, before it is written back
+            Enrollment.objects.create(course=self.course, student=student)
+            return bulk_create(*args, **kwargs)
+
+        CourseStats.objects.filter(pk=self.course.pk).update(dirty=True)
+        with mock.patch.object(LessonStats.objects, 'bulk_create', side_effect=enroll_meanwhile):
+            CourseStats.refresh(self.course.pk)
+        stats = CourseStats.objects.get(pk=self.course.pk)
+        self.assertEqual(stats.total_students, 0)
+        self.assertTrue(stats.dirty)
+        self.assertEqual(CourseStats.refresh(self.course.pk).total_students, 1)
+        self.assertFalse(CourseStats.objects.get(pk=self.course.pk).dirty)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProgressBatchTests(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user('instructor', password='pass')
+        self.student = User.objects.create_user('student', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {order}', content='...', order=order)
+            for order in range(2)
+        ]
+        self.enrollment = Enrollment.objects.create(course=self.course, student=self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_batch_upserts_progress_and_updates_enrollment(self):
+        first, second = self.lessons
+        events = [
+            {'lesson': first.pk, 'watched_duration': 30},
+            {'lesson': first.pk, 'watched_duration': 90, 'completed': True},
+            {'lesson': second.pk, 'watched_duration': 10},
+            {'lesson': 10**6, 'watched_duration': 5},
+        ]
+        response = self.client.post('/api/progress/batch/', {'events': events}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'accepted': 2, 'rejected_lessons': [10**6]})
+
+        record = LessonProgress.objects.get(lesson=first, student=self.student)
+        self.assertEqual((record.watched_duration, record.completed), (90, True))
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.progress, self.enrollment.completed), (50, False))
+
+        self.client.post('/api/progress/batch/', {'events': [{'lesson': second.pk, 'watched_duration': 60, 'completed': True}]}, format='json')
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.progress, self.enrollment.completed), (100, True))
+
+    def test_late_heartbeat_does_not_regress_progress(self):
+        events = [{'lesson': lesson.pk, 'watched_duration': 60, 'completed': True} for lesson in self.lessons]
+        self.client.post('/api/progress/batch/', {'events': events}, format='json')
+        stale = [{'lesson': self.lessons[0].pk, 'watched_duration': 10, 'completed': False}]
+        self.client.post('/api/progress/batch/', {'events': stale}, format='json')
+
+        record = LessonProgress.objects.get(lesson=self.lessons[0], student=self.student)
+        self.assertEqual((record.watched_duration, record.completed), (60, True))
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.progress, self.enrollment.completed), (100, True))
+
+    def test_progress_state_reads_only_the_written_pairs_in_key_order(self):
+        from .progress import lesson_progress_state
+
+        other = User.objects.create_user('other', password='pass')
+        first, second = self.lessons
+        for student, lesson, watched in ((self.student, first, 10), (self.student, second, 20), (other, first, 30)):
+            LessonProgress.objects.create(student=student, lesson=lesson, watched_duration=watched)
+        records = [{'student_id': other.pk, 'lesson_id': first.pk}, {'student_id': self.student.pk, 'lesson_id': second.pk}]
+        with CaptureQueriesContext(connection) as queries:
+            state = lesson_progress_state(records)
+        self.assertEqual(state, {(self.student.pk, second.pk): (20, False), (other.pk, first.pk): (30, False)})
+        self.assertIn('ORDER BY', queries[0]['sql'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProgressExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=self.instructor)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=title, content='...', order=order)
+            for order, title in enumerate(('Intro', 'Setup'))
+        ]
+        self.students = [User.objects.create_user(f'student-{index}', password='pass') for index in range(3)]
+        for student in self.students:
+            Enrollment.objects.create(course=self.course, student=student)
+        first, second = self.students[0], self.students[2]
+        LessonProgress.objects.create(lesson=self.lessons[0], student=first, watched_duration=30, completed=True)
+        LessonProgress.objects.create(lesson=self.lessons[1], student=first, watched_duration=15)
+        LessonProgress.objects.create(lesson=self.lessons[1], student=second, watched_duration=45)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def export(self, export):
+        response = self.client.get(f'/api/courses/{self.course.pk}/student_progress/?export={export}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        header, *rows = csv.reader(self.export('csv').splitlines())
+        self.assertEqual(header, CSV_HEADER)
+        by_student = [(int(row[0]), row[4], row[5], row[6]) for row in rows]
+        first, empty, second = (student.pk for student in self.students)
+        self.assertEqual(by_student, [
+            (first, 'Intro', '30', 'True'), (first, 'Setup', '15', 'False'),
+            (empty, '', '', ''),
+            (second, 'Setup', '45', 'False'),
+        ])
+
+    def test_ndjson_export(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([row['student'] for row in rows], [student.pk for student in self.students])
+        self.assertEqual([len(row['lesson_progress']) for row in rows], [2, 0, 1])
+        self.assertEqual(rows[2]['lesson_progress'][0]['lesson__title'], 'Setup')
+
+    def test_chunk_boundaries_do_not_change_the_output(self):
+        for stream in (stream_csv, stream_ndjson):
+            with self.subTest(stream=stream.__name__):
+                self.assertEqual(list(stream(self.course, chunk_size=2)), list(stream(self.course)))
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(f'/api/courses/{self.course.pk}/student_progress/?export=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PROGRESS_WRITE_BEHIND=True)
+    def test_pending_lesson_titles_are_fetched_once(self):
+        wrap_up = Lesson.objects.create(course=self.course, title='Wrap-up', content='...', order=2)
+        intro, setup = self.lessons
+        record = {'watched_duration': 60, 'completed': True, 'last_watched': timezone.now()}
+        first, empty, second = (student.pk for student in self.students)
+        pending = {first: {wrap_up.pk: record}, empty: {intro.pk: record, wrap_up.pk: record}, second: {setup.pk: record}}
+        with mock.patch('courses.serializers.ProgressBuffer') as buffer, \
+                CaptureQueriesContext(connection) as queries:
+            buffer.return_value.pending_for_students.return_value = pending
+            progress = lesson_progress_by_student(self.course.pk, [first, empty, second])
+        self.assertEqual(len(queries), 2, 'one progress query and one title query for every student')
+        self.assertEqual([row['lesson__title'] for row in progress[first]], ['Intro', 'Setup', 'Wrap-up'])
+        self.assertEqual([row['lesson__title'] for row in progress[empty]], ['Intro', 'Wrap-up'])
+        self.assertEqual([(row['lesson__title'], row['watched_duration']) for row in progress[second]], [('Setup', 60)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EngagementHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=self.instructor)
+        self.lesson = Lesson.objects.create(course=self.course, title='Intro', content='...', order=0)
+        self.client = APIClient()
+
+    def history(self, **params):
+        self.client.force_authenticate(self.instructor)
+        response = self.client.get(f'/api/courses/{self.course.pk}/engagement_history/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['buckets']
+
+    def post_progress(self, *events):
+        self.client.post('/api/progress/batch/', {'events': list(events)}, format='json')
+
+    def test_learner_counts_once_per_day_and_rewatching_adds_nothing(self):
+        student = User.objects.create_user('student', password='pass')
+        Enrollment.objects.create(course=self.course, student=student)
+        self.client.force_authenticate(student)
+        self.post_progress({'lesson': self.lesson.pk, 'watched_duration': 60})
+        self.post_progress({'lesson': self.lesson.pk, 'watched_duration': 90, 'completed': True})
+        self.post_progress({'lesson': self.lesson.pk, 'watched_duration': 20})
+
+        [bucket] = self.history()
+        self.assertEqual(
+            {key: bucket[key] for key in ('active_student_days', 'new_enrollments', 'completions', 'watched_seconds')},
+            {'active_student_days': 1, 'new_enrollments': 1, 'completions': 1, 'watched_seconds': 90},
+        )
+
+    def test_uncompleted_enrollment_does_not_subtract_completions(self):
+        student = User.objects.create_user('student', password='pass')
+        Enrollment.objects.create(course=self.course, student=student)
+        self.client.force_authenticate(student)
+        self.post_progress({'lesson': self.lesson.pk, 'watched_duration': 60, 'completed': True})
+        added = Lesson.objects.create(course=self.course, title='Extra', content='...', order=1)
+        self.post_progress({'lesson': added.pk, 'watched_duration': 10})
+
+        [bucket] = self.history()
+        self.assertEqual(bucket['completions'], 1)
+
+    def test_buckets_sum_days_per_week_and_month(self):
+        for day, active in (('2026-01-05', 1), ('2026-01-07', 2), ('2026-01-12', 4), ('2026-02-02', 8)):
+            CourseDailyActivity.objects.create(course=self.course, day=day, active_students=active, watched_seconds=active * 10)
+        weeks = self.history(start='2026-01-01', end='2026-02-28', granularity='week')
+        self.assertEqual(
+            [(bucket['period'], bucket['active_student_days'], bucket['watched_seconds']) for bucket in weeks],
+            [('2026-01-05', 3, 30), ('2026-01-12', 4, 40), ('2026-02-02', 8, 80)],
+        )
+        months = self.history(start='2026-01-06', end='2026-02-28', granularity='month')
+        self.assertEqual(
+            [(bucket['period'], bucket['active_student_days']) for bucket in months],
+            [('2026-01-01', 6), ('2026-02-01', 8)],
+        )
+
+
+# One sample line of the text exposition format: name{labels} value
+SAMPLE_LINE = re.compile(r'^([a-z_]+)\{([a-z_]+="(?:[^"\\]|\\.)*"(?:,[a-z_]+="(?:[^"\\]|\\.)*")*)\} (\S+)$')
+
+
+class InstrumentationTests(TestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        patcher = mock.patch('core.instrumentation.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, view):
+        return QueryInstrumentationMiddleware(view)(RequestFactory().get('/'))
+
+    def test_counts_queries_on_every_alias(self):
+        def view(request):
+            for alias in self.databases:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            with span('serialize'):
+                pass
+            return HttpResponse()
+
+        response = self.handle(view)
+        self.assertEqual(self.registry.snapshot()[1][('queries', 'unresolved', None)], len(self.databases))
+        self.assertRegex(
+            response['Server-Timing'],
+            rf'^db;dur=\d+\.\d;desc="{len(self.databases)} queries", serialize;dur=\d+\.\d, total;dur=\d+\.\d$',
+        )
+
+    def test_prometheus_exposition(self):
+        for seconds in (0.003, 0.2, 20):
+            self.registry.record('course-list', 200, seconds, RequestTimings())
+        families, buckets, samples = set(), [], {}
+        for line in render_prometheus().splitlines():
+            if line.startswith('# TYPE '):
+                families.add(line.split()[2])
+                continue
+            if line.startswith('#'):
+                continue
+            name, labels, value = SAMPLE_LINE.match(line).groups()
+            self.assertTrue(any(name == family or name.rsplit('_', 1)[0] == family for family in families), line)
+            float(value)
+            if 'view="course-list"' in labels:
+                samples[name] = float(value)
+                if name.endswith('_bucket'):
+                    buckets.append((re.search(r'le="([^"]+)"', labels).group(1), float(value)))
+        counts = [count for _, count in buckets]
+        self.assertEqual(counts, sorted(counts), 'histogram buckets must be cumulative')
+        self.assertEqual(buckets[-1], ('+Inf', samples['nextcurl_request_duration_seconds_count']))
+        self.assertEqual(dict(buckets)['10.0'], 2)
+        self.assertEqual(samples['nextcurl_request_duration_seconds_count'], 3)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_guard(self):
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        self.assertEqual(self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('nextcurl_request_duration_seconds', response.content.decode())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICAS={'replica_1': 1, 'replica_2': 1}, REPLICA_SELECTION='round_robin')
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = DatabaseRouter()
+        patcher = mock.patch.object(ReplicaPool, 'check', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opted_in_reads_use_replicas_until_the_request_writes(self):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        with replica_reads():
+            self.assertEqual({self.router.db_for_read(Course) for _ in range(4)}, {'replica_1', 'replica_2'})
+            self.assertEqual(self.router.db_for_write(Course), 'default')
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+
+    def test_unhealthy_replica_is_ejected(self):
+        pool = ReplicaPool({'replica_1': 1, 'replica_2': 1}, 'round_robin')
+        with mock.patch.object(ReplicaPool, 'check', side_effect=lambda alias: alias == 'replica_2'):
+            self.assertEqual({pool.choose() for _ in range(4)}, {'replica_2'})
+        # Ejected for REPLICA_EJECT_SECONDS even once it answers again
+        self.assertEqual({pool.choose() for _ in range(4)}, {'replica_2'})
+
+    def test_user_reads_from_primary_after_writing(self):
+        user = User(pk=1, username='learner')
+        request = RequestFactory().post('/')
+        request.user = user
+        ReplicaRoutingMiddleware(lambda request: self.router.db_for_write(Course) and HttpResponse())(request)
+        self.assertTrue(is_sticky(user))
+        self.assertFalse(is_sticky(User(pk=2, username='other')))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'needs a replica alias (POSTGRES_REPLICAS) mirroring the test database')
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReplicaViewTests(TransactionTestCase):
+    """Opted-in views against a real replica alias; a TestCase transaction would hide its rows from the mirror"""
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=self.instructor)
+        lesson = Lesson.objects.create(course=self.course, title='Intro', content='...', order=0)
+        student = User.objects.create_user('student', password='pass')
+        Enrollment.objects.create(course=self.course, student=student)
+        LessonProgress.objects.create(lesson=lesson, student=student, watched_duration=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def capture_queries(self):
+        stack = ExitStack()
+        captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases}
+        return stack, captured
+
+    def test_streamed_export_keeps_reading_from_the_replica(self):
+        response = self.client.get(f'/api/courses/{self.course.pk}/student_progress/?export=csv')
+        self.assertEqual(response.status_code, 200)
+        stack, captured = self.capture_queries()
+        with stack:
+            body = b''.join(response.streaming_content).decode()
+        self.assertIn(',Intro,30,False,', body)
+        self.assertEqual(len(captured['default']), 0)
+        self.assertTrue(any(len(captured[alias]) for alias in settings.DATABASE_REPLICAS))
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        stack, captured = self.capture_queries()
+        with stack:
+            self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/engagement_metrics/').status_code, 200)
+        self.assertTrue(any(len(captured[alias]) for alias in settings.DATABASE_REPLICAS))
+
+        self.client.patch(f'/api/courses/{self.course.pk}/', {'title': 'Renamed'}, format='json')
+        stack, captured = self.capture_queries()
+        with stack:
+            self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/engagement_metrics/').status_code, 200)
+        self.assertFalse(any(len(captured[alias]) for alias in settings.DATABASE_REPLICAS))
+
+
+class ProgressBufferTests(SimpleTestCase):
+    """Runs the Lua scripts against a real Redis; skipped where none is reachable"""
+    redis_db = 15  # kept apart from the cache and token state
+
+    def setUp(self):
+        self.client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=self.redis_db)
+        try:
+            self.client.flushdb()
+        except redis.ConnectionError:
+            self.skipTest('Redis is not reachable')
+        self.addCleanup(self.client.flushdb)
+        self.buffer = ProgressBuffer(self.client)
+        self.now = timezone.now()
+
+    def record(self, watched, completed, seconds=0, student_id=1, lesson_id=10, course_id=100):
+        self.buffer.record_many([dict(
+            student_id=student_id, lesson_id=lesson_id, course_id=course_id, watched_duration=watched,
+            completed=completed, last_watched=self.now + timedelta(seconds=seconds),
+        )])
+
+    def test_heartbeats_merge_forward(self):
+        self.record(60, True)
+        self.record(10, False, seconds=1)
+        [record] = self.buffer.drain()
+        self.assertEqual((record['watched_duration'], record['completed']), (60, True))
+        self.assertEqual(self.buffer.drain(), [])
+
+    def test_acknowledge_keeps_entries_updated_after_drain(self):
+        self.record(30, False)
+        drained = self.buffer.drain()
+        self.record(45, False, seconds=1)
+        self.buffer.acknowledge(drained)
+        self.assertEqual(self.buffer.pending_for_student(1)[10]['watched_duration'], 45)
+        self.buffer.acknowledge(self.buffer.drain())
+        self.assertEqual(self.buffer.pending_for_student(1), {})
+
+    def test_requeued_records_are_drained_again(self):
+        self.record(30, False)
+        drained = self.buffer.drain()
+        self.buffer.requeue(drained)
+        self.assertEqual([record['lesson_id'] for record in self.buffer.drain()], [10])
+
+    def test_pending_for_students_filters_by_course(self):
+        self.record(30, False, student_id=1, lesson_id=10, course_id=100)
+        self.record(40, False, student_id=2, lesson_id=20, course_id=200)
+        pending = self.buffer.pending_for_students([1, 2, 3], course_id=100)
+        self.assertEqual({student_id: list(records) for student_id, records in pending.items()}, {1: [10], 2: [], 3: []})
+
+
+class FlushProgressBufferCommandTests(SimpleTestCase):
+    @mock.patch('courses.management.commands.flush_progress_buffer.ProgressBuffer')
+    def test_flush_errors_back_off_instead_of_stopping(self, buffer):
+        command = FlushProgressBufferCommand()
+        with mock.patch.object(command, 'flush', side_effect=[DatabaseError, DatabaseError, 0]), \
+                mock.patch('time.sleep', side_effect=[None, None, KeyboardInterrupt]) as sleep, \
+                self.assertLogs('courses.management.commands.flush_progress_buffer', 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                command.handle(interval=1, batch_size=100, once=False)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2, 4, 1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseFeaturesTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('instructor', password='pass')
+
+    def stored(self, course):
+        return list(CourseFeatures.objects.filter(course=course).values_list(*CourseFeatures.FEATURE_FIELDS).get())
+
+    def per_course(self, course):
+        """The features as RecommendationView computed them for one course before they were stored"""
+        from .features import difficulty_to_numeric
+
+        course.refresh_from_db()
+        completion_rate = course.get_completion_rate()
+        return [
+            difficulty_to_numeric(course.difficulty_level), course.total_duration, completion_rate * 0.01 * 5,
+            completion_rate, course.lessons.count(),
+        ]
+
+    def test_saves_refresh_the_course_features(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(
+                title='Course', description='...', instructor=self.instructor, difficulty_level='advanced', total_duration=90,
+            )
+        self.assertEqual(self.stored(course), [3, 90, 0, 0, 0])
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(course=course, title='Intro', content='...', order=0)
+        self.assertEqual(self.stored(course)[4], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            for progress in (100, 50):
+                Enrollment.objects.create(
+                    course=course, student=User.objects.create_user(f'student-{progress}', password='pass'), progress=progress,
+                )
+        self.assertEqual(self.stored(course)[2:4], [2.5, 50])
+        with self.captureOnCommitCallbacks(execute=True):
+            course.difficulty_level = 'beginner'
+            course.save()
+            lesson.delete()
+        self.assertEqual(self.stored(course), [1, 90, 2.5, 50, 0])
+        self.assertEqual(self.stored(course), self.per_course(course))
+
+    def test_bulk_upsert_matches_the_per_course_computation(self):
+        from .features import refresh_course_features
+
+        students = [User.objects.create_user(f'student-{index}', password='pass') for index in range(4)]
+        courses = []
+        for index, level in enumerate(('beginner', 'intermediate', 'advanced')):
+            course = Course.objects.create(
+                title=f'Course {index}', description='...', instructor=self.instructor, difficulty_level=level,
+                total_duration=30 * index,
+            )
+            for order in range(index):
+                Lesson.objects.create(course=course, title=f'Lesson {order}', content='...', order=order)
+            for student in students[:index + 1]:
+                Enrollment.objects.create(course=course, student=student, progress=100 if student.pk % 2 else 40)
+            courses.append(course)
+        self.assertEqual(refresh_course_features(), len(courses))
+        self.assertEqual([self.stored(course) for course in courses], [self.per_course(course) for course in courses])
+
+        # Existing rows are updated in place, also for changes that bypassed the signals
+        Enrollment.objects.filter(course=courses[2]).update(progress=100)
+        refresh_course_features([courses[2].pk])
+        self.assertEqual(self.stored(courses[2]), self.per_course(courses[2]))
+        self.assertEqual(CourseFeatures.objects.count(), len(courses))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, RECOMMENDER_POPULARITY_TTL=60)
+class PopularityTests(TestCase):
+    def test_split_threshold_on_hand_checked_vectors(self):
+        from .popularity import split_threshold
+
+        cases = [
+            ([], None),
+            ([7], None),  # a single course
+            ([5, 5, 5], None),  # all equal
+            ([52, 1, 3, 50, 2], 50),  # two clear groups, in any order
+            ([1, 2, 9, 10], 9),  # SSE 1 against 38 for either other split
+            ([1, 1, 1, 2, 2, 9], 9),  # SSE 1.2; equal counts stay together
+        ]
+        for values, threshold in cases:
+            with self.subTest(values=values):
+                self.assertEqual(split_threshold(values), threshold)
+
+    def test_split_threshold_is_the_exact_minimum(self):
+        from .popularity import split_threshold
+
+        values = sorted([0, 3, 4, 8, 8, 12, 19, 20, 21, 40])
+
+        def sse(group):
+            mean = sum(group) / len(group)
+            return sum((value - mean) ** 2 for value in group)
+
+        candidates = [index for index in range(1, len(values)) if values[index] != values[index - 1]]
+        best = min(candidates, key=lambda index: sse(values[:index]) + sse(values[index:]))
+        self.assertEqual(split_threshold(values), values[best])
+
+    def test_snapshot_is_cached_for_the_ttl(self):
+        from .popularity import get_popularity_snapshot
+
+        cache.clear()
+        instructor = User.objects.create_user('instructor', password='pass')
+        course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        self.assertEqual(get_popularity_snapshot()['courses'], [(course.pk, 0)])
+        Enrollment.objects.create(course=course, student=User.objects.create_user('student', password='pass'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_popularity_snapshot()['courses'], [(course.pk, 0)])
+        self.assertEqual(len(queries), 0)
+        with mock.patch('django.core.cache.backends.locmem.time') as clock:
+            clock.time.return_value = time.time() + 61
+            self.assertEqual(get_popularity_snapshot()['courses'], [(course.pk, 1)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BatchRecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user('instructor', password='pass')
+        self.courses = {
+            name: Course.objects.create(title=name, description='...', instructor=instructor, difficulty_level=level)
+            for name, level in (
+                ('Python', 'beginner'), ('Git', 'beginner'), ('SQL', 'intermediate'), ('Compilers', 'advanced'),
+                ('Kernels', 'advanced'),
+            )
+        }
+        lesson = Lesson.objects.create(course=self.courses['Python'], title='Intro', content='...', order=0)
+        # tied on beginner/advanced, so the alphabetical tie-break picks advanced
+        self.tied = self.enroll('tied', ('Python', 40, False), ('Kernels', 100, True))
+        self.beginner = self.enroll('beginner', ('Python', 100, True), ('Git', 20, False), ('Compilers', 0, False))
+        self.newcomer = User.objects.create_user('newcomer', password='pass')
+        LessonProgress.objects.create(lesson=lesson, student=self.beginner, watched_duration=5400)
+        from .features import refresh_course_features
+
+        refresh_course_features()
+
+    def enroll(self, username, *enrollments):
+        student = User.objects.create_user(username, password='pass')
+        for name, progress, completed in enrollments:
+            Enrollment.objects.create(course=self.courses[name], student=student, progress=progress, completed=completed)
+        return student
+
+    def test_profiles_match_the_per_user_view(self):
+        from .batch_recommendations import build_profiles
+        from .views_ai import RecommendationView
+
+        users = [self.tied, self.beginner, self.newcomer]
+        profiles, enrolled = build_profiles([user.pk for user in users])
+        view = RecommendationView()
+        expected = {user.pk: view.get_user_profile(user) for user in users}
+        self.assertEqual(profiles, {user_id: profile for user_id, profile in expected.items() if profile is not None})
+        self.assertEqual(profiles[self.tied.pk]['preferred_difficulty'], 'advanced')
+        self.assertEqual(profiles[self.beginner.pk]['preferred_difficulty'], 'beginner')
+        self.assertEqual(sorted(enrolled[self.tied.pk]), sorted([self.courses['Python'].pk, self.courses['Kernels'].pk]))
+
+    def test_command_stores_rankings_without_enrolled_courses(self):
+        from .batch_recommendations import build_profiles
+        from .features import FeatureMatrix
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(RECOMMENDER_ARTIFACT_DIR=directory.name), \
+                mock.patch.multiple(FeatureMatrix, store=ArtifactStore('content'), _current=None):
+            call_command('precompute_recommendations', '--active-days=0', '--chunk-size=1', stdout=StringIO())
+        stored = {row.user_id: row for row in UserRecommendation.objects.all()}
+        self.assertEqual(set(stored), {self.tied.pk, self.beginner.pk})
+        self.assertEqual(stored[self.tied.pk].profile, build_profiles([self.tied.pk])[0][self.tied.pk])
+        ranked = [course_id for course_id, _ in stored[self.tied.pk].recommendations]
+        self.assertEqual(
+            sorted(ranked), sorted(course.pk for name, course in self.courses.items() if name not in ('Python', 'Kernels'))
+        )
+
+    def test_precomputed_list_skips_courses_enrolled_after_generation(self):
+        ranked = [[self.courses['SQL'].pk, 0.9], [self.courses['Git'].pk, 0.8], [self.courses['Compilers'].pk, 0.7]]
+        UserRecommendation.objects.create(user=self.tied, profile={'preferred_difficulty': 'advanced'}, recommendations=ranked)
+        Enrollment.objects.create(course=self.courses['SQL'], student=self.tied)
+        client = APIClient()
+        client.force_authenticate(self.tied)
+        response = client.get('/api/recommendations/').json()
+        self.assertEqual(response['type'], 'personalized')
+        self.assertEqual([course['id'] for course in response['recommendations']], [self.courses['Git'].pk, self.courses['Compilers'].pk])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AI_SERVICE_URL='http://ai-service:5000', AI_SERVICE_TIMEOUT=0.1)
+class InferenceFallbackTests(TestCase):
+    def setUp(self):
+        from .features import FeatureMatrix, refresh_course_features
+
+        instructor = User.objects.create_user('instructor', password='pass')
+        python, *self.others = (
+            Course.objects.create(title=title, description='...', instructor=instructor, difficulty_level=level)
+            for title, level in (('Python', 'beginner'), ('Git', 'beginner'), ('Compilers', 'advanced'))
+        )
+        self.student = User.objects.create_user('student', password='pass')
+        Enrollment.objects.create(course=python, student=self.student, progress=50)
+        refresh_course_features()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        artifacts = override_settings(RECOMMENDER_ARTIFACT_DIR=directory.name)
+        artifacts.enable()
+        self.addCleanup(artifacts.disable)
+        for patcher in (
+            mock.patch.multiple(FeatureMatrix, store=ArtifactStore('content'), _current=None),
+            mock.patch('courses.inference.InferenceClient._instance', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def recommended(self):
+        response = self.client.get('/api/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(course['id'] for course in response.json()['recommendations'])
+
+    def test_unavailable_service_falls_back_to_local_scoring(self):
+        from .inference import InferenceClient, InferenceUnavailable
+
+        with mock.patch.object(InferenceClient, 'post', side_effect=InferenceUnavailable('/recommend returned 503')) as post:
+            self.assertEqual(self.recommended(), sorted(course.pk for course in self.others))
+        post.assert_called_once()
+
+    def test_timeout_falls_back_to_local_scoring(self):
+        with mock.patch('courses.inference.http.client.HTTPConnection') as connection_class:
+            connection_class.return_value.getresponse.side_effect = TimeoutError('timed out')
+            self.assertEqual(self.recommended(), sorted(course.pk for course in self.others))
+        connection_class.assert_called_once_with('ai-service', 5000, timeout=0.1)
+        connection_class.return_value.close.assert_called_once()
+
+
+class ExplainHotQueriesTests(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user('instructor', password='pass')
+        self.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        Lesson.objects.create(course=self.course, title='Intro', content='...', order=0)
+        Enrollment.objects.create(course=self.course, student=User.objects.create_user('student', password='pass'))
+
+    def test_every_registered_query_explains(self):
+        out = StringIO()
+        call_command('explain_hot_queries', '--verbose-plans', stdout=out)
+        reported = {
+            line.split(':')[0] for line in out.getvalue().splitlines()
+            if line.endswith(': ok') or ': sequential scan on ' in line
+        }
+        self.assertEqual(reported, set(HOT_QUERIES))
+
+    def test_seq_scan_pattern_flags_table_scans(self):
+        pattern = SEQ_SCAN_PATTERNS[connection.vendor]
+        plan = Course.objects.filter(title='Course').explain()  # title has no index
+        self.assertIn(Course._meta.db_table, pattern.findall(plan))
+        index_plans = {
+            'sqlite': 'SCAN courses_lesson USING INDEX lesson_course_idx\nSEARCH courses_course USING INTEGER PRIMARY KEY (rowid=?)',
+            'postgresql': 'Index Scan using courses_lesson_pkey on courses_lesson  (cost=0.15..8.17 rows=1 width=4)',
+        }
+        for vendor, index_plan in index_plans.items():
+            with self.subTest(vendor=vendor):
+                self.assertEqual(SEQ_SCAN_PATTERNS[vendor].findall(index_plan), [])
+
+
+class ArtifactLoadingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+    def test_unreadable_version_keeps_the_loaded_one(self):
+        store = ArtifactStore('content', root=self.root)
+        version = store.publish({'values': [1, 2]})
+        self.assertEqual(store.load().version, version)
+        with open(os.path.join(store.path, POINTER), 'w') as pointer:
+            pointer.write('1')  # pruned by another process
+        with self.assertLogs('courses.artifacts', 'ERROR'):
+            self.assertEqual(store.load(max_age=0).version, version)
+
+    def test_workers_do_not_publish_the_feature_matrix(self):
+        from .features import FeatureMatrix
+
+        with override_settings(RECOMMENDER_ARTIFACT_DIR=self.root), \
+                mock.patch.multiple(FeatureMatrix, store=ArtifactStore('content'), _current=None):
+            self.assertIsNotNone(FeatureMatrix.load())
+            self.assertIsNone(FeatureMatrix.store.current_version())
+
+
+class CollaborativeRefreshTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('instructor', password='pass')
+        self.students = [User.objects.create_user(f'student-{index}', password='pass') for index in range(3)]
+        self.python, self.data = (
+            Course.objects.create(title=title, description='...', instructor=self.instructor) for title in ('Python', 'Data')
+        )
+        for student in self.students:
+            Enrollment.objects.create(course=self.python, student=student)
+        Enrollment.objects.create(course=self.data, student=self.students[2])
+
+    def test_refresh_adds_courses_created_after_the_fit(self):
+        from .collaborative import CollaborativeModel
+
+        model = CollaborativeModel.fit()
+        added = Course.objects.create(title='Pandas', description='...', instructor=self.instructor)
+        for student in self.students[:2]:
+            Enrollment.objects.create(course=added, student=student)
+
+        refreshed = model.refresh_courses([added.pk, 10**6])
+        self.assertEqual(refreshed.course_ids.tolist(), [self.python.pk, self.data.pk, added.pk])
+        self.assertEqual(refreshed.interactions.shape, (3, 3))
+        self.assertEqual([course_id for course_id, _ in refreshed.recommend({added.pk: 1.0})], [self.python.pk])
+        self.assertEqual([course_id for course_id, _ in refreshed.recommend({self.data.pk: 1.0})], [self.python.pk])
+
+    def test_refresh_of_unknown_deleted_courses_is_a_no_op(self):
+        from .collaborative import CollaborativeModel
+
+        model = CollaborativeModel.fit()
+        self.assertIs(model.refresh_courses([10**6]), model)
+
+
+class FakeConnection:
+    closed = 0
+    status = TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_connections_are_reused_and_bounded(self):
+        pool = ConnectionPool('default', 'nextcurl', max_size=2, timeout=0.01)
+        first, second = pool.checkout(FakeConnection), pool.checkout(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(FakeConnection)
+        first.status = TRANSACTION_STATUS_INTRANS
+        pool.checkin(first)
+        # Handed back rolled back, without opening a third connection
+        self.assertIs(pool.checkout(FakeConnection), first)
+        self.assertEqual(first.status, TRANSACTION_STATUS_IDLE)
+        stats = pool.stats()
+        self.assertEqual((stats['in_use'], stats['connects'], stats['checkouts'], stats['timeouts']), (2, 2, 3, 1))
+
+    def test_old_connections_are_recycled(self):
+        pool = ConnectionPool('default', 'nextcurl', max_lifetime=0)
+        connection = pool.checkout(FakeConnection)
+        pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(FakeConnection), connection)
+
+
+# Cold `django.setup()` plus URL resolution in a fresh interpreter, as a forked worker pays it.
+# VmHWM is this process image's peak RSS; ru_maxrss would include the test runner that spawned it.
+STARTUP_SCRIPT = """
+import sys, django
+django.setup()
+from django.urls import resolve
+resolve('/api/courses/')
+print(next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM:')))
+print(' '.join(sorted(name for name in ('numpy', 'scipy', 'sklearn', 'pandas') if name in sys.modules)))
+"""
+# Total of the top-level -X importtime entries; about 0.5s locally, so CI noise has 3x headroom
+STARTUP_BUDGET_SECONDS = 1.5
+STARTUP_BUDGET_RSS_KB = 100 * 1024
+
+
+class StartupBudgetTests(SimpleTestCase):
+    def run_startup(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        # importtime lines: "import time: self [us] | cumulative | <indent>package"
+        top_level = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  '):
+                top_level.append((int(cumulative) / 1e6, name.strip()))
+        rss, heavy = (result.stdout.splitlines() + [''])[:2]
+        return top_level, int(rss), heavy.split()
+
+    def test_cold_start_within_budget(self):
+        top_level, rss_kb, heavy = self.run_startup()
+        slowest = ', '.join(f'{name} {seconds:.3f}s' for seconds, name in sorted(top_level, reverse=True)[:5])
+        self.assertEqual(heavy, [], 'numeric libraries must be imported lazily')
+        self.assertLessEqual(sum(seconds for seconds, _ in top_level), STARTUP_BUDGET_SECONDS, slowest)
+        self.assertLessEqual(rss_kb, STARTUP_BUDGET_RSS_KB)
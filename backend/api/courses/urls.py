@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, LessonViewSet, EnrollmentViewSet
+from .views import CourseViewSet, LessonViewSet, EnrollmentViewSet, ProgressBatchView, SearchView
 from .views_ai import RecommendationView
 
 router = DefaultRouter()
@@ -11,4 +11,6 @@ router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
 urlpatterns = [
     path('', include(router.urls)),
     path('recommendations/', RecommendationView.as_view(), name='course-recommendations'),
+    path('progress/batch/', ProgressBatchView.as_view(), name='progress-batch'),
+    path('search/', SearchView.as_view(), name='search'),
 ]
\ No newline at end of file
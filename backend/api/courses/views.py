@@ -1,16 +1,38 @@
 from rest_framework import viewsets, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, Max, Sum
+from django.db.models.functions import Trunc
 from django.utils import timezone
-from .models import Course, Lesson, Enrollment, LessonProgress
-from .serializers import CourseSerializer, LessonSerializer, EnrollmentSerializer, CourseAnalyticsSerializer, EnrollmentAnalyticsSerializer
+from .models import Course, Lesson, Enrollment, LessonProgress, CourseStats, LessonStats, CourseDailyActivity
+from .serializers import CourseSerializer, CourseListSerializer, LessonSerializer, EnrollmentSerializer, CourseAnalyticsSerializer, EnrollmentAnalyticsSerializer, ProgressBatchSerializer, EngagementHistoryQuerySerializer, SearchQuerySerializer, lesson_progress_by_student
+from .progress import ingest_progress
+from .search import get_search_backend
+from .exports import EXPORT_FORMATS
+from .pagination import CoursePagination, StudentProgressPagination
+from django.conf import settings
 from django.db import models
+from django.http import StreamingHttpResponse
+from analytics.store import get_store
+from core.caching import CachedResponseMixin, get_cache_version
+from core.conditional import ConditionalGetMixin, conditional_response, make_etag
+from core.databases.replicas import ReplicaReadsMixin
+from core.eager_loading import EagerLoadingViewSetMixin
+from core.instrumentation import span
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ReplicaReadsMixin, ConditionalGetMixin, CachedResponseMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    pagination_class = CoursePagination
+    # Instructor reporting reads tolerate replication lag
+    replica_actions = ('analytics', 'student_progress', 'engagement_metrics', 'engagement_history')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CourseListSerializer
+        return CourseSerializer
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy', 'enroll']:
@@ -33,63 +55,192 @@ class CourseViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def analytics(self, request, pk=None):
         course = self.get_object()
-        if request.user != course.instructor and not request.user.is_staff:
+        if request.user.pk != course.instructor_id and not request.user.is_staff:
             return Response(
                 {"detail": "You do not have permission to view these analytics."},
                 status=status.HTTP_403_FORBIDDEN
             )
-        
-        serializer = CourseAnalyticsSerializer(course)
-        return Response(serializer.data)
+
+        # The rollup is what the body reports, and the roster moves with enrollment writes
+        stats = CourseStats.for_course(course)
+        roster = course.enrollments.aggregate(count=Count('id'), last_accessed=Max('last_accessed'))
+        last_modified = max(filter(None, (stats.refreshed_at, roster['last_accessed'])))
+        etag = make_etag(request, stats.refreshed_at, roster['count'], roster['last_accessed'], self.content_version(course))
+        return conditional_response(
+            request, lambda: Response(CourseAnalyticsSerializer(course).data), etag, last_modified
+        )
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def student_progress(self, request, pk=None):
         course = self.get_object()
-        if request.user != course.instructor and not request.user.is_staff:
+        if request.user.pk != course.instructor_id and not request.user.is_staff:
             return Response(
                 {"detail": "You do not have permission to view student progress."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        enrollments = Enrollment.objects.filter(course=course)
-        serializer = EnrollmentAnalyticsSerializer(enrollments, many=True)
-        return Response(serializer.data)
+        export = request.query_params.get('export')
+        if export is not None:
+            if export not in EXPORT_FORMATS:
+                return Response(
+                    {"detail": f"Unsupported export format. Choose one of: {', '.join(EXPORT_FORMATS)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            stream, content_type = EXPORT_FORMATS[export]
+            response = StreamingHttpResponse(stream(course), content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="course-{course.pk}-progress.{export}"'
+            return response
+
+        paginator = StudentProgressPagination()
+        enrollments = paginator.paginate_queryset(Enrollment.objects.filter(course=course), request, view=self)
+        progress = lesson_progress_by_student(course.pk, [enrollment.student_id for enrollment in enrollments])
+        serializer = EnrollmentAnalyticsSerializer(enrollments, many=True, context={'lesson_progress': progress})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def engagement_metrics(self, request, pk=None):
         course = self.get_object()
-        if request.user != course.instructor and not request.user.is_staff:
+        if request.user.pk != course.instructor_id and not request.user.is_staff:
             return Response(
                 {"detail": "You do not have permission to view these metrics."},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        
-        metrics = {
-            'total_students': course.enrollments.count(),
-            'active_students_30d': course.enrollments.filter(
-                last_accessed__gte=thirty_days_ago
-            ).count(),
-            'average_progress': course.enrollments.aggregate(
-                Avg('progress')
-            )['progress__avg'] or 0,
-            'completion_rate': course.get_completion_rate(),
-            'lesson_completion_rates': LessonProgress.objects.filter(
-                lesson__course=course
-            ).values('lesson__title').annotate(
-                completion_rate=Count('completed', filter=models.Q(completed=True)) * 100.0 / Count('*')
+        summary = get_store().course_summary(course.pk) if settings.EVENT_PIPELINE else None
+        if summary is not None:
+            # Index range count on (course, last_accessed); a rolling window cannot be summed from events
+            active_since = timezone.now() - CourseStats.ACTIVE_WINDOW
+            active_students = course.enrollments.filter(last_accessed__gte=active_since).count()
+            etag = make_etag(request, 'events', summary['updated_at'], active_students, self.content_version(course))
+            return conditional_response(
+                request,
+                lambda: Response(self.engagement_from_events(course, summary, active_students)),
+                etag,
+                summary['updated_at'],
+            )
+
+        # Lesson rollups are refreshed together with the course rollup, so its refresh time versions both
+        stats = CourseStats.for_course(course)
+        etag = make_etag(request, 'stats', stats.refreshed_at, self.content_version(course))
+        return conditional_response(
+            request, lambda: Response(self.engagement_from_stats(course, stats)), etag, stats.refreshed_at
+        )
+
+    def content_version(self, course):
+        """Version token of the course and its lessons, bumped by the catalog signals"""
+        return get_cache_version(self.get_cache_prefix(), f'detail:{course.pk}')
+
+    def engagement_from_stats(self, course, stats):
+        """Engagement metrics from the materialized course and lesson rollups"""
+        return {
+            'total_students': stats.total_students,
+            'active_students_30d': stats.active_students,
+            'average_progress': stats.average_progress,
+            'completion_rate': stats.completion_rate,
+            'total_watched_seconds': stats.watched_seconds,
+            'lesson_completion_rates': LessonStats.objects.filter(
+                course=course, learners__gt=0
+            ).order_by('lesson__order').values('lesson__title').annotate(
+                completion_rate=models.F('completed_learners') * 100.0 / models.F('learners')
             )
         }
-        
-        return Response(metrics)
 
-class LessonViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def engagement_history(self, request, pk=None):
+        """
+        Daily engagement buckets summed per day, week or month. Coarser periods add
+        up daily active learners, so they report learner-days rather than distinct learners.
+        """
+        course = self.get_object()
+        if request.user.pk != course.instructor_id and not request.user.is_staff:
+            return Response(
+                {"detail": "You do not have permission to view these metrics."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        query = EngagementHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end, granularity = (query.validated_data[key] for key in ('start', 'end', 'granularity'))
+        activity = CourseDailyActivity.objects.filter(course=course, day__range=(start, end))
+        version = activity.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        etag = make_etag(request, start, end, granularity, version['count'], version['updated_at'])
+        return conditional_response(
+            request, lambda: Response(self.engagement_buckets(activity, start, end, granularity)), etag, version['updated_at']
+        )
+
+    def engagement_buckets(self, activity, start, end, granularity):
+        buckets = (
+            activity
+            .annotate(period=Trunc('day', granularity, output_field=models.DateField()))
+            .values('period')
+            .annotate(**{counter: Sum(counter) for counter in CourseDailyActivity.COUNTERS})
+            .order_by('period')
+        )
+        return {
+            'start': start,
+            'end': end,
+            'granularity': granularity,
+            'buckets': [
+                {
+                    'period': bucket['period'],
+                    'active_student_days': bucket['active_students'],
+                    'new_enrollments': bucket['new_enrollments'],
+                    'completions': bucket['completions'],
+                    'watched_seconds': bucket['watched_seconds'],
+                }
+                for bucket in buckets
+            ],
+        }
+
+    def engagement_from_events(self, course, summary, active_students):
+        """Engagement metrics from the event-fed analytics aggregates"""
+        lesson_completion_rates = []
+        for lesson_id, title in Lesson.objects.filter(course=course).order_by('order').values_list('id', 'title'):
+            counts = summary['lessons'].get(lesson_id)
+            if counts and counts['learners'] > 0:
+                lesson_completion_rates.append(
+                    {'lesson__title': title, 'completion_rate': counts['completed'] * 100.0 / counts['learners']}
+                )
+        return {
+            'total_students': summary['enrollments'],
+            'active_students_30d': active_students,
+            'average_progress': summary['average_progress'],
+            'completion_rate': summary['completion_rate'],
+            'total_watched_seconds': summary['watched_seconds'],
+            'lesson_completion_rates': lesson_completion_rates,
+        }
+
+class LessonViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated]
 
-class EnrollmentViewSet(viewsets.ReadOnlyModelViewSet):
+class EnrollmentViewSet(EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+
+class ProgressBatchView(APIView):
+    """
+    Accept a batch of lesson progress heartbeats for the current user and
+    write them with a single upsert.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ProgressBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        accepted, rejected = ingest_progress(request.user, serializer.validated_data['events'])
+        return Response({'accepted': accepted, 'rejected_lessons': rejected})
+
+class SearchView(APIView):
+    """Ranked full-text search over course titles, descriptions and lesson content"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        with span('search.query'):
+            results = get_search_backend().search(params['q'], difficulty=params.get('difficulty'), limit=params['limit'])
+        return Response({'query': params['q'], 'results': results})
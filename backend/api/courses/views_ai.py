@@ -1,72 +1,62 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
 from django.db.models import Count, Avg, Sum
-from .models import Course, Enrollment, LessonProgress
+from core.databases.replicas import ReplicaReadsMixin
+from core.instrumentation import span
+from .models import Course, Enrollment, LessonProgress, UserRecommendation
+from .inference import InferenceClient, InferenceUnavailable
 from .serializers import CourseSerializer
-import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
-import pandas as pd
 
-def get_recommendations(user):
+# numpy/scipy-backed modules (courses.features, .popularity, .collaborative) are imported
+# inside the functions that use them so URL-conf loading and workers that never serve
+# recommendations do not pay for them.
+
+def get_recommendations(user, limit=3):
     """
     Generate course recommendations for the given user based on historical enrollment data.
     This function:
-      1. Finds courses the user is not enrolled in.
-      2. Computes a 'popularity' score based on total enrollments.
-      3. Uses KMeans clustering to separate courses into two groups.
-      4. Selects the cluster with the highest average enrollments.
-      5. Returns the top 3 courses from that cluster, ordered by enrollment count.
+      1. Reads the shared popularity snapshot (enrollment counts and cluster boundary).
+      2. Finds courses the user is not enrolled in.
+      3. Keeps the candidates in the high-popularity cluster.
+      4. Returns the top courses from that cluster, ordered by enrollment count.
     """
+    from .popularity import get_popularity_snapshot
+
+    snapshot = get_popularity_snapshot()
     # Get courses the user is already enrolled in.
-    enrolled_course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
-    # Candidate courses are those the user is not enrolled in.
-    candidates = Course.objects.exclude(id__in=enrolled_course_ids)
-    
-    # Build a list of [course_id, total_enrollments] for each candidate.
-    course_data = []
-    for course in candidates:
-        total_enrollments = Enrollment.objects.filter(course=course).count()
-        course_data.append([course.id, total_enrollments])
-    
+    enrolled_course_ids = set(Enrollment.objects.filter(student=user).values_list('course_id', flat=True))
+    # Candidate courses are those the user is not enrolled in, most popular first.
+    candidates = [(course_id, count) for course_id, count in snapshot['courses'] if course_id not in enrolled_course_ids]
+
     # If no candidates, return an empty list.
-    if not course_data:
+    if not candidates:
         return []
-    
-    # Prepare data for clustering (using only the popularity metric).
-    data = np.array([x[1] for x in course_data]).reshape(-1, 1)
-    
-    # Use KMeans clustering if there are at least 2 candidates.
-    if len(data) >= 2:
-        kmeans = KMeans(n_clusters=2, random_state=42)
-        labels = kmeans.fit_predict(data)
-        # Compute the average enrollment in each cluster.
-        cluster_avg = {}
-        for label in np.unique(labels):
-            cluster_avg[label] = np.mean(data[labels == label])
-        # Choose the cluster with the highest average enrollment.
-        best_cluster = max(cluster_avg, key=cluster_avg.get)
-        # Filter candidate courses that belong to the best cluster.
-        recommended_ids = [course_data[i][0] for i in range(len(course_data)) if labels[i] == best_cluster]
-    else:
-        recommended_ids = [x[0] for x in course_data]
-    
-    # Annotate each course with enrollment count and order by popularity.
-    recommended_courses = (
-        Course.objects.filter(id__in=recommended_ids)
-        .annotate(enrollment_count=Count('enrollments'))
-        .order_by('-enrollment_count')[:3]
-    )
-    
+
+    # Prefer the high-popularity cluster; fall back to all candidates if the user took every course in it.
+    threshold = snapshot['threshold']
+    if threshold is not None:
+        popular = [item for item in candidates if item[1] >= threshold]
+        candidates = popular or candidates
+
+    top = candidates[:limit]
+    courses = Course.objects.in_bulk([course_id for course_id, _ in top])
+    recommended_courses = []
+    for course_id, count in top:
+        course = courses.get(course_id)
+        if course is not None:
+            course.enrollment_count = count
+            recommended_courses.append(course)
     return recommended_courses
 
-class RecommendationView(APIView):
+class RecommendationView(ReplicaReadsMixin, APIView):
     """
     API endpoint that returns personalized course recommendations for an authenticated user.
+    `?engine=collaborative` ranks by what similar learners took, falling back to the content-based path.
     """
     permission_classes = [IsAuthenticated]
+    engines = ('content', 'collaborative')
 
     def get_user_profile(self, user):
         """Generate user profile based on their learning history"""
@@ -89,7 +79,7 @@ class RecommendationView(APIView):
             enrollments
             .values('course__difficulty_level')
             .annotate(count=Count('id'))
-            .order_by('-count')
+            .order_by('-count', 'course__difficulty_level')
         )
         return difficulty_counts[0]['course__difficulty_level'] if difficulty_counts else 'beginner'
 
@@ -99,68 +89,37 @@ class RecommendationView(APIView):
             total_time=Sum('watched_duration')
         )['total_time'] or 0
 
-    def get_course_features(self, course):
-        """Extract relevant features for course similarity"""
-        return {
-            'difficulty_level': self.difficulty_to_numeric(course.difficulty_level),
-            'total_duration': course.total_duration,
-            'avg_rating': self.get_course_rating(course),
-            'completion_rate': course.get_completion_rate(),
-            'total_lessons': course.lessons.count()
-        }
-
-    def difficulty_to_numeric(self, difficulty):
-        """Convert difficulty level to numeric value"""
-        mapping = {'beginner': 1, 'intermediate': 2, 'advanced': 3}
-        return mapping.get(difficulty, 1)
-
-    def get_course_rating(self, course):
-        """Calculate course rating (placeholder for actual rating system)"""
-        return course.get_completion_rate() * 0.01 * 5  # Simple conversion to 5-star scale
-
     def get_similar_courses(self, user_profile, excluded_courses):
-        """Find courses similar to user's preferences"""
-        # Get all courses except those user is already enrolled in
-        available_courses = Course.objects.exclude(id__in=excluded_courses)
-        
-        if not available_courses.exists():
-            return []
+        """Find courses similar to user's preferences, via the AI service when one is configured"""
+        from .features import FeatureMatrix, preference_vector
+
+        vector = preference_vector(user_profile)
+        client = InferenceClient.get()
+        if client is not None:
+            try:
+                with span('recommend.remote'):
+                    top_courses = client.recommend(vector, excluded_courses, limit=5)
+                return self.serialize_recommendations(top_courses)
+            except InferenceUnavailable:
+                pass  # Score locally below
+
+        matrix = FeatureMatrix.load()
+
+        # Get top 5 most similar courses the user is not enrolled in
+        top_courses = matrix.similar(vector, exclude_ids=excluded_courses, limit=5)
+        return self.serialize_recommendations(top_courses)
+
+    def serialize_recommendations(self, top_courses):
+        """Render ranked (course_id, similarity) pairs as recommendation payloads"""
+        courses = Course.objects.only('id', 'title', 'description', 'difficulty_level').in_bulk(
+            [course_id for course_id, _ in top_courses]
+        )
 
-        # Create feature matrix
-        course_features = []
-        course_ids = []
-        
-        for course in available_courses:
-            features = self.get_course_features(course)
-            course_features.append(list(features.values()))
-            course_ids.append(course.id)
-
-        # Convert to numpy array and normalize
-        X = np.array(course_features)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-
-        # Create user preference vector
-        user_vector = np.array([[
-            self.difficulty_to_numeric(user_profile['preferred_difficulty']),
-            user_profile['avg_completion_rate'] * 10,  # Scale to similar range as course duration
-            user_profile['total_learning_time'] / 3600,  # Convert to hours
-            user_profile['completed_courses'],
-            user_profile['completed_courses'] * 2  # Proxy for expected lessons
-        ]])
-        user_vector_scaled = scaler.transform(user_vector)
-
-        # Calculate similarity scores
-        similarities = cosine_similarity(user_vector_scaled, X_scaled)[0]
-        
-        # Get top 5 most similar courses
-        top_indices = similarities.argsort()[-5:][::-1]
         recommended_courses = []
-        
-        for idx in top_indices:
-            course_id = course_ids[idx]
-            similarity_score = similarities[idx]
-            course = available_courses.get(id=course_id)
+        for course_id, similarity_score in top_courses:
+            course = courses.get(course_id)
+            if course is None:
+                continue
             recommended_courses.append({
                 'id': course.id,
                 'title': course.title,
@@ -171,9 +130,63 @@ class RecommendationView(APIView):
 
         return recommended_courses
 
+    def get_precomputed(self, user, enrolled_course_ids):
+        """Serve the batch-computed top-K list, skipping courses enrolled in since it was generated"""
+        stored = UserRecommendation.objects.filter(user=user).first()
+        if stored is None:
+            return None
+        enrolled = set(enrolled_course_ids)
+        top_courses = [(course_id, score) for course_id, score in stored.recommendations if course_id not in enrolled][:5]
+        return {
+            'type': 'personalized',
+            'user_profile': stored.profile,
+            'recommendations': self.serialize_recommendations(top_courses),
+            'generated_at': stored.generated_at,
+        }
+
+    def get_collaborative(self, user, enrolled_course_ids):
+        """Score courses through the item-item neighbour index; None when it cannot rank any"""
+        from .collaborative import CollaborativeModel, learner_interactions
+
+        model = CollaborativeModel.current()
+        if model is None:
+            return None
+        top_courses = model.recommend(learner_interactions(user), exclude_ids=enrolled_course_ids, limit=5)
+        if not top_courses:
+            return None
+        return {
+            'type': 'collaborative',
+            'recommendations': self.serialize_recommendations(top_courses),
+        }
+
     def get(self, request):
         user = request.user
-        user_profile = self.get_user_profile(user)
+        engine = request.query_params.get('engine', 'content')
+        if engine not in self.engines:
+            return Response(
+                {'detail': f"engine must be one of: {', '.join(self.engines)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Get courses user is already enrolled in
+        enrolled_course_ids = list(Enrollment.objects.filter(
+            student=user
+        ).values_list('course_id', flat=True))
+
+        if enrolled_course_ids and engine == 'collaborative':
+            with span('recommend.collaborative'):
+                collaborative = self.get_collaborative(user, enrolled_course_ids)
+            if collaborative is not None:
+                return Response(collaborative)
+
+        if enrolled_course_ids:
+            with span('recommend.precomputed'):
+                precomputed = self.get_precomputed(user, enrolled_course_ids)
+            if precomputed is not None:
+                return Response(precomputed)
+
+        with span('recommend.profile'):
+            user_profile = self.get_user_profile(user)
         
         if not user_profile:
             # New user recommendations
@@ -182,13 +195,9 @@ class RecommendationView(APIView):
                 'recommendations': self.get_beginner_recommendations()
             })
 
-        # Get courses user is already enrolled in
-        enrolled_course_ids = Enrollment.objects.filter(
-            student=user
-        ).values_list('course_id', flat=True)
-
         # Get personalized recommendations
-        recommendations = self.get_similar_courses(user_profile, enrolled_course_ids)
+        with span('recommend.score'):
+            recommendations = self.get_similar_courses(user_profile, enrolled_course_ids)
 
         return Response({
             'type': 'personalized',